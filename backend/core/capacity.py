@@ -0,0 +1,93 @@
+"""Parsing of the free-text ``Refinery.production`` capacity.
+
+Capacities are entered by hand ("5000 tpa", "10 000-20 000 tonnes de
+batteries par an", "60 GWh par an (prévu)", "N/A"...). ``parse_capacity``
+extracts a numeric range and a normalized unit so that filters, sorting and
+sums can run in SQL on ``Refinery.capacity_min/max/unit``.
+"""
+import re
+import unicodedata
+from collections import namedtuple
+
+TONNES_PER_YEAR = 't/yr'
+GWH_PER_YEAR = 'GWh/yr'
+VEHICLES_PER_YEAR = 'EV/yr'
+
+CAPACITY_UNIT_CHOICES = [
+    (TONNES_PER_YEAR, 'tonnes/an'),
+    (GWH_PER_YEAR, 'GWh/an'),
+    (VEHICLES_PER_YEAR, 'VE/an'),
+]
+
+Capacity = namedtuple('Capacity', ['min', 'max', 'unit'])
+UNKNOWN = Capacity(None, None, '')
+
+# Thousands grouped by (narrow/non-breaking) spaces, or a plain number with an
+# optional decimal part
+_NUMBER = r'\d{1,3}(?:[   ]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?'
+_SCALE = r'(?:millions?|k)\b'
+_CAPACITY_RE = re.compile(
+    rf'(?P<low>{_NUMBER})\s*(?P<low_scale>{_SCALE})?'
+    rf'(?:\s*(?:-|–|—|à|a|to)\s*(?P<high>{_NUMBER})\s*(?P<high_scale>{_SCALE})?)?'
+    r'\s*(?P<plus>\+)?'
+)
+_SCALES = {'k': 1e3, 'million': 1e6, 'millions': 1e6}
+
+_GWH_RE = re.compile(r'\bgwh\b')
+_VEHICLES_RE = re.compile(r'\b(?:ve|ev|evs|vehicules?|vehicles?)\b')
+_KG_RE = re.compile(r'\bkg\b')
+_MONTHLY_RE = re.compile(r'\b(?:mois|months?)\b')
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def _to_number(raw, scale):
+    raw = re.sub(r'[   ]', '', raw)
+    if ',' in raw:
+        whole, fraction = raw.split(',', 1)
+        # "1,500" is a thousands separator, "1,5 million" a decimal comma
+        raw = whole + fraction if len(fraction) == 3 and not scale else f'{whole}.{fraction}'
+    return float(raw) * _SCALES.get(scale, 1)
+
+
+def parse_capacity(text):
+    """
+    Parse a capacity string into ``Capacity(min, max, unit)``.
+
+    - ranges give both bounds ("600-1 100 tonnes" -> 600, 1100);
+    - open ranges have no maximum ("10 000+ tonnes" -> 10000, None);
+    - tonnes (tpa, tonnes par an, kg/mois...) are normalized to t/yr;
+    - text without a number ("N/A", "Not specified") gives ``UNKNOWN``.
+    """
+    if not text:
+        return UNKNOWN
+    normalized = _normalize(text)
+    match = _CAPACITY_RE.search(normalized)
+    if match is None:
+        return UNKNOWN
+
+    high_scale = match['high_scale']
+    # "1-2 million": the trailing multiplier applies to both bounds
+    low_scale = match['low_scale'] or high_scale
+    low = _to_number(match['low'], low_scale)
+    if match['high']:
+        high = _to_number(match['high'], high_scale or low_scale)
+    elif match['plus']:
+        high = None
+    else:
+        high = low
+
+    if _GWH_RE.search(normalized):
+        return Capacity(low, high, GWH_PER_YEAR)
+    if _VEHICLES_RE.search(normalized):
+        return Capacity(low, high, VEHICLES_PER_YEAR)
+
+    factor = 1e-3 if _KG_RE.search(normalized) else 1
+    if _MONTHLY_RE.search(normalized):
+        factor *= 12
+    low = round(low * factor, 3)
+    high = round(high * factor, 3) if high is not None else None
+    return Capacity(low, high, TONNES_PER_YEAR)
@@ -0,0 +1,20 @@
+"""Clusters of the refineries (see dashboard_common.clusters)."""
+from dashboard_common.clusters import VersionedClusterIndex
+
+from .capacity import TONNES_PER_YEAR
+from .models import Refinery
+
+
+def refinery_points():
+    """
+    (id, longitude, latitude, capacity in t/yr) of every refinery; the
+    capacity is the lower bound of the range, as in the stats (core.stats)
+    """
+    for refinery_id, longitude, latitude, capacity, unit in Refinery.objects.values_list(
+        'id', 'longitude', 'latitude', 'capacity_min', 'capacity_unit'
+    ):
+        # Only tonnes per year add up; other units count as no capacity
+        yield refinery_id, longitude, latitude, capacity if unit == TONNES_PER_YEAR else None
+
+
+cluster_index = VersionedClusterIndex(Refinery, refinery_points).get
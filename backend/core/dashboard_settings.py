@@ -0,0 +1,28 @@
+"""Dashboard settings: a single database row, cached in every process.
+
+The storage (get_or_create on ``singleton``, in-memory copy under the version
+token, compare-and-swap ``increment_version``) lives in
+``dashboard_common.dashboard_settings``; this module binds it to the
+``DashboardSettings`` model and this project's default colors.
+"""
+from dashboard_common.dashboard_settings import SettingsStore, VersionConflict  # noqa: F401
+
+from .events import change_log
+from .models import DashboardSettings
+
+DEFAULT_STATUS_COLORS = {
+    "operational": "#00AA00",
+    "construction": "#0000FF",
+    "planned": "#FFA500",
+    "approved": "#FFA500",
+    "suspended": "#FF0000"
+}
+
+DEFAULT_CHART_COLORS = ["#4a6bff", "#ff7043", "#ffca28", "#66bb6a", "#ab47bc"]
+
+store = SettingsStore(DashboardSettings, {
+    'status_colors': DEFAULT_STATUS_COLORS,
+    'chart_colors': DEFAULT_CHART_COLORS,
+}, change_log)
+get_settings = store.get
+increment_version = store.increment_version
@@ -0,0 +1,13 @@
+"""Change log of the refineries and settings (see dashboard_common.events)."""
+from dashboard_common.events import ChangeLog
+
+from .models import ChangeEvent, DashboardSettings, Refinery
+
+LOGGED_MODELS = (Refinery, DashboardSettings)
+
+change_log = ChangeLog(ChangeEvent, LOGGED_MODELS)
+feed = change_log.feed
+record_changes = change_log.record_changes
+record_change = change_log.record_change
+latest_event_id = change_log.latest_event_id
+stream_events = change_log.stream
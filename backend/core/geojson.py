@@ -0,0 +1,54 @@
+"""Precomputed GeoJSON FeatureCollection of the refineries.
+
+Each variant (coordinate precision, ``status`` and ``country`` filters) is
+built from one ``values()`` query and stored pre-compressed under the current
+``Refinery`` data version (see ``dashboard_common.geojson``).
+"""
+from dashboard_common.cache import get_data_versions
+from dashboard_common.geojson import compressed_payload
+
+from .models import Refinery
+
+# 7 decimals is about 1 cm, finer than the stored coordinates are accurate
+MAX_PRECISION = 7
+CACHE_KEY = 'refinery-geojson:{}:{}:{}:{}'
+
+
+def refinery_features(precision=None, status=None, country=None):
+    """GeoJSON features of the refineries; coordinates rounded to ``precision`` decimals"""
+    refineries = Refinery.objects.order_by('id')
+    if status:
+        refineries = refineries.filter(status=status)
+    if country:
+        refineries = refineries.filter(country=country)
+
+    def quantize(value):
+        return value if precision is None else round(value, precision)
+
+    features = []
+    for row in refineries.values(
+        'id', 'name', 'location', 'country', 'status', 'latitude', 'longitude',
+        'capacity_min', 'capacity_max', 'capacity_unit', 'processing', 'website',
+    ):
+        pk, latitude, longitude = row.pop('id'), row.pop('latitude'), row.pop('longitude')
+        row['capacity_unit'] = row['capacity_unit'] or None
+        features.append({
+            'type': 'Feature',
+            'id': pk,
+            # GeoJSON order: longitude first
+            'geometry': {'type': 'Point', 'coordinates': [quantize(longitude), quantize(latitude)]},
+            'properties': row,
+        })
+    return features
+
+
+def geojson_payload(precision=None, status=None, country=None):
+    """
+    ``(tag, {encoding: body})`` for the current data version, ``tag`` being
+    unique to the variant and version (ETag); encodings are ``identity``,
+    ``gzip`` and, with brotli installed, ``br``.
+    """
+    version, = get_data_versions(Refinery)
+    return compressed_payload(CACHE_KEY.format(version, precision, status, country), lambda: {
+        'type': 'FeatureCollection', 'features': refinery_features(precision, status, country),
+    })
@@ -0,0 +1,202 @@
+"""Bulk import of refineries, upserted on their natural key (name, location)."""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from dashboard_common.cache import bump_data_version
+from dashboard_common.events import snapshot
+
+from .events import record_changes
+from .models import Refinery
+from .normalization import refinery_fields, safe_normalize
+from .tiles import refinery_layer
+
+BATCH_SIZE = 500
+
+IMPORTED_FIELDS = [
+    'name', 'location', 'country', 'latitude', 'longitude', 'status',
+    'production', 'processing', 'notes', 'website',
+    'capacity_min', 'capacity_max', 'capacity_unit', 'content_hash',
+]
+
+# Names kept per kind of change for the diff summary
+DIFF_SAMPLE_SIZE = 20
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    errors: list = field(default_factory=list)
+    # First DIFF_SAMPLE_SIZE "name (location)" per kind: created, updated, deleted
+    samples: dict = field(default_factory=lambda: {'created': [], 'updated': [], 'deleted': []})
+    elapsed: float = 0.0
+    dry_run: bool = False
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.unchanged
+
+    @property
+    def changed(self):
+        return self.created + self.updated + self.deleted
+
+    def record(self, kind, keys):
+        sample = self.samples[kind]
+        for name, location in keys[:DIFF_SAMPLE_SIZE - len(sample)]:
+            sample.append(f"{name} ({location})" if location else name)
+
+    @property
+    def rate(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+def _update_rows(refineries):
+    """
+    UPDATE by primary key through executemany: bulk_update() builds one
+    CASE WHEN per column and batch, which grows quadratically with batch size.
+    """
+    if not refineries:
+        return
+    qn = connection.ops.quote_name
+    meta = Refinery._meta
+    fields = [meta.get_field(name) for name in IMPORTED_FIELDS + ['updated_at']]
+    assignments = ', '.join(f'{qn(field.column)} = %s' for field in fields)
+    statement = f'UPDATE {qn(meta.db_table)} SET {assignments} WHERE {qn(meta.pk.column)} = %s'
+    with connection.cursor() as cursor:
+        cursor.executemany(statement, [
+            [field.get_db_prep_save(getattr(refinery, field.attname), connection) for field in fields] + [refinery.pk]
+            for refinery in refineries
+        ])
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def normalize_in_parallel(records, normalize, workers, chunk_size=BATCH_SIZE * 8):
+    """
+    ``(values, error)`` pairs for ``records``, computed by ``normalize`` in a
+    pool of ``workers`` processes. Records are submitted one chunk ahead of
+    the chunk being consumed, so normalization overlaps with the database
+    writes while at most two chunks are held in memory.
+    """
+    task = partial(safe_normalize, normalize)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = None
+        for chunk in _batches(records, chunk_size):
+            results = pool.map(task, chunk, chunksize=max(1, len(chunk) // (workers * 4)))
+            if pending is not None:
+                yield from pending
+            pending = results
+        if pending is not None:
+            yield from pending
+
+
+def upsert_refineries(records, batch_size=BATCH_SIZE, prune=False, progress=None, normalize=refinery_fields,
+                      dry_run=False):
+    """
+    Differential sync of refineries from JSON records, matched on (name,
+    location), in a single transaction: readers see the old table until the
+    commit, never a partially loaded one. Rows whose ``content_hash`` matches
+    the incoming record are left untouched (no write, same ``updated_at``);
+    only created, modified and, with ``prune``, missing refineries are
+    written. Within the input, the last record for a key wins. With
+    ``dry_run`` the differences are computed and reported but nothing is written.
+
+    ``records`` may be any iterable (e.g. a streamed file): only one batch
+    is held in memory. They are mapped to field values with ``normalize``;
+    pass ``normalize=None`` for ``(values, error)`` pairs that are already
+    normalized (see ``normalize_in_parallel``). ``progress(result, elapsed)``
+    is called after each batch. Invalid records are skipped and reported in
+    ``ImportResult.errors`` as ``(index, message)``.
+    """
+    result = ImportResult(dry_run=dry_run)
+    started = time.perf_counter()
+    now = timezone.now()
+    seen = set()
+    # Dry run: keys that would have been created by an earlier batch
+    planned = {}
+
+    if normalize is not None:
+        records = (safe_normalize(normalize, record) for record in records)
+
+    with transaction.atomic():
+        offset = 0
+        for batch in _batches(records, batch_size):
+            by_key = {}
+            for index, (values, error) in enumerate(batch, start=offset):
+                if error is not None:
+                    result.errors.append((index, error))
+                    continue
+                by_key[values['name'], values['location']] = values
+            offset += len(batch)
+
+            existing = {
+                (name, location): (pk, digest)
+                for pk, name, location, digest in Refinery.objects.filter(
+                    name__in={name for name, _ in by_key}
+                ).values_list('id', 'name', 'location', 'content_hash')
+            }
+            existing.update((key, planned[key]) for key in by_key if key in planned)
+            to_create, to_update = [], []
+            for key, values in by_key.items():
+                if key not in existing:
+                    to_create.append(Refinery(created_at=now, updated_at=now, **values))
+                    continue
+                pk, digest = existing[key]
+                if pk is not None:
+                    seen.add(pk)
+                if digest == values['content_hash']:
+                    result.unchanged += 1
+                else:
+                    to_update.append(Refinery(id=pk, updated_at=now, **values))
+
+            if dry_run:
+                planned.update((
+                    (refinery.name, refinery.location), (refinery.pk, refinery.content_hash)
+                ) for refinery in to_create + to_update)
+            else:
+                created = Refinery.objects.bulk_create(to_create, batch_size=batch_size)
+                _update_rows(to_update)
+                seen.update(refinery.pk for refinery in created)
+                # Bulk writes send no signal: log them for the SSE feed here
+                record_changes(Refinery, 'create', [(refinery.pk, snapshot(refinery)) for refinery in created])
+                record_changes(Refinery, 'update', [
+                    # created_at is not loaded for updated rows
+                    (refinery.pk, {key: value for key, value in snapshot(refinery).items() if key != 'created_at'})
+                    for refinery in to_update
+                ])
+            result.created += len(to_create)
+            result.updated += len(to_update)
+            result.record('created', [(refinery.name, refinery.location) for refinery in to_create])
+            result.record('updated', [(refinery.name, refinery.location) for refinery in to_update])
+            if progress is not None:
+                progress(result, time.perf_counter() - started)
+
+        if prune:
+            stale = list(set(Refinery.objects.values_list('id', flat=True)) - seen)
+            for start in range(0, len(stale), batch_size):
+                chunk = Refinery.objects.filter(pk__in=stale[start:start + batch_size])
+                result.record('deleted', list(chunk.values_list('name', 'location')))
+                if dry_run:
+                    result.deleted += chunk.count()
+                else:
+                    deleted, _ = chunk.delete()
+                    result.deleted += deleted
+        # Unchanged imports keep every cached response valid
+        if result.changed and not dry_run:
+            bump_data_version(Refinery)
+            refinery_layer.invalidate()
+
+    result.elapsed = time.perf_counter() - started
+    return result
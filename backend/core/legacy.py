@@ -0,0 +1,70 @@
+"""Precomputed projection served by the legacy ``/api/recycling-plants/`` endpoint.
+
+The frontend still expects the old recycling-plant format (plain JSON array,
+capacities as strings). The array is built from a single ``values_list()``
+query over the stored numeric capacity, encoded once, gzipped once and kept
+in the response cache under the current ``Refinery`` data version: until
+the next write, a request costs one version lookup and one cache read.
+"""
+import gzip
+
+from django.core.cache import caches
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce
+
+from dashboard_common.cache import RESPONSE_CACHE, get_data_versions
+from dashboard_common.geojson import dumps
+
+from .capacity import TONNES_PER_YEAR
+from .models import Refinery
+
+# Capacity reported when none can be parsed (historical adapter behaviour)
+DEFAULT_CAPACITY = 10000
+CACHE_KEY = 'legacy-recycling-plants:{}'
+
+
+def legacy_plant_rows():
+    """Refineries in the legacy recycling-plant format, in one query"""
+    rows = Refinery.objects.order_by('id').values_list(
+        'id', 'name', 'location', 'country', 'status', 'latitude', 'longitude', 'processing', 'website',
+        Coalesce(
+            Case(When(capacity_unit=TONNES_PER_YEAR, then=F('capacity_min'))),
+            Value(float(DEFAULT_CAPACITY)),
+        ),
+    )
+    data = []
+    for pk, name, location, country, status, latitude, longitude, processing, website, capacity in rows:
+        capacity = int(capacity)
+        data.append({
+            'id': pk,
+            'name': name,
+            'location': location,
+            'country': country,
+            'recycling_rate': 50 + pk % 40,  # Placeholder value between 50 and 90%
+            'active': status == 'operational',
+            'status': status,
+            'capacity': str(capacity),
+            # Current production estimated at 75% of capacity
+            'current_production': str(int(capacity * 0.75)),
+            'latitude': latitude,
+            'longitude': longitude,
+            'processing': processing,
+            'website': website,
+        })
+    return data
+
+
+def legacy_plant_payload():
+    """
+    ``(version, body, gzipped_body)`` for the current data version, built
+    on the first request after a ``Refinery`` write.
+    """
+    version, = get_data_versions(Refinery)
+    cache = caches[RESPONSE_CACHE]
+    key = CACHE_KEY.format(version)
+    payload = cache.get(key)
+    if payload is None:
+        body = dumps(legacy_plant_rows())
+        payload = (version, body, gzip.compress(body, compresslevel=6))
+        cache.set(key, payload, None)
+    return payload
@@ -0,0 +1,18 @@
+from dashboard_common.benchmark_bbox import BenchmarkCommand
+
+from core.models import Refinery
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Time ?bbox= queries over N synthetic refineries (rolled back at the end): "
+        "R*Tree index against the plain range filter"
+    )
+    model = Refinery
+    count_option = 'refineries'
+
+    def build(self, index, latitude, longitude):
+        return Refinery(
+            name=f'Benchmark {index}', location='', country='', status='planned',
+            latitude=latitude, longitude=longitude,
+        )
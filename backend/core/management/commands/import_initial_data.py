@@ -1,80 +1,50 @@
 import json
 from django.core.management.base import BaseCommand
-from core.models import Refinery, DashboardSettings
+from core.importers import BATCH_SIZE, upsert_refineries
+from core.models import DashboardSettings
+from core.normalization import refinery_fields
+from core.streaming import iter_object
 from django.utils import timezone
 
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
 class Command(BaseCommand):
     help = 'Import initial data from a JSON file'
 
     def add_arguments(self, parser):
         parser.add_argument('json_file', type=str, help='Path to the JSON file')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows written per query')
+        parser.add_argument('--prune', action='store_true', help='Delete refineries missing from the file')
+        parser.add_argument(
+            '--stream', action='store_true',
+            help='Parse the refineries array incrementally (bounded memory for very large files)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be created, updated or deleted without writing anything'
+        )
 
     def handle(self, *args, **options):
         json_file = options['json_file']
         
         try:
             with open(json_file, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                
-                # Import refineries
-                if 'refineries' in data and isinstance(data['refineries'], list):
-                    count = 0
-                    
-                    # Optionally clear existing data
-                    if Refinery.objects.exists():
-                        self.stdout.write("Clearing existing refineries...")
-                        Refinery.objects.all().delete()
-                    
-                    for refinery_data in data['refineries']:
-                        # Extract coordinates
-                        coordinates = refinery_data.get('coordinates', [0, 0])
-                        latitude = coordinates[0] if len(coordinates) > 0 else 0
-                        longitude = coordinates[1] if len(coordinates) > 1 else 0
-                        
-                        # Map status to choices (normalize the data)
-                        status_mapping = {
-                            # French values
-                            'Opérationnel': 'operational',
-                            'En construction': 'construction',
-                            'Planifié': 'planned',
-                            'Approuvé': 'approved',
-                            'En pause': 'suspended',
-                            # English values - already normalized
-                            'operational': 'operational',
-                            'construction': 'construction',
-                            'planned': 'planned',
-                            'approved': 'approved',
-                            'suspended': 'suspended'
-                        }
-                        
-                        status_value = refinery_data.get('status', 'planned')
-                        status = status_mapping.get(status_value, status_value)
-                        
-                        # Print debug info
-                        self.stdout.write(f"Processing refinery: {refinery_data.get('name')} with status {status_value} -> {status}")
-                        
-                        try:
-                            # Create a new refinery
-                            refinery = Refinery.objects.create(
-                                name=refinery_data.get('name', ''),
-                                location=refinery_data.get('location', ''),
-                                country=refinery_data.get('country', 'Canada'),
-                                latitude=latitude,
-                                longitude=longitude,
-                                status=status,
-                                production=refinery_data.get('production', ''),
-                                processing=refinery_data.get('processing', ''),
-                                notes=refinery_data.get('notes', ''),
-                                website=refinery_data.get('website', '')
-                            )
-                            count += 1
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(f"Error creating refinery {refinery_data.get('name')}: {str(e)}"))
-                    
-                    self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} refineries'))
+                if options['stream']:
+                    # Refineries are imported while the file is read; other keys are small
+                    data = {}
+                    for key, value in iter_object(file, stream_keys={'refineries'}):
+                        if key == 'refineries':
+                            self.import_refineries(value, options)
+                        else:
+                            data[key] = value
+                else:
+                    data = json.load(file)
+                    if 'refineries' in data and isinstance(data['refineries'], list):
+                        self.import_refineries(data['refineries'], options)
                 
                 # Import dashboard settings
-                if 'status_colors' in data and 'chart_colors' in data:
+                if 'status_colors' in data and 'chart_colors' in data and not options['dry_run']:
                     # Use status colors directly if they're already in the right format
                     # or map them if they're in French
                     status_colors_normalized = {}
@@ -93,15 +63,12 @@ class Command(BaseCommand):
                         elif key in ['En pause', 'En suspens']:
                             status_colors_normalized['suspended'] = value
                     
-                    # Clear existing settings
-                    DashboardSettings.objects.all().delete()
-                    
-                    # Create dashboard settings
-                    settings = DashboardSettings.objects.create(
-                        version=data.get('version', timezone.now().strftime('%Y-%m-%d')),
-                        status_colors=status_colors_normalized or data['status_colors'],
-                        chart_colors=data['chart_colors']
-                    )
+                    # Replace the single settings row
+                    settings, _ = DashboardSettings.objects.update_or_create(singleton=True, defaults={
+                        'version': data.get('version', timezone.now().strftime('%Y-%m-%d')),
+                        'status_colors': status_colors_normalized or data['status_colors'],
+                        'chart_colors': data['chart_colors'],
+                    })
                     
                     self.stdout.write(self.style.SUCCESS('Successfully imported dashboard settings'))
         
@@ -110,4 +77,39 @@ class Command(BaseCommand):
         except json.JSONDecodeError:
             self.stdout.write(self.style.ERROR(f'Invalid JSON in {json_file}'))
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error importing data: {str(e)}'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Error importing data: {str(e)}'))
+
+    def import_refineries(self, records, options, normalize=refinery_fields):
+        """Upsert refineries on name + location, in one transaction"""
+        last_report = 0.0
+
+        def progress(result, elapsed):
+            nonlocal last_report
+            if elapsed - last_report >= PROGRESS_INTERVAL:
+                last_report = elapsed
+                self.stdout.write(f"{result.processed} refineries imported ({result.processed / elapsed:.0f} records/s)")
+
+        result = upsert_refineries(
+            records, batch_size=options['batch_size'], prune=options['prune'], progress=progress,
+            normalize=normalize, dry_run=options['dry_run'],
+        )
+        for index, message in result.errors:
+            self.stdout.write(self.style.ERROR(f"Error importing refinery #{index}: {message}"))
+        
+        # Diff summary: counts, then a sample of the affected refineries
+        for kind, sign in (('created', '+'), ('updated', '~'), ('deleted', '-')):
+            count = getattr(result, kind)
+            for label in result.samples[kind]:
+                self.stdout.write(f"  {sign} {label}")
+            if count > len(result.samples[kind]):
+                self.stdout.write(f"  {sign} ... and {count - len(result.samples[kind])} more")
+        
+        summary = (
+            f'{result.processed} refineries '
+            f'({result.created} created, {result.updated} updated, {result.unchanged} unchanged, '
+            f'{result.deleted} deleted) in {result.elapsed:.2f}s ({result.rate:.0f} rows/s)'
+        )
+        if result.dry_run:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing written: {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully imported {summary}'))
\ No newline at end of file
@@ -0,0 +1,50 @@
+import json
+import os
+
+from core.importers import normalize_in_parallel
+from core.normalization import raffinerie_fields
+from core.streaming import iter_array
+
+from .import_initial_data import Command as ImportInitialDataCommand
+
+# Below this size, starting worker processes costs more than it saves
+PARALLEL_MIN_BYTES = 10 * 1024 * 1024
+
+class Command(ImportInitialDataCommand):
+    help = 'Import refineries from a raffineries.json file (French schema: nom, capacite, statut, metadata...)'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help='Normalization processes (default: one per CPU for files over 10 MB, none otherwise)'
+        )
+
+    def handle(self, *args, **options):
+        json_file = options['json_file']
+        workers = options['workers']
+        
+        try:
+            if not workers:
+                large = os.path.getsize(json_file) >= PARALLEL_MIN_BYTES
+                workers = (os.cpu_count() or 1) if large else 1
+            
+            with open(json_file, 'r', encoding='utf-8') as file:
+                if options['stream']:
+                    records = iter_array(file)
+                else:
+                    records = json.load(file)
+                    if not isinstance(records, list):
+                        self.stdout.write(self.style.ERROR(f'Expected a list of refineries in {json_file}'))
+                        return
+                
+                if workers > 1:
+                    self.stdout.write(f"Normalizing with {workers} processes")
+                    self.import_refineries(normalize_in_parallel(records, raffinerie_fields, workers), options, normalize=None)
+                else:
+                    self.import_refineries(records, options, normalize=raffinerie_fields)
+        
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f'File {json_file} not found'))
+        except json.JSONDecodeError:
+            self.stdout.write(self.style.ERROR(f'Invalid JSON in {json_file}'))
@@ -0,0 +1,7 @@
+from dashboard_common.prune_change_events import PruneCommand
+
+from core.events import change_log
+
+
+class Command(PruneCommand):
+    change_log = change_log
@@ -0,0 +1,9 @@
+from dashboard_common.sse_load_test import LoadTestCommand
+
+from core.events import change_log
+
+
+class Command(LoadTestCommand):
+    change_log = change_log
+    # Model of the synthetic events (throwaway test database)
+    load_test_model = 'core.loadtest'
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['country', 'name', 'id'], name='refinery_country_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:52
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copy of core.capacity.parse_capacity as of this migration: later
+# changes to the parser must not change what the backfill writes.
+
+# Thousands grouped by (narrow/non-breaking) spaces, or a plain number with an
+# optional decimal part
+_NUMBER = r'\d{1,3}(?:[   ]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?'
+_SCALE = r'(?:millions?|k)\b'
+_CAPACITY_RE = re.compile(
+    rf'(?P<low>{_NUMBER})\s*(?P<low_scale>{_SCALE})?'
+    rf'(?:\s*(?:-|–|—|à|a|to)\s*(?P<high>{_NUMBER})\s*(?P<high_scale>{_SCALE})?)?'
+    r'\s*(?P<plus>\+)?'
+)
+_SCALES = {'k': 1e3, 'million': 1e6, 'millions': 1e6}
+
+_GWH_RE = re.compile(r'\bgwh\b')
+_VEHICLES_RE = re.compile(r'\b(?:ve|ev|evs|vehicules?|vehicles?)\b')
+_KG_RE = re.compile(r'\bkg\b')
+_MONTHLY_RE = re.compile(r'\b(?:mois|months?)\b')
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def _to_number(raw, scale):
+    raw = re.sub(r'[   ]', '', raw)
+    if ',' in raw:
+        whole, fraction = raw.split(',', 1)
+        # "1,500" is a thousands separator, "1,5 million" a decimal comma
+        raw = whole + fraction if len(fraction) == 3 and not scale else f'{whole}.{fraction}'
+    return float(raw) * _SCALES.get(scale, 1)
+
+
+def parse_capacity(text):
+    if not text:
+        return None, None, ''
+    normalized = _normalize(text)
+    match = _CAPACITY_RE.search(normalized)
+    if match is None:
+        return None, None, ''
+
+    high_scale = match['high_scale']
+    # "1-2 million": the trailing multiplier applies to both bounds
+    low_scale = match['low_scale'] or high_scale
+    low = _to_number(match['low'], low_scale)
+    if match['high']:
+        high = _to_number(match['high'], high_scale or low_scale)
+    elif match['plus']:
+        high = None
+    else:
+        high = low
+
+    if _GWH_RE.search(normalized):
+        return low, high, 'GWh/yr'
+    if _VEHICLES_RE.search(normalized):
+        return low, high, 'EV/yr'
+
+    factor = 1e-3 if _KG_RE.search(normalized) else 1
+    if _MONTHLY_RE.search(normalized):
+        factor *= 12
+    low = round(low * factor, 3)
+    high = round(high * factor, 3) if high is not None else None
+    return low, high, 't/yr'
+
+
+def backfill_capacity(apps, schema_editor):
+    Refinery = apps.get_model('core', 'Refinery')
+    refineries = list(Refinery.objects.only('id', 'production'))
+    for refinery in refineries:
+        refinery.capacity_min, refinery.capacity_max, refinery.capacity_unit = parse_capacity(refinery.production)
+    Refinery.objects.bulk_update(refineries, ['capacity_min', 'capacity_max', 'capacity_unit'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_refinery_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refinery',
+            name='capacity_max',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Capacité maximale'),
+        ),
+        migrations.AddField(
+            model_name='refinery',
+            name='capacity_min',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Capacité minimale'),
+        ),
+        migrations.AddField(
+            model_name='refinery',
+            name='capacity_unit',
+            field=models.CharField(blank=True, choices=[('t/yr', 'tonnes/an'), ('GWh/yr', 'GWh/an'), ('EV/yr', 'VE/an')], editable=False, max_length=10, verbose_name='Unité de capacité'),
+        ),
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['capacity_min', 'id'], name='refinery_capacity_min_id_idx'),
+        ),
+        migrations.RunPython(backfill_capacity, migrations.RunPython.noop),
+    ]
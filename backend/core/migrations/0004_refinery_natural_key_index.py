@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_refinery_capacity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['name', 'location'], name='refinery_name_location_idx'),
+        ),
+    ]
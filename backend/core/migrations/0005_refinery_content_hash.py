@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:59
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+# Frozen copy of core.normalization.content_hash as of this migration: later
+# changes to the hashed fields must not change what the backfill writes.
+HASHED_FIELDS = [
+    'name', 'location', 'country', 'latitude', 'longitude', 'status',
+    'production', 'processing', 'notes', 'website',
+]
+
+
+def content_hash(values):
+    payload = []
+    for name in HASHED_FIELDS:
+        value = values[name]
+        if name in ('latitude', 'longitude'):
+            value = float(value or 0)
+        payload.append('' if value is None else value)
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode()).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    Refinery = apps.get_model('core', 'Refinery')
+    refineries = list(Refinery.objects.only('id', *HASHED_FIELDS))
+    for refinery in refineries:
+        refinery.content_hash = content_hash({name: getattr(refinery, name) for name in HASHED_FIELDS})
+    Refinery.objects.bulk_update(refineries, ['content_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_refinery_natural_key_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refinery',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Empreinte du contenu'),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
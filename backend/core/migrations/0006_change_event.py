@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:04
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_refinery_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='Modèle')),
+                ('object_id', models.BigIntegerField(verbose_name="Identifiant de l'objet")),
+                ('action', models.CharField(choices=[('create', 'Création'), ('update', 'Modification'), ('delete', 'Suppression')], max_length=10, verbose_name='Action')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Données')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Date')),
+            ],
+            options={
+                'verbose_name': 'Événement de modification',
+                'verbose_name_plural': 'Événements de modification',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:10
+
+from django.db import migrations, models
+
+
+def remove_duplicate_settings(apps, schema_editor):
+    # Keep the row served so far (DashboardSettings.objects.first())
+    DashboardSettings = apps.get_model('core', 'DashboardSettings')
+    first = DashboardSettings.objects.order_by('pk').values_list('pk', flat=True).first()
+    DashboardSettings.objects.exclude(pk=first).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_change_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_settings, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='dashboardsettings',
+            name='singleton',
+            field=models.BooleanField(default=True, editable=False, unique=True, verbose_name='Instance unique'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_dashboard_settings_singleton'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='refinery',
+            name='refinery_capacity_min_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['country', 'id'], name='refinery_country_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['name', 'id'], name='refinery_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['status', 'id'], name='refinery_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['capacity_unit', 'capacity_min', 'id'], name='refinery_unit_cap_min_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refinery',
+            index=models.Index(fields=['capacity_unit', 'capacity_max', 'id'], name='refinery_unit_cap_max_id_idx'),
+        ),
+    ]
@@ -1,7 +1,11 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
+from .capacity import CAPACITY_UNIT_CHOICES, parse_capacity
+from .normalization import HASHED_FIELDS, content_hash
+
 class Refinery(models.Model):
     """Model representing a battery recycling facility"""
     
@@ -26,19 +30,55 @@ class Refinery(models.Model):
     longitude = models.FloatField(_('Longitude'))
     status = models.CharField(_('Statut'), max_length=20, choices=STATUS_CHOICES)
     production = models.CharField(_('Production'), max_length=200, blank=True, null=True)
+    # Parsed from ``production`` on save (see core.capacity); NULL when unknown
+    capacity_min = models.FloatField(_('Capacité minimale'), null=True, blank=True, editable=False)
+    capacity_max = models.FloatField(_('Capacité maximale'), null=True, blank=True, editable=False)
+    capacity_unit = models.CharField(
+        _('Unité de capacité'), max_length=10, choices=CAPACITY_UNIT_CHOICES, blank=True, editable=False
+    )
     processing = models.CharField(_('Technologie'), max_length=200, blank=True, null=True)
     notes = models.TextField(_('Notes'), blank=True, null=True)
     website = models.URLField(_('Site web'), blank=True, null=True)
+    # SHA-1 of the source fields, compared by the importers to skip unchanged rows
+    content_hash = models.CharField(_('Empreinte du contenu'), max_length=40, blank=True, editable=False)
     created_at = models.DateTimeField(_('Créé le'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Mis à jour le'), auto_now=True)
     
+    # R*Tree index on the coordinates (see dashboard_common.spatial)
+    spatial_index = True
+
     class Meta:
         verbose_name = _('Installation de recyclage')
         verbose_name_plural = _('Installations de recyclage')
         ordering = ['country', 'name']
+        # Support cursor pagination on the default ordering and on every
+        # ?ordering= field (tie-broken on id; capacities grouped by unit)
+        indexes = [
+            models.Index(fields=['country', 'name', 'id'], name='refinery_country_name_id_idx'),
+            models.Index(fields=['country', 'id'], name='refinery_country_id_idx'),
+            models.Index(fields=['name', 'id'], name='refinery_name_id_idx'),
+            models.Index(fields=['status', 'id'], name='refinery_status_id_idx'),
+            models.Index(fields=['capacity_unit', 'capacity_min', 'id'], name='refinery_unit_cap_min_id_idx'),
+            models.Index(fields=['capacity_unit', 'capacity_max', 'id'], name='refinery_unit_cap_max_id_idx'),
+            # Natural key used by the bulk importer
+            models.Index(fields=['name', 'location'], name='refinery_name_location_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.location}"
+
+    def save(self, *args, **kwargs):
+        self.capacity_min, self.capacity_max, self.capacity_unit = parse_capacity(self.production)
+        self.content_hash = content_hash({name: getattr(self, name) for name in HASHED_FIELDS})
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'production' in update_fields:
+                update_fields |= {'capacity_min', 'capacity_max', 'capacity_unit'}
+            if update_fields & set(HASHED_FIELDS):
+                update_fields.add('content_hash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
     
     @property
     def coordinates(self):
@@ -47,15 +87,44 @@ class Refinery(models.Model):
 
 
 class DashboardSettings(models.Model):
-    """Model for storing dashboard settings"""
+    """Model for storing dashboard settings (single row, see core.dashboard_settings)"""
     version = models.CharField(_('Version'), max_length=20)
     last_updated = models.DateTimeField(_('Dernière mise à jour'), auto_now=True)
     status_colors = models.JSONField(_('Couleurs des statuts'), default=dict)
     chart_colors = models.JSONField(_('Couleurs des graphiques'), default=list)
+    # Always true: the unique constraint rules out a second row
+    singleton = models.BooleanField(_('Instance unique'), default=True, unique=True, editable=False)
     
     class Meta:
         verbose_name = _('Paramètres du dashboard')
         verbose_name_plural = _('Paramètres du dashboard')
     
     def __str__(self):
-        return f"Dashboard Settings v{self.version}"
\ No newline at end of file
+        return f"Dashboard Settings v{self.version}"
+
+class ChangeEvent(models.Model):
+    """
+    Log of creations, updates and deletions (see core.events.LOGGED_MODELS),
+    streamed by the SSE feed and read by the incremental sync. The increasing
+    id is the Last-Event-ID used to resume after a disconnection, and the
+    sync token.
+    """
+    ACTION_CHOICES = [
+        ('create', _('Création')),
+        ('update', _('Modification')),
+        ('delete', _('Suppression')),
+    ]
+
+    model = models.CharField(_('Modèle'), max_length=100)
+    object_id = models.BigIntegerField(_("Identifiant de l'objet"))
+    action = models.CharField(_('Action'), max_length=10, choices=ACTION_CHOICES)
+    data = models.JSONField(_('Données'), default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(_('Date'), auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _('Événement de modification')
+        verbose_name_plural = _('Événements de modification')
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.model} {self.object_id}"
@@ -0,0 +1,102 @@
+"""Mapping of import file records to ``Refinery`` field values.
+
+Kept free of model imports so the functions can run in worker processes
+(``core.importers.normalize_in_parallel``) without setting up Django.
+"""
+import hashlib
+import json
+
+from .capacity import parse_capacity
+
+STATUS_MAPPING = {
+    # French values
+    'Opérationnel': 'operational',
+    'En construction': 'construction',
+    'Planifié': 'planned',
+    'Approuvé': 'approved',
+    'En pause': 'suspended',
+    'En suspens': 'suspended',
+}
+
+# Source fields covered by Refinery.content_hash (derived columns excluded)
+HASHED_FIELDS = [
+    'name', 'location', 'country', 'latitude', 'longitude', 'status',
+    'production', 'processing', 'notes', 'website',
+]
+
+COUNTRY_MAPPING = {
+    'États-Unis': 'USA',
+    'Etats-Unis': 'USA',
+    'Mexique': 'Mexico',
+}
+
+
+def content_hash(values):
+    """
+    SHA-1 of the source fields of a refinery (field name -> value).
+    NULL and '' hash alike, coordinates are compared as floats.
+    """
+    payload = []
+    for name in HASHED_FIELDS:
+        value = values[name]
+        if name in ('latitude', 'longitude'):
+            value = float(value or 0)
+        payload.append('' if value is None else value)
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode()).hexdigest()
+
+
+def refinery_fields(record):
+    """Model field values for one ``initial_data.json`` record"""
+    name = (record.get('name') or '').strip()
+    if not name:
+        raise ValueError("missing name")
+    coordinates = record.get('coordinates') or [0, 0]
+    latitude = float(coordinates[0]) if len(coordinates) > 0 else 0.0
+    longitude = float(coordinates[1]) if len(coordinates) > 1 else 0.0
+    status = record.get('status', 'planned')
+    country = record.get('country', 'Canada')
+
+    values = {
+        'name': name,
+        'location': record.get('location', ''),
+        'country': COUNTRY_MAPPING.get(country, country),
+        'latitude': latitude,
+        'longitude': longitude,
+        'status': STATUS_MAPPING.get(status, status),
+        'production': record.get('production', ''),
+        'processing': record.get('processing', ''),
+        'notes': record.get('notes', ''),
+        'website': record.get('website', ''),
+    }
+    # bulk_create/bulk_update bypass Refinery.save(), which keeps these in sync
+    values['capacity_min'], values['capacity_max'], values['capacity_unit'] = parse_capacity(values['production'])
+    values['content_hash'] = content_hash(values)
+    return values
+
+
+def raffinerie_fields(record):
+    """
+    Model field values for one ``data/raffineries.json`` record (French
+    schema: ``nom``, ``capacite``, ``statut``, ``process_type`` and
+    ``metadata.pays/localisation/notes/site_web``).
+    """
+    metadata = record.get('metadata') or {}
+    return refinery_fields({
+        'name': record.get('nom'),
+        'location': metadata.get('localisation') or '',
+        'country': metadata.get('pays') or 'Canada',
+        'coordinates': [record.get('latitude') or 0, record.get('longitude') or 0],
+        'status': record.get('statut') or 'planned',
+        'production': record.get('capacite') or '',
+        'processing': record.get('process_type') or '',
+        'notes': metadata.get('notes') or '',
+        'website': metadata.get('site_web') or '',
+    })
+
+
+def safe_normalize(normalize, record):
+    """``(values, None)`` or ``(None, message)``: exceptions do not cross process boundaries cleanly"""
+    try:
+        return normalize(record), None
+    except (TypeError, ValueError, IndexError, AttributeError) as exc:
+        return None, str(exc)
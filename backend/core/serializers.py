@@ -1,22 +1,87 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
 from .models import Refinery, DashboardSettings
 
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Serializer with request-driven sparse fieldsets:
+
+    - ``?fields=a,b`` keeps only the requested fields (reads only);
+    - fields listed in ``Meta.expandable_fields`` are only included with ``?expand=``.
+
+    Only the root serializer (or the child of a root list) is affected;
+    nested serializers keep all their fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self.is_top_level():
+            return fields
+
+        expand = parse_field_list(request.query_params.get('expand'))
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+
+        requested = parse_field_list(request.query_params.get('fields'))
+        if requested and request.method in SAFE_METHODS:
+            for name in list(fields):
+                if name not in requested and name not in expand:
+                    fields.pop(name)
+        return fields
+
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_source_columns(self):
+        """
+        Model columns read by the selected fields, for ``QuerySet.only()``.
+        Returns None when a source is unknown (property, method field not
+        declared in ``Meta.method_field_sources``): nothing may be deferred then.
+        """
+        opts = self.Meta.model._meta
+        declared = getattr(self.Meta, 'method_field_sources', {})
+        columns = {opts.pk.name}
+        for name, field in self.fields.items():
+            if field.source == '*':
+                if name not in declared:
+                    return None
+                columns.update(declared[name])
+                continue
+            try:
+                model_field = opts.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                return None
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+        return columns
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name')
 
 
-class RefinerySerializer(serializers.ModelSerializer):
+class RefinerySerializer(DynamicFieldsModelSerializer):
     coordinates = serializers.SerializerMethodField()
     
     class Meta:
         model = Refinery
         fields = (
             'id', 'name', 'location', 'country', 'coordinates', 'status',
-            'production', 'processing', 'notes', 'website', 'created_at', 'updated_at'
+            'production', 'capacity_min', 'capacity_max', 'capacity_unit',
+            'processing', 'notes', 'website', 'created_at', 'updated_at'
         )
+        method_field_sources = {'coordinates': ['latitude', 'longitude']}
     
     def get_coordinates(self, obj):
         return [obj.latitude, obj.longitude]
@@ -56,7 +121,12 @@ class RefineryCreateUpdateSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class DashboardSettingsSerializer(serializers.ModelSerializer):
+class DashboardSettingsSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = DashboardSettings
-        fields = ('id', 'version', 'last_updated', 'status_colors', 'chart_colors')
\ No newline at end of file
+        fields = ('id', 'version', 'last_updated', 'status_colors', 'chart_colors')
+
+    def validate(self, attrs):
+        if self.instance is None and DashboardSettings.objects.exists():
+            raise serializers.ValidationError("Settings already exist: update them instead of creating new ones")
+        return attrs
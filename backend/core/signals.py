@@ -0,0 +1,71 @@
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from dashboard_common.cache import bump_data_version, publish_settings_version
+from dashboard_common.spatial import ensure_spatial_index
+from dashboard_common.tiles import tile_point
+
+from .events import LOGGED_MODELS, record_change
+from .models import DashboardSettings, Refinery
+from .tiles import refinery_layer
+
+
+@receiver(pre_save, sender=Refinery)
+def remember_tile_fields(sender, instance, raw=False, **kwargs):
+    """Keep the position and layer attributes as they were before the write"""
+    instance._tile_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._tile_previous = Refinery.objects.filter(pk=instance.pk).values(*refinery_layer.fields).first()
+
+
+@receiver(post_save, sender=Refinery)
+def invalidate_tiles_on_save(sender, instance, raw=False, **kwargs):
+    """Only invalidate the tiles of the old and new position, and only when the layer changes"""
+    if raw:
+        return
+    previous = getattr(instance, '_tile_previous', None)
+    current = refinery_layer.values(instance)
+    if previous != current:
+        refinery_layer.invalidate_points([tile_point(previous), tile_point(current)])
+
+
+@receiver(post_delete, sender=Refinery)
+def invalidate_tiles_on_delete(sender, instance, **kwargs):
+    refinery_layer.invalidate_points([tile_point(refinery_layer.values(instance))])
+
+
+@receiver(post_save)
+def log_change_on_save(sender, instance, created, raw=False, **kwargs):
+    """Log the write (SSE feed, incremental sync), in the same transaction"""
+    if raw or sender not in LOGGED_MODELS:
+        return
+    record_change(instance, 'create' if created else 'update')
+
+
+@receiver(post_delete)
+def log_change_on_delete(sender, instance, **kwargs):
+    if sender in LOGGED_MODELS:
+        record_change(instance, 'delete')
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, **kwargs):
+    """Invalidate cached responses that depend on the written model"""
+    if sender._meta.app_label == 'core':
+        bump_data_version(sender)
+
+
+@receiver(post_save, sender=DashboardSettings)
+def publish_settings_version_on_save(sender, instance, raw=False, **kwargs):
+    """A version edited through the API or the admin is also the global cache-busting key"""
+    if not raw:
+        publish_settings_version(instance.version)
+
+
+@receiver(post_migrate)
+def create_spatial_index(sender, using, **kwargs):
+    """(Re)create the R*Tree index and its triggers, lost when a migration rebuilt the table"""
+    if sender.name == 'core':
+        ensure_spatial_index(using)
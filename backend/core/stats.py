@@ -0,0 +1,39 @@
+"""Aggregate statistics for refineries, computed in a single query."""
+from collections import defaultdict
+
+from django.db.models import Count, Q, Sum
+
+from .capacity import TONNES_PER_YEAR
+
+BREAKDOWNS = ('status', 'country', 'processing')
+
+
+def refinery_stats(queryset):
+    """
+    Counts and capacity totals (tonnes per year, lower bound of each range)
+    overall and broken down by status, country and processing technology.
+
+    A single ``GROUP BY status, country, processing`` query with a
+    conditional sum returns every combination; the breakdowns are folded
+    from those rows in Python instead of one query per dimension.
+    """
+    rows = queryset.order_by().values(*BREAKDOWNS).annotate(
+        count=Count('id'),
+        capacity=Sum('capacity_min', filter=Q(capacity_unit=TONNES_PER_YEAR)),
+    )
+
+    total = {'count': 0, 'capacity': 0}
+    breakdowns = {name: defaultdict(lambda: {'count': 0, 'capacity': 0}) for name in BREAKDOWNS}
+    for row in rows:
+        capacity = row['capacity'] or 0
+        total['count'] += row['count']
+        total['capacity'] += capacity
+        for name in BREAKDOWNS:
+            bucket = breakdowns[name][row[name] or '']
+            bucket['count'] += row['count']
+            bucket['capacity'] += capacity
+
+    return {
+        'total': total,
+        **{f'by_{name}': dict(sorted(buckets.items())) for name, buckets in breakdowns.items()},
+    }
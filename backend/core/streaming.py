@@ -0,0 +1,122 @@
+"""Incremental reading of large JSON import files.
+
+``iter_object`` walks the top-level object of a file chunk by chunk with
+``json.JSONDecoder.raw_decode``. The arrays named in ``stream_keys`` (or a
+top-level array, with ``iter_array``) are yielded lazily, one element at a
+time, so memory stays bounded by the chunk size and the largest single
+element rather than by the file size.
+"""
+import json
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\n\r'
+
+
+class JSONStreamReader:
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk; False at end of file"""
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop the consumed prefix so the buffer does not grow with the file
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def error(self, message):
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def peek(self):
+        """Next non-whitespace character (consumed whitespace), '' at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error(f"Expecting '{char}'")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self):
+        """Elements of the array starting at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                self.pos -= 1
+                raise self.error("Expecting ',' delimiter")
+
+
+def iter_object(file, stream_keys=(), chunk_size=CHUNK_SIZE):
+    """
+    Yield ``(key, value)`` for each member of the top-level JSON object in
+    ``file``. Members listed in ``stream_keys`` must be arrays; their value
+    is a generator of elements that has to be consumed before the next
+    member is read (remaining elements are skipped otherwise).
+    """
+    reader = JSONStreamReader(file, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise reader.error("Expecting property name")
+        reader.expect(':')
+        if key in stream_keys:
+            elements = reader.array()
+            yield key, elements
+            for _ in elements:
+                pass
+        else:
+            yield key, reader.value()
+        separator = reader.peek()
+        if separator == '}':
+            return
+        reader.expect(',')
+
+
+def iter_array(file, chunk_size=CHUNK_SIZE):
+    """Elements of the top-level JSON array in ``file``, one at a time"""
+    reader = JSONStreamReader(file, chunk_size)
+    yield from reader.array()
+    if reader.peek():
+        raise reader.error("Extra data")
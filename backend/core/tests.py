@@ -0,0 +1,686 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import struct
+import tempfile
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase as DjangoTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from dashboard_common import clusters, dashboard_settings, spatial, tiles
+from dashboard_common.cache import get_data_versions
+from dashboard_common.pagination import KeysetPagination
+
+from . import events
+from .capacity import GWH_PER_YEAR, TONNES_PER_YEAR, VEHICLES_PER_YEAR, parse_capacity
+from .models import ChangeEvent, DashboardSettings, Refinery
+from .streaming import iter_object
+from .tiles import refinery_layer
+from .views import RefineryViewSet
+
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-responses'},
+    'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-versions'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TestCase(DjangoTestCase):
+    """
+    Runs on in-memory caches, cleared between tests: rolling back the test
+    transaction does not renew versions, and the file-based ``versions``
+    cache of the settings must not be touched
+    """
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+
+
+def create_refinery(name, **kwargs):
+    fields = {
+        'location': 'Montréal, QC', 'country': 'Canada',
+        'latitude': 45.5, 'longitude': -73.5, 'status': 'operational',
+    }
+    fields.update(kwargs)
+    return Refinery.objects.create(name=name, **fields)
+
+
+class KeysetPaginationTests(TestCase):
+    url = reverse('refinery-list')
+
+    def setUp(self):
+        super().setUp()
+        for i in range(7):
+            create_refinery(f"Refinery {i % 3}", country=['Canada', 'USA'][i % 2])
+
+    @mock.patch.object(KeysetPagination, 'page_size', 3)
+    def test_walks_default_ordering_with_ties(self):
+        expected = list(Refinery.objects.order_by('country', 'name', 'id').values_list('id', flat=True))
+        ids, response = [], self.client.get(self.url)
+        while True:
+            ids += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, expected)
+        self.assertNotIn('count', response.data)
+
+    def test_page_numbers_on_request(self):
+        response = self.client.get(self.url, {'pagination': 'page'})
+        self.assertEqual(response.data['count'], 7)
+
+    def test_every_ordering_field_pages_on_an_index(self):
+        for ordering in RefineryViewSet.ordering_fields:
+            with self.subTest(ordering=ordering), CaptureQueriesContext(connection) as queries:
+                self.client.get(self.url, {'ordering': f'-{ordering}'})
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+                plan = ' '.join(str(row) for row in cursor.fetchall())
+            # Nullable capacities carry a NULLS modifier: SQLite follows the
+            # index on capacity_unit and only sorts within each unit
+            self.assertIn('USING INDEX', plan, ordering)
+            self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan, ordering)
+
+
+class SparseFieldsetTests(TestCase):
+    def test_fields_prunes_output_and_columns(self):
+        create_refinery("EcoBatt", notes="x" * 1000)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('refinery-list'), {'fields': 'id,name,coordinates'})
+
+        self.assertEqual(response.data['results'][0], {'id': mock.ANY, 'name': "EcoBatt", 'coordinates': [45.5, -73.5]})
+        self.assertNotIn('notes', queries[0]['sql'])
+
+
+class ListQueryCountTests(TestCase):
+    """List endpoints must run O(1) queries regardless of the row count"""
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('refinery-list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_refinery_list_runs_constant_queries(self):
+        create_refinery("EcoBatt")
+        before = self.count_queries()
+        for i in range(10):
+            create_refinery(f"Refinery {i}")
+        self.assertEqual(self.count_queries(), before)
+
+
+class ResponseCacheTests(TestCase):
+    def test_stats_are_cached_until_a_refinery_changes(self):
+        url = reverse('refinery-stats')
+        create_refinery("EcoBatt")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['total_refineries'], 1)
+
+        create_refinery("GreenLi", status='construction')
+        response = self.client.get(url)
+        self.assertEqual(response.data['total_refineries'], 2)
+        self.assertEqual(response.data['construction_refineries'], 1)
+
+
+class ConditionalGetTests(TestCase):
+    url = reverse('refinery-list')
+
+    def test_matching_etag_returns_304_without_queries(self):
+        create_refinery("Refinery A")
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        create_refinery("Refinery B")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CapacityParserTests(SimpleTestCase):
+    def test_parse_capacity(self):
+        cases = {
+            "5000 tpa": (5000, 5000, TONNES_PER_YEAR),
+            "10 000-20 000 tonnes de batteries par an": (10000, 20000, TONNES_PER_YEAR),
+            "600-1 100 tonnes de pCAM par an": (600, 1100, TONNES_PER_YEAR),
+            "10 000+ tonnes de masse noire par an": (10000, None, TONNES_PER_YEAR),
+            "2500 kg/mois": (30, 30, TONNES_PER_YEAR),
+            "1,500 tonnes": (1500, 1500, TONNES_PER_YEAR),
+            "60 GWh par an (prévu)": (60, 60, GWH_PER_YEAR),
+            "1 million de VE par an (prévu)": (1e6, 1e6, VEHICLES_PER_YEAR),
+            "N/A": (None, None, ''),
+            "Not specified": (None, None, ''),
+            None: (None, None, ''),
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(tuple(parse_capacity(text)), expected)
+
+
+class CapacityTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        create_refinery("Small", production="3000 tpa")
+        create_refinery("Range", production="10 000-20 000 tonnes de batteries par an")
+        create_refinery("Cells", production="60 GWh par an")
+        create_refinery("Unknown", production="N/A")
+
+    def test_capacity_is_kept_in_sync_on_save(self):
+        refinery = Refinery.objects.get(name="Small")
+        refinery.production = "7500 tpa"
+        refinery.save(update_fields=['production'])
+        refinery.refresh_from_db()
+        self.assertEqual((refinery.capacity_min, refinery.capacity_max), (7500, 7500))
+
+    def test_min_capacity_filter_and_ordering(self):
+        response = self.client.get(reverse('refinery-list'), {'min_capacity': 5000})
+        self.assertEqual([row['name'] for row in response.data['results']], ["Range"])
+
+        # Capacities are grouped by unit before being compared
+        response = self.client.get(reverse('refinery-list'), {'ordering': '-capacity_min'})
+        self.assertEqual([row['name'] for row in response.data['results']], ["Range", "Small", "Cells", "Unknown"])
+        response = self.client.get(reverse('refinery-list'), {'ordering': 'capacity_max'})
+        self.assertEqual([row['name'] for row in response.data['results']], ["Unknown", "Cells", "Small", "Range"])
+
+    def test_stats_sum_capacity_in_sql(self):
+        response = self.client.get(reverse('refinery-stats'))
+        self.assertEqual(response.data['total_capacity'], "13000")
+
+
+class RefineryStatsTests(TestCase):
+    url = reverse('refinery-stats')
+
+    def setUp(self):
+        super().setUp()
+        create_refinery("A", production="3000 tpa", processing="Hydrométallurgie")
+        create_refinery("B", production="5000 tpa", processing="Hydrométallurgie", status='construction')
+        create_refinery("C", production="N/A", country='USA')
+
+    def test_breakdowns_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['total'], {'count': 3, 'capacity': 8000})
+        self.assertEqual(response.data['by_country'], {
+            'Canada': {'count': 2, 'capacity': 8000}, 'USA': {'count': 1, 'capacity': 0},
+        })
+        self.assertEqual(response.data['by_processing']['Hydrométallurgie'], {'count': 2, 'capacity': 8000})
+        self.assertEqual(response.data['construction_refineries'], 1)
+
+    def test_accepts_list_filters(self):
+        response = self.client.get(self.url, {'status': 'operational'})
+        self.assertEqual(response.data['total'], {'count': 2, 'capacity': 3000})
+        self.assertEqual(list(response.data['by_status']), ['operational'])
+
+
+class LegacyRecyclingPlantTests(TestCase):
+    url = reverse('recycling-plants')
+
+    def test_legacy_format_cached_until_write(self):
+        refinery = create_refinery("EcoBatt", production="5,000 tpa")
+        create_refinery("Unknown", production="N/A")
+        data = self.client.get(self.url).json()
+        self.assertEqual(data[0]['capacity'], '5000')
+        self.assertEqual(data[0]['current_production'], '3750')
+        self.assertEqual(data[0]['recycling_rate'], 50 + refinery.id % 40)
+        self.assertEqual(data[1]['capacity'], '10000')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), data)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.json(), data)
+
+        refinery.production = "7500 tpa"
+        refinery.save()
+        self.assertEqual(self.client.get(self.url).json()[0]['capacity'], '7500')
+
+
+class ImportInitialDataTests(TestCase):
+    def run_import(self, refineries, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as file:
+            json.dump({'refineries': refineries}, file)
+        self.addCleanup(os.remove, file.name)
+        out = io.StringIO()
+        call_command('import_initial_data', file.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_upserts_on_name_and_location(self):
+        kept = create_refinery("Kept", location="Québec, QC")
+        create_refinery("Stale")
+        records = [
+            {'name': "Kept", 'location': "Québec, QC", 'status': 'Opérationnel', 'production': "5000 tpa"},
+            {'name': "New", 'location': "Toronto, ON", 'coordinates': [43.6, -79.4]},
+            {'location': "Nowhere"},
+        ]
+        output = self.run_import(records, '--prune')
+        self.assertIn("2 refineries (1 created, 1 updated, 0 unchanged, 1 deleted)", output)
+        self.assertIn("missing name", output)
+
+        kept.refresh_from_db()
+        self.assertEqual((kept.status, kept.capacity_min), ('operational', 5000))
+        self.assertEqual(sorted(Refinery.objects.values_list('name', flat=True)), ["Kept", "New"])
+
+        self.run_import(records)
+        self.assertEqual(Refinery.objects.count(), 2)
+
+    def test_unchanged_records_are_not_written(self):
+        records = [
+            {'name': "A", 'location': "Québec, QC", 'coordinates': [46.8, -71.2], 'production': "3000 tpa"},
+            {'name': "B", 'location': "Laval, QC", 'coordinates': [45.6, -73.7]},
+        ]
+        self.run_import(records)
+        stamps = dict(Refinery.objects.values_list('name', 'updated_at'))
+        versions = get_data_versions(Refinery)
+
+        records[1]['production'] = "5000 tpa"
+        output = self.run_import(records)
+        self.assertIn("2 refineries (0 created, 1 updated, 1 unchanged, 0 deleted)", output)
+        self.assertIn("~ B (Laval, QC)", output)
+        self.assertEqual(Refinery.objects.get(name="A").updated_at, stamps["A"])
+        self.assertNotEqual(Refinery.objects.get(name="B").updated_at, stamps["B"])
+        self.assertNotEqual(get_data_versions(Refinery), versions)
+
+        versions = get_data_versions(Refinery)
+        self.assertIn("0 created, 0 updated, 2 unchanged", self.run_import(records))
+        self.assertEqual(get_data_versions(Refinery), versions)
+
+    def test_dry_run_writes_nothing(self):
+        create_refinery("Stale")
+        records = [{'name': "New", 'location': "Toronto, ON"}, {'name': "New", 'location': "Toronto, ON"}]
+        output = self.run_import(records, '--dry-run', '--prune', '--batch-size', '1')
+        self.assertIn("Dry run, nothing written: 2 refineries (1 created, 0 updated, 1 unchanged, 1 deleted)", output)
+        self.assertIn("+ New (Toronto, ON)", output)
+        self.assertIn("- Stale (Montréal, QC)", output)
+        self.assertEqual(list(Refinery.objects.values_list('name', flat=True)), ["Stale"])
+
+    def test_stream_mode(self):
+        records = [{'name': f"R{i}", 'location': "Montréal, QC", 'production': "3000 tpa"} for i in range(30)]
+        output = self.run_import(records, '--stream', '--batch-size', '7')
+        self.assertIn("30 refineries (30 created, 0 updated, 0 unchanged, 0 deleted)", output)
+        self.assertEqual(Refinery.objects.filter(capacity_min=3000).count(), 30)
+
+
+class StreamingParserTests(SimpleTestCase):
+    def test_small_chunks_match_json_load(self):
+        document = {
+            'version': '2025-01-01',
+            'refineries': [{'name': f'R{i}', 'notes': 'a "b" {c}' * i, 'coordinates': [45.5, -73.5]} for i in range(20)],
+            'chart_colors': ['#4a6bff'],
+        }
+        text = json.dumps(document, indent=2)
+        for chunk_size in (1, 7, 4096):
+            parsed = {
+                key: list(value) if key == 'refineries' else value
+                for key, value in iter_object(io.StringIO(text), {'refineries'}, chunk_size=chunk_size)
+            }
+            self.assertEqual(parsed, document)
+
+    def test_truncated_file_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            for key, value in iter_object(io.StringIO('{"refineries": [{"name": "A"}, {"na'), {'refineries'}):
+                list(value)
+
+
+class ImportRaffineriesTests(TestCase):
+    records = [
+        {
+            'nom': "Li-Cycle", 'capacite': "10 000+ tonnes de masse noire par an", 'statut': "Opérationnel",
+            'latitude': 44.2312, 'longitude': -76.486, 'process_type': "Hydrométallurgie",
+            'metadata': {'pays': "États-Unis", 'localisation': "Kingston", 'site_web': "https://li-cycle.com/"},
+        },
+        {'nom': "Lithion", 'capacite': "N/A", 'statut': "En pause", 'latitude': 45.5, 'longitude': -73.3, 'metadata': {}},
+        {'capacite': "5000 tpa"},
+    ]
+
+    def run_import(self, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as file:
+            json.dump(self.records, file)
+        self.addCleanup(os.remove, file.name)
+        out = io.StringIO()
+        call_command('import_raffineries', file.name, *args, stdout=out)
+        return out.getvalue()
+
+    def check_imported(self, output):
+        self.assertIn("2 refineries (2 created", output)
+        self.assertIn("Error importing refinery #2: missing name", output)
+        li_cycle = Refinery.objects.get(name="Li-Cycle")
+        self.assertEqual(
+            (li_cycle.country, li_cycle.status, li_cycle.capacity_min, li_cycle.capacity_max, li_cycle.website),
+            ('USA', 'operational', 10000, None, "https://li-cycle.com/"),
+        )
+        self.assertEqual(Refinery.objects.get(name="Lithion").status, 'suspended')
+
+    def test_import(self):
+        self.check_imported(self.run_import())
+
+    def test_parallel_streamed_import(self):
+        self.check_imported(self.run_import('--stream', '--workers', '2'))
+
+
+class ChangeEventTests(TestCase):
+    url = reverse('change-events')
+
+    def test_writes_and_imports_are_logged(self):
+        refinery = create_refinery("EcoBatt")
+        refinery_id = refinery.pk
+        refinery.delete()
+        call_command('import_raffineries', '../data/raffineries.json', stdout=io.StringIO())
+
+        logged = list(ChangeEvent.objects.values_list('action', 'object_id'))
+        self.assertEqual(logged[:2], [('create', refinery_id), ('delete', refinery_id)])
+        self.assertEqual(len(logged), 2 + Refinery.objects.count())
+        self.assertEqual(ChangeEvent.objects.last().data['name'], Refinery.objects.order_by('id').last().name)
+
+    async def read(self, response):
+        chunk = await asyncio.wait_for(anext(aiter(response.streaming_content)), 5)
+        return chunk.decode()
+
+    @mock.patch('dashboard_common.events.POLL_INTERVAL', 0.01)
+    async def test_stream_resumes_then_follows(self):
+        first = await sync_to_async(create_refinery)("Refinery A")
+        await sync_to_async(create_refinery)("Refinery B")
+        first_event = await ChangeEvent.objects.aget(object_id=first.pk)
+
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': str(first_event.id)})
+        try:
+            self.assertTrue((await self.read(response)).startswith('retry:'))
+            self.assertIn('"name":"Refinery B"', await self.read(response))
+            await sync_to_async(create_refinery)("Refinery C")
+            self.assertIn('"name":"Refinery C"', await self.read(response))
+        finally:
+            await response.streaming_content.aclose()
+            if events.feed.task is not None:
+                events.feed.task.cancel()
+
+
+class SyncTests(TestCase):
+    url = reverse('sync')
+
+    def sync(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_compacted_changes_since_token(self):
+        kept = create_refinery("Refinery A")
+        token = self.sync()['token']
+        kept.status = 'construction'
+        kept.save()
+        removed = create_refinery("Refinery B")
+        removed_id = removed.pk
+        removed.delete()
+        DashboardSettings.objects.create(version='2', status_colors={}, chart_colors=[])
+
+        data = self.sync(since=token, models='refinery')
+
+        refineries = data['changes']['refinery']
+        self.assertEqual([(row['id'], row['status']) for row in refineries['upserted']], [(kept.pk, 'construction')])
+        self.assertEqual(refineries['deleted'], [removed_id])
+        self.assertEqual(list(data['changes']), ['refinery'])
+        self.assertEqual(self.sync(since=data['token'])['changes'], {})
+
+    def test_batches_and_expired_tokens(self):
+        token = self.sync()['token']
+        for name in ("Refinery A", "Refinery B", "Refinery C"):
+            create_refinery(name)
+
+        first = self.sync(since=token, limit=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual(len(self.sync(since=first['token'], limit=2)['changes']['refinery']['upserted']), 1)
+
+        ChangeEvent.objects.filter(id__lte=int(first['token'])).delete()
+        self.assertEqual(self.client.get(self.url, {'since': token}).status_code, 410)
+
+
+class DashboardSettingsTests(TestCase):
+    current_url = reverse('dashboardsettings-current')
+    increment_url = reverse('dashboardsettings-increment-version')
+
+    def test_current_is_a_cached_singleton(self):
+        first = self.client.get(self.current_url).json()
+        self.client.get(self.current_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.current_url).json(), first)
+        self.assertEqual(DashboardSettings.objects.count(), 1)
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.post(reverse('dashboardsettings-list'), {
+            'version': '2', 'status_colors': {}, 'chart_colors': [],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_increment_version(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        today = self.client.get(self.current_url).json()['version']
+
+        self.assertEqual(self.client.post(self.increment_url).json()['version'], f'{today}-v1')
+        self.assertEqual(self.client.post(self.increment_url).json()['version'], f'{today}-v2')
+        self.assertEqual(self.client.get(self.current_url).json()['version'], f'{today}-v2')
+
+    def test_increment_version_is_a_retried_compare_and_swap(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        today = self.client.get(self.current_url).json()['version']
+        etag = self.client.get(reverse('refinery-list'))['ETag']
+        original_next_version = dashboard_settings.next_version
+
+        def publish_concurrently(current, now):
+            if current == today:
+                DashboardSettings.objects.update(version=f'{today}-v5')
+            return original_next_version(current, now)
+
+        with mock.patch.object(dashboard_settings, 'next_version', side_effect=publish_concurrently), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.increment_url)
+
+        self.assertEqual(response.json()['version'], f'{today}-v6')
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "core_dashboardsettings"')]
+        self.assertEqual(len(updates), 3)
+        self.assertTrue(all('status_colors' not in sql for sql in updates))
+        # The published version is part of every ETag and response cache key
+        self.assertNotEqual(self.client.get(reverse('refinery-list'))['ETag'], etag)
+
+
+class BoundingBoxTests(TestCase):
+    url = reverse('refinery-list')
+
+    def names(self, bbox):
+        response = self.client.get(self.url, {'bbox': bbox, 'fields': 'name'})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']]
+
+    def test_filters_on_the_spatial_index(self):
+        montreal = create_refinery("Montréal", latitude=45.5, longitude=-73.6)
+        create_refinery("Québec", latitude=46.8, longitude=-71.2)
+        create_refinery("Fiji", latitude=-17.7, longitude=179.5)
+
+        self.assertEqual(self.names('-74,45,-73,46'), ["Montréal"])
+        self.assertEqual(self.names('179,-20,-179,-15'), ["Fiji"])
+        montreal.latitude = 10
+        montreal.save()
+        self.assertEqual(self.names('-80,40,-70,50'), ["Québec"])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{spatial.rtree_table(Refinery)}"')
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+        self.assertEqual(self.client.get(self.url, {'bbox': '-74,50,-73'}).status_code, 400)
+
+
+def parse_protobuf(data):
+    """(field, value) pairs of a protobuf message: int, bytes or double"""
+    fields, position = [], 0
+
+    def varint():
+        nonlocal position
+        value = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    while position < len(data):
+        key = varint()
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            fields.append((field, varint()))
+        elif wire_type == 1:
+            fields.append((field, struct.unpack('<d', data[position:position + 8])[0]))
+            position += 8
+        else:
+            length = varint()
+            fields.append((field, data[position:position + length]))
+            position += length
+    return fields
+
+
+class VectorTileTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        refinery_layer.cache.clear()
+
+    def tile_url(self, z, x, y):
+        return reverse('vector-tile', kwargs={'z': z, 'x': x, 'y': y})
+
+    def test_encodes_refineries_and_invalidates_touched_tiles(self):
+        refinery = create_refinery("Montréal", production="20,000-25,000 t")
+        create_refinery("Nevada", latitude=39.5, longitude=-119.8)
+
+        layer = dict(parse_protobuf(self.client.get(self.tile_url(0, 0, 0)).content))[3]
+        fields = parse_protobuf(layer)
+        self.assertIn((1, b'refineries'), fields)
+        self.assertEqual(sum(1 for field, _ in fields if field == 2), 2)
+        keys = [value.decode() for field, value in fields if field == 3]
+        values = [parse_protobuf(value)[0][1] for field, value in fields if field == 4]
+        self.assertEqual(keys, ['name', 'status', 'capacity', 'capacity_unit'])
+        self.assertIn(25000.0, values)
+        self.assertIn(b'operational', values)
+
+        montreal = tuple(int(value) for value in tiles.project(-73.5, 45.5, 8))
+        nevada = tuple(int(value) for value in tiles.project(-119.8, 39.5, 8))
+        montreal_etag = self.client.get(self.tile_url(8, *montreal))['ETag']
+        nevada_etag = self.client.get(self.tile_url(8, *nevada))['ETag']
+        refinery.status = 'suspended'
+        refinery.save()
+        self.assertNotEqual(self.client.get(self.tile_url(8, *montreal))['ETag'], montreal_etag)
+        self.assertEqual(self.client.get(self.tile_url(8, *nevada), HTTP_IF_NONE_MATCH=nevada_etag).status_code, 304)
+
+
+class ClusterIndexTests(SimpleTestCase):
+
+    def test_merges_close_points_at_low_zoom_only(self):
+        index = clusters.ClusterIndex([
+            (1, -73.6, 45.5, 100.0), (2, -73.5, 45.6, 50.0), (3, -119.8, 39.5, None),
+        ])
+        world = (-180, -90, 180, 90)
+
+        low = sorted(index.get_clusters(world, 4), key=lambda item: item['count'])
+        self.assertEqual([(item['count'], item['capacity']) for item in low], [(1, 0.0), (2, 150.0)])
+        self.assertTrue(low[1]['cluster'])
+        self.assertAlmostEqual(low[1]['longitude'], -73.55, places=2)
+
+        high = index.get_clusters(world, 12)
+        self.assertEqual(sorted(item['id'] for item in high), [1, 2, 3])
+        self.assertFalse(any(item['cluster'] for item in high))
+        self.assertEqual([item['id'] for item in index.get_clusters((-74, 45, -73.55, 46), 12)], [1])
+
+    def test_conserves_counts_and_crosses_the_antimeridian(self):
+        points = [(number, -179.9 + number * 0.01, -17.7, 1.0) for number in range(20)]
+        points += [(100 + number, 179.9 - number * 0.01, -17.7, 1.0) for number in range(20)]
+        index = clusters.ClusterIndex(points)
+        for zoom in range(clusters.MAX_ZOOM + 2):
+            found = index.get_clusters((179, -20, -179, -15), zoom)
+            self.assertEqual(sum(item['count'] for item in found), 40)
+            self.assertEqual(sum(item['capacity'] for item in found), 40.0)
+
+    def test_cluster_ids_never_collide_with_point_ids(self):
+        points = [(number, -73.6 + number * 0.001, 45.5, 1.0) for number in range(1, 200)]
+        index = clusters.ClusterIndex(points)
+        for zoom in range(clusters.MAX_ZOOM + 2):
+            found = index.get_clusters((-180, -90, 180, 90), zoom)
+            self.assertEqual(len({item['id'] for item in found}), len(found))
+            for item in found:
+                self.assertEqual(item['id'] > 199, item['cluster'])
+
+
+class ClusterViewTests(TestCase):
+    url = reverse('refinery-clusters')
+
+    def test_clusters_follow_writes(self):
+        create_refinery("Montréal", latitude=45.5, longitude=-73.6, production="20,000-25,000 t")
+        create_refinery("Laval", latitude=45.6, longitude=-73.7, production="5,000 t")
+        create_refinery("Gigafactory", latitude=39.5, longitude=-119.8, production="35 GWh")
+
+        response = self.client.get(self.url, {'zoom': 3})
+        self.assertEqual(response.status_code, 200)
+        found = sorted(response.data['clusters'], key=lambda item: item['count'])
+        # Lower bound of each range, as in the stats; GWh/yr do not add up with tonnes
+        self.assertEqual([(item['count'], item['capacity']) for item in found], [(1, 0.0), (2, 25000.0)])
+
+        create_refinery("Québec", latitude=45.55, longitude=-73.65)
+        found = self.client.get(self.url, {'zoom': 3, 'bbox': '-80,40,-70,50'}).data['clusters']
+        self.assertEqual([item['count'] for item in found], [3])
+        self.assertEqual(len(self.client.get(self.url, {'zoom': 14, 'bbox': '-80,40,-70,50'}).data['clusters']), 3)
+
+    def test_rejects_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 'far'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 30}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 2, 'bbox': '1,2'}).status_code, 400)
+
+
+class GeoJSONTests(TestCase):
+    url = reverse('refinery-geojson')
+
+    def test_feature_collection_cached_per_variant_until_write(self):
+        refinery = create_refinery("Montréal", latitude=45.508889, longitude=-73.561667, production="5,000 tpa")
+        create_refinery("Nevada", country='USA', latitude=39.5, longitude=-119.8, status='construction')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        data = response.json()
+        self.assertEqual(data['type'], 'FeatureCollection')
+        feature = data['features'][0]
+        self.assertEqual(feature['id'], refinery.id)
+        self.assertEqual(feature['geometry'], {'type': 'Point', 'coordinates': [-73.561667, 45.508889]})
+        self.assertEqual(feature['properties']['capacity_max'], 5000.0)
+
+        rounded = self.client.get(self.url, {'precision': 2, 'country': 'Canada'}).json()
+        self.assertEqual([item['geometry']['coordinates'] for item in rounded['features']], [[-73.56, 45.51]])
+        etag = self.client.get(self.url, {'status': 'construction'})['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'status': 'construction'}, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual([item['properties']['name'] for item in json.loads(gzip.decompress(response.content))['features']], ["Nevada"])
+
+        refinery.status = 'construction'
+        refinery.save()
+        response = self.client.get(self.url, {'status': 'construction'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 2)
+
+    def test_rejects_invalid_parameters(self):
+        for params in ({'precision': 8}, {'precision': '-1'}, {'status': 'closed'}, {'country': 'France'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
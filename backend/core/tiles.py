@@ -0,0 +1,27 @@
+"""Vector tile layer of the refineries (see dashboard_common.tiles)."""
+from dashboard_common.spatial import filter_bbox
+from dashboard_common.tiles import TileLayer, tile_bbox, tile_coordinates
+
+from .models import Refinery
+
+
+def refinery_features(z, x, y):
+    refineries = filter_bbox(Refinery.objects.all(), tile_bbox(z, x, y)).order_by('id')
+    for refinery_id, name, status, capacity_min, capacity_max, unit, latitude, longitude in refineries.values_list(
+        'id', 'name', 'status', 'capacity_min', 'capacity_max', 'capacity_unit', 'latitude', 'longitude'
+    ):
+        # Upper bound of a range ("20,000-25,000 t"), None when unknown
+        capacity = capacity_max if capacity_max is not None else capacity_min
+        yield refinery_id, tile_coordinates(longitude, latitude, z, x, y), {
+            'name': name,
+            'status': status,
+            'capacity': capacity,
+            'capacity_unit': unit or None,
+        }
+
+
+refinery_layer = TileLayer(
+    'refineries',
+    ('latitude', 'longitude', 'name', 'status', 'capacity_min', 'capacity_max', 'capacity_unit'),
+    refinery_features,
+)
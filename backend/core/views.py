@@ -1,11 +1,27 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import filters, viewsets, permissions, status
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.utils import timezone
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 
+from dashboard_common.cache import cache_response
+from dashboard_common.clusters import MAX_ZOOM, MIN_ZOOM
+from dashboard_common.geojson import preferred_encoding
+from dashboard_common.mixins import ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin
+from dashboard_common.spatial import BoundingBoxFilter, parse_bbox
+from dashboard_common.sync import DEFAULT_LIMIT, MAX_LIMIT, StaleToken, changes_since, parse_token
+from dashboard_common.tiles import is_valid_tile
+
+from .capacity import TONNES_PER_YEAR
+from .clusters import cluster_index
+from .dashboard_settings import VersionConflict, get_settings, increment_version
+from .events import change_log, latest_event_id, stream_events
+from .geojson import MAX_PRECISION, geojson_payload
 from .models import Refinery, DashboardSettings
 from .serializers import RefinerySerializer, RefineryCreateUpdateSerializer, DashboardSettingsSerializer, UserSerializer
+from .stats import refinery_stats
+from .tiles import refinery_layer
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """Allow read access to everyone, but write access only to admins"""
@@ -16,9 +32,33 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_staff
 
 
-class RefineryViewSet(viewsets.ModelViewSet):
+class RefineryOrderingFilter(filters.OrderingFilter):
+    """
+    Capacities in different units do not compare: sorting on a capacity
+    column groups the refineries by ``capacity_unit`` first (same direction,
+    so the (capacity_unit, capacity, id) indexes serve the keyset pages).
+    """
+    unit_grouped_fields = ('capacity_min', 'capacity_max')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        grouped = []
+        for term in ordering:
+            if term.lstrip('-') in self.unit_grouped_fields:
+                unit = '-capacity_unit' if term.startswith('-') else 'capacity_unit'
+                if unit not in grouped:
+                    grouped.append(unit)
+            grouped.append(term)
+        return grouped
+
+
+class RefineryViewSet(ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Refinery.objects.all()
     permission_classes = [IsAdminOrReadOnly]
+    filter_backends = [RefineryOrderingFilter, BoundingBoxFilter]
+    ordering_fields = ['name', 'country', 'status', 'capacity_min', 'capacity_max']
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -26,7 +66,7 @@ class RefineryViewSet(viewsets.ModelViewSet):
         return RefinerySerializer
     
     def get_queryset(self):
-        queryset = Refinery.objects.all()
+        queryset = super().get_queryset()
         
         # Filter by country
         country = self.request.query_params.get('country', None)
@@ -38,63 +78,59 @@ class RefineryViewSet(viewsets.ModelViewSet):
         if status and status != 'all':
             queryset = queryset.filter(status=status)
             
-        # Filter by minimum capacity (needs parsing from production string)
+        # Filter by minimum capacity in tonnes per year (parsed capacity_min column)
         min_capacity = self.request.query_params.get('min_capacity', None)
         if min_capacity and min_capacity.isdigit() and int(min_capacity) > 0:
-            # This is a simplified approach - in production you'd want a more robust solution
-            # potentially with a separate numeric field for capacity
-            pass
+            queryset = queryset.filter(capacity_unit=TONNES_PER_YEAR, capacity_min__gte=int(min_capacity))
             
         return queryset
     
     @action(detail=False, methods=['get'])
+    @cache_response(Refinery)
     def stats(self, request):
-        """Return aggregated statistics about refineries"""
-        total_count = Refinery.objects.count()
-        operational_count = Refinery.objects.filter(status='operational').count()
-        construction_count = Refinery.objects.filter(status='construction').count()
-        
-        # In a real implementation, you'd calculate total capacity from numeric fields
-        # This is a placeholder
-        total_capacity = "18300"
+        """Return aggregated statistics about refineries (accepts the list filters)"""
+        stats = refinery_stats(self.get_queryset())
+        by_status = stats['by_status']
         
         return Response({
-            'total_refineries': total_count,
-            'operational_refineries': operational_count,
-            'construction_refineries': construction_count,
-            'total_capacity': total_capacity
+            'total_refineries': stats['total']['count'],
+            'operational_refineries': by_status.get('operational', {}).get('count', 0),
+            'construction_refineries': by_status.get('construction', {}).get('count', 0),
+            'total_capacity': str(round(stats['total']['capacity'])),
+            **stats,
         })
 
+    @action(detail=False, methods=['get'])
+    @cache_response(Refinery)
+    def clusters(self, request):
+        """
+        Clusters of refineries at ``?zoom=`` (required) in ``?bbox=`` (default:
+        the whole world). A cluster has the number of refineries it holds and
+        their summed capacity (t/yr); single refineries have ``cluster: false``.
+        """
+        try:
+            zoom = int(request.query_params['zoom'])
+        except (KeyError, ValueError):
+            return Response({"detail": "zoom must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not MIN_ZOOM <= zoom <= MAX_ZOOM + 1:
+            return Response(
+                {"detail": f"zoom must be between {MIN_ZOOM} and {MAX_ZOOM + 1}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        bbox = request.query_params.get('bbox')
+        bbox = parse_bbox(bbox) if bbox else (-180, -90, 180, 90)
+        return Response({'zoom': zoom, 'clusters': cluster_index().get_clusters(bbox, zoom)})
 
-class DashboardSettingsViewSet(viewsets.ModelViewSet):
+
+class DashboardSettingsViewSet(ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = DashboardSettings.objects.all()
     serializer_class = DashboardSettingsSerializer
     permission_classes = [IsAdminOrReadOnly]
     
     @action(detail=False, methods=['get'])
     def current(self, request):
-        """Get current dashboard settings or create default if none exist"""
-        settings = DashboardSettings.objects.first()
-        
-        if not settings:
-            # Create default settings
-            default_status_colors = {
-                "operational": "#00AA00",
-                "construction": "#0000FF",
-                "planned": "#FFA500",
-                "approved": "#FFA500",
-                "suspended": "#FF0000"
-            }
-            
-            default_chart_colors = ["#4a6bff", "#ff7043", "#ffca28", "#66bb6a", "#ab47bc"]
-            
-            settings = DashboardSettings.objects.create(
-                version=timezone.now().strftime("%Y-%m-%d"),
-                status_colors=default_status_colors,
-                chart_colors=default_chart_colors
-            )
-        
-        serializer = self.get_serializer(settings)
+        """Get current dashboard settings (created with the defaults if needed)"""
+        serializer = self.get_serializer(get_settings())
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
@@ -103,30 +139,14 @@ class DashboardSettingsViewSet(viewsets.ModelViewSet):
         if not request.user.is_staff:
             return Response({"detail": "Not authorized"}, status=status.HTTP_403_FORBIDDEN)
             
-        settings = DashboardSettings.objects.first()
+        try:
+            settings = increment_version()
+        except VersionConflict:
+            return Response({"detail": "Concurrent publication, please retry"}, status=status.HTTP_409_CONFLICT)
         
         if not settings:
             return Response({"detail": "No settings found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get current date in ISO format (YYYY-MM-DD)
-        current_date = timezone.now().strftime("%Y-%m-%d")
-        
-        # Check if version already includes current date
-        if settings.version.startswith(current_date):
-            # Extract version number and increment
-            parts = settings.version.split('-v')
-            if len(parts) > 1 and parts[1].isdigit():
-                version_num = int(parts[1]) + 1
-            else:
-                version_num = 1
-            new_version = f"{current_date}-v{version_num}"
-        else:
-            # New date, start at v1
-            new_version = f"{current_date}-v1"
-        
-        settings.version = new_version
-        settings.save()
-        
         serializer = self.get_serializer(settings)
         return Response(serializer.data)
 
@@ -136,4 +156,122 @@ class CurrentUserView(APIView):
     
     def get(self, request):
         serializer = UserSerializer(request.user)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+class SyncView(APIView):
+    """
+    Incremental sync for mobile and offline clients.
+
+    - without ``since``: only returns the current token, to be fetched
+      *before* the full download of the collections;
+    - ``?since=<token>``: objects created, updated (``upserted``) or deleted
+      (``deleted``) since that token, per model, with the new token. Call
+      again with it while ``has_more`` is true;
+    - ``?limit=`` (events per batch) and ``?models=refinery,dashboardsettings``.
+
+    A token older than the pruned events (prune_change_events) gets a 410:
+    the client has to reload everything.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            since = request.query_params.get('since')
+            since = parse_token(since) if since is not None else None
+        except ValueError:
+            return Response({"detail": "Invalid token or limit"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"detail": "limit must be positive"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if since is None:
+            response = Response({'token': str(latest_event_id()), 'has_more': False, 'changes': {}})
+        else:
+            models = [
+                f'core.{name.strip().lower()}'
+                for name in request.query_params.get('models', '').split(',') if name.strip()
+            ]
+            try:
+                response = Response(changes_since(change_log, since, limit, models))
+            except StaleToken:
+                return Response(
+                    {"detail": "Token expired: reload all data", "token": str(latest_event_id())},
+                    status=status.HTTP_410_GONE,
+                )
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+async def change_events(request):
+    """
+    Server-Sent Events feed of logged creations, updates and deletions
+    (served over ASGI).
+
+    - ``Last-Event-ID`` (header sent by EventSource when reconnecting, or
+      ``?last_event_id=`` on first load): replays the missed events first.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_event_id and not last_event_id.isdigit():
+        return HttpResponseBadRequest("Invalid Last-Event-ID")
+
+    response = StreamingHttpResponse(
+        stream_events(int(last_event_id) if last_event_id else None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Disable proxy buffering (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def vector_tile(request, z, x, y):
+    """
+    Vector tile (MVT) of the refineries, ``refineries`` layer: points with
+    ``name``, ``status``, ``capacity`` and ``capacity_unit``. An empty tile
+    answers 204; the ETag avoids transferring an unchanged tile again.
+    """
+    if not is_valid_tile(z, x, y):
+        raise Http404("Tile out of range")
+    versions = refinery_layer.versions(z, x, y)
+    etag = quote_etag('-'.join(str(version) for version in versions))
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        _, data = refinery_layer.render(z, x, y, versions)
+        response = HttpResponse(data, content_type='application/vnd.mapbox-vector-tile', status=200 if data else 204)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def refinery_geojson(request):
+    """
+    Refineries as a GeoJSON FeatureCollection, precomputed per data version
+    (see core.geojson). Optional ``?precision=`` (0-7 decimals) rounds the
+    coordinates to shrink the payload; ``?status=`` and ``?country=`` filter
+    it, each variant being cached separately. Served gzip or brotli encoded
+    when the client accepts it.
+    """
+    params = {}
+    for name, choices in (('status', Refinery.STATUS_CHOICES), ('country', Refinery.COUNTRY_CHOICES)):
+        value = request.GET.get(name)
+        if value and value != 'all':
+            if value not in dict(choices):
+                return HttpResponseBadRequest(f"Unknown {name}")
+            params[name] = value
+    precision = request.GET.get('precision')
+    if precision is not None:
+        if not precision.isdigit() or int(precision) > MAX_PRECISION:
+            return HttpResponseBadRequest(f"precision must be between 0 and {MAX_PRECISION}")
+        params['precision'] = int(precision)
+
+    tag, bodies = geojson_payload(**params)
+    etag = quote_etag(tag)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        encoding = preferred_encoding(request.headers.get('Accept-Encoding', ''), bodies)
+        response = HttpResponse(bodies[encoding], content_type='application/geo+json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -1,4 +1,9 @@
-"""ASGI config for dashboard project."""
+"""ASGI config for dashboard project.
+
+Serve with an ASGI server (e.g. ``uvicorn dashboard.asgi:application``) so the
+/api/events/ SSE feed holds idle connections on the event loop rather than
+one worker per client.
+"""
 
 import os
 
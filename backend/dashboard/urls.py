@@ -2,11 +2,16 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from django.views import View
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from core.views import RefineryViewSet, DashboardSettingsViewSet, CurrentUserView
+from dashboard_common.geojson import preferred_encoding
+from core.legacy import legacy_plant_payload
+from core.views import RefineryViewSet, DashboardSettingsViewSet, CurrentUserView, SyncView, change_events, refinery_geojson, vector_tile
 
 # Classe simple pour simuler l'historique de production
 class ProductionHistoryView(APIView):
@@ -15,58 +20,27 @@ class ProductionHistoryView(APIView):
         return Response([])
 
 # Classe pour rediriger les appels de recycling-plants vers refineries
-class RecyclingPlantView(APIView):
+class RecyclingPlantView(View):
+    """
+    Raffineries au format attendu par le frontend. Le corps JSON (et sa
+    version gzip) est précalculé et mis en cache jusqu'à la prochaine
+    modification d'une raffinerie (voir core.legacy).
+    """
+
     def get(self, request):
-        # Obtenir les données directement du modèle sans passer par le ViewSet
-        from core.models import Refinery
-        refineries = Refinery.objects.all()
-        
-        # Conversion des données dans un format compatible avec le frontend
-        data = []
-        
-        # Boucler sur chaque raffinerie et la transformer au format attendu
-        for refinery in refineries:
-            # Extraire des valeurs numériques à partir du champ production
-            capacity = '10000'  # Valeur par défaut
-            if refinery.production:
-                try:
-                    # Tentative d'extraction d'une valeur numérique si format "1000 tpa"
-                    if 'tpa' in refinery.production:
-                        capacity = refinery.production.split(' ')[0].replace(',', '')
-                except:
-                    # En cas d'erreur, garder la valeur par défaut
-                    pass
-            
-            # S'assurer que capacity est un nombre
-            try:
-                capacity_num = int(capacity.replace(',', ''))
-            except:
-                capacity_num = 10000  # Valeur par défaut en cas d'erreur
-                
-            # Calculer la production actuelle (75% de la capacité)
-            current_production = str(int(capacity_num * 0.75))
-            
-            # Créer un dictionnaire pour chaque installation
-            plant_data = {
-                'id': refinery.id,
-                'name': refinery.name,
-                'location': refinery.location,
-                'country': refinery.country,
-                'recycling_rate': int(50 + refinery.id % 40),  # Valeur aléatoire entre 50 et 90%
-                'active': refinery.status == 'operational',
-                'status': refinery.status,
-                'capacity': str(capacity_num),
-                'current_production': current_production,
-                'latitude': refinery.latitude,
-                'longitude': refinery.longitude,
-                'processing': refinery.processing,
-                'website': refinery.website
-            }
-            
-            data.append(plant_data)
-            
-        # Retourner les données au format JSON
-        return Response(data)
+        version, body, gzipped = legacy_plant_payload()
+        etag = quote_etag(f'plants-{version}')
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            bodies = {'identity': body, 'gzip': gzipped}
+            encoding = preferred_encoding(request.headers.get('Accept-Encoding', ''), bodies)
+            response = HttpResponse(bodies[encoding], content_type='application/json')
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
 
 router = DefaultRouter()
 router.register(r'refineries', RefineryViewSet)
@@ -78,6 +52,10 @@ urlpatterns = [
     path('api/user/', CurrentUserView.as_view(), name='current-user'),
     path('api/production-history/', ProductionHistoryView.as_view(), name='production-history'),
     path('api/recycling-plants/', RecyclingPlantView.as_view(), name='recycling-plants'),
+    path('api/events/', change_events, name='change-events'),
+    path('api/sync/', SyncView.as_view(), name='sync'),
+    path('api/geojson/refineries/', refinery_geojson, name='refinery-geojson'),
+    path('api/tiles/<int:z>/<int:x>/<int:y>.mvt', vector_tile, name='vector-tile'),
     path('api-token-auth/', obtain_auth_token, name='api_token_auth'),
     path('api-auth/', include('rest_framework.urls')),
 ]
@@ -0,0 +1,9 @@
+"""Model-agnostic building blocks shared by the two Django projects.
+
+``lithium_dashboard`` (recycling_plants) and ``backend/dashboard`` (core)
+import these modules instead of keeping a copy each; every app binds them
+to its own models.
+
+The package is installable (``pyproject.toml`` at the repository root):
+``backend/requirements.txt`` installs it in editable mode.
+"""
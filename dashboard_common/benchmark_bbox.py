@@ -0,0 +1,78 @@
+"""``?bbox=`` timing of a spatially indexed model, shared by the ``benchmark_bbox`` commands"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from .spatial import filter_bbox
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base of the ``benchmark_bbox`` commands: subclasses set ``model`` (with
+    ``spatial_index = True``), ``count_option``, the name of the option giving
+    the number of synthetic rows, and ``build(index, latitude, longitude)``,
+    which returns an unsaved instance
+    """
+    help = (
+        "Time ?bbox= queries over N synthetic rows (rolled back at the end): "
+        "R*Tree index against the plain range filter"
+    )
+    model = None
+    count_option = 'rows'
+
+    def build(self, index, latitude, longitude):
+        raise NotImplementedError
+
+    def add_arguments(self, parser):
+        parser.add_argument(f'--{self.count_option}', dest='count', type=int, default=100_000, help='Rows generated')
+        parser.add_argument('--queries', type=int, default=200, help='Viewports queried')
+        parser.add_argument('--span', type=float, default=5.0, help='Viewport width (degrees)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['count'] < 1 or options['queries'] < 1:
+            raise CommandError(f'--{self.count_option} and --queries must be positive')
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING('No R*Tree index outside SQLite: both timings use the same query'))
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.model.objects.bulk_create([
+                self.build(index, rng.uniform(-60, 75), rng.uniform(-180, 180))
+                for index in range(options['count'])
+            ], batch_size=2000)
+            self.stdout.write(f"{options['count']} rows inserted in {time.perf_counter() - started:.1f}s (triggers included)")
+
+            span = options['span']
+            windows = []
+            for _ in range(options['queries']):
+                min_lon, min_lat = rng.uniform(-180, 180 - span), rng.uniform(-60, 75 - span)
+                windows.append((min_lon, min_lat, min_lon + span, min_lat + span))
+
+            rows = self.model.objects.all()
+            indexed = self.measure(lambda bbox: filter_bbox(rows, bbox), windows)
+            scanned = self.measure(lambda bbox: rows.filter(
+                latitude__range=(bbox[1], bbox[3]), longitude__range=(bbox[0], bbox[2]),
+            ), windows)
+            if indexed[0] != scanned[0]:
+                raise CommandError('The index and the full scan returned different rows')
+
+            self.stdout.write(f"Rows per viewport: {indexed[0] / len(windows):.0f} on average")
+            for label, (_, timings) in (('R*Tree', indexed), ('Full scan', scanned)):
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                self.stdout.write(f"{label} (ms): median {statistics.median(timings):.2f}, p99 {p99:.2f}")
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark done, synthetic data rolled back'))
+
+    @staticmethod
+    def measure(query, windows):
+        rows, timings = 0, []
+        for bbox in windows:
+            started = time.perf_counter()
+            rows += len(query(bbox).values_list('id', 'latitude', 'longitude'))
+            timings.append((time.perf_counter() - started) * 1000)
+        return rows, sorted(timings)
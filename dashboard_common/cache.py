@@ -0,0 +1,102 @@
+"""API response cache keyed by data version.
+
+Each model has a version token, stored in the shared ``versions`` cache
+(file based, so common to all workers) and renewed after every committed
+write (post_save/post_delete signals, or explicit calls from bulk loads).
+A response key contains the endpoint, the normalized query parameters and
+the versions of the models it depends on: a write makes those keys
+unreachable without scanning the cache, and a cached response is served
+without touching the ORM.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+RESPONSE_CACHE = 'default'
+VERSION_CACHE = 'versions'
+VERSION_KEY = 'data-version:{}'
+# Published dashboard settings version (DashboardSettings.version): part of
+# every response key and ETag, so it doubles as the global cache-busting key
+# (see dashboard_settings.SettingsStore.increment_version)
+SETTINGS_VERSION_KEY = 'dashboard-settings-version'
+
+
+def _namespace(model):
+    return model._meta.label_lower
+
+
+def get_data_versions(*models):
+    """Current versions of the given models (a single read of the shared cache)"""
+    cache = caches[VERSION_CACHE]
+    keys = [VERSION_KEY.format(_namespace(model)) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Timestamped initial value: a cleared version cache cannot
+            # resurrect old response keys
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_data_version(*models):
+    """
+    Invalidates responses that depend on these models: immediately, then
+    again when the transaction commits, to discard responses computed in
+    between from not-yet-committed data.
+    """
+    def bump():
+        # Fresh token rather than incr(): the file backend does not increment
+        # atomically across processes, and two writes must not collapse into one
+        version = time.time_ns()
+        caches[VERSION_CACHE].set_many(
+            {VERSION_KEY.format(_namespace(model)): version for model in models}, timeout=None)
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def get_settings_version():
+    return caches[VERSION_CACHE].get(SETTINGS_VERSION_KEY, '')
+
+
+def publish_settings_version(version):
+    """Publish a new settings version: every cached response is invalidated"""
+    def publish():
+        caches[VERSION_CACHE].set(SETTINGS_VERSION_KEY, version, timeout=None)
+    publish()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(publish)
+
+
+def response_cache_key(request, prefix, versions):
+    params = sorted((key, sorted(request.query_params.getlist(key))) for key in request.query_params)
+    raw = repr((request.get_host(), request.path, params, versions, get_settings_version()))
+    return f'response:{prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def cache_response(*models, timeout=None):
+    """
+    DRF view method decorator: caches ``response.data`` of 200 responses
+    under a key that changes as soon as one of ``models`` is written.
+    """
+    def decorator(view_method):
+        prefix = view_method.__qualname__
+
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = caches[RESPONSE_CACHE]
+            key = response_cache_key(request, prefix, get_data_versions(*models))
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
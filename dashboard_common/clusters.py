@@ -0,0 +1,186 @@
+"""Zoom-aware clustering of map points.
+
+``ClusterIndex`` follows the supercluster approach: points are projected to
+Web Mercator ([0, 1] square), then, from ``MAX_ZOOM`` down to 0, every level
+merges the items of the level above that lie within ``RADIUS`` pixels of
+each other (tiles of ``EXTENT`` pixels). A cluster carries the count of the
+points it holds, their summed capacity and their count-weighted centre.
+
+Each level is bucketed by the tiles of its own zoom, so a query reads only
+the buckets under the viewport: O(tiles + k) for k results, independent of
+the number of points. ``VersionedClusterIndex`` builds it once per data
+version of a model and shares it with the requests of the process.
+"""
+import math
+import threading
+from collections import defaultdict
+
+from .cache import get_data_versions
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+# Cluster radius and tile size, in pixels
+RADIUS = 40
+EXTENT = 512
+MAX_LATITUDE = 85.05112878
+
+
+def project_x(longitude):
+    return longitude / 360 + 0.5
+
+
+def project_y(latitude):
+    sin = math.sin(math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))))
+    return min(1.0, max(0.0, 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi))
+
+
+def unproject(x, y):
+    """(longitude, latitude) of a projected point"""
+    return (x - 0.5) * 360, 360 * math.atan(math.exp((180 - y * 360) * math.pi / 180)) / math.pi - 90
+
+
+class ClusterIndex:
+    """
+    Clusters of ``(id, longitude, latitude, capacity)`` points for every zoom
+    level; point ids are integers, cluster ids are all greater than them
+    """
+
+    def __init__(self, points, radius=RADIUS, extent=EXTENT, max_zoom=MAX_ZOOM):
+        self.max_zoom = max_zoom
+        # Items: (x, y, count, capacity, id); level max_zoom + 1 holds the points themselves
+        level = [
+            (project_x(longitude), project_y(latitude), 1, capacity or 0.0, point_id)
+            for point_id, longitude, latitude, capacity in points
+        ]
+        self.size = len(level)
+        # Cluster ids start above the largest point id, so they never collide
+        offset = max((item[4] for item in level), default=0)
+        self.levels = {max_zoom + 1: self._buckets(level, max_zoom + 1)}
+        for zoom in range(max_zoom, MIN_ZOOM - 1, -1):
+            level = self._cluster(level, zoom, radius / (extent * 2 ** zoom), offset)
+            self.levels[zoom] = self._buckets(level, zoom)
+
+    @staticmethod
+    def _cluster(items, zoom, radius, offset):
+        """
+        Merge the items closer than ``radius`` (projected units) to the first
+        unmerged one; new clusters get ids above ``offset``
+        """
+        grid = defaultdict(list)
+        cells = []
+        for index, item in enumerate(items):
+            cell = (int(item[0] / radius), int(item[1] / radius))
+            cells.append(cell)
+            grid[cell].append(index)
+        radius_squared = radius ** 2
+        merged = [False] * len(items)
+        clustered = []
+        for index, item in enumerate(items):
+            if merged[index]:
+                continue
+            merged[index] = True
+            x, y, count, capacity, _ = item
+            cell_x, cell_y = cells[index]
+            neighbours = []
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for other in grid.get((cell_x + dx, cell_y + dy), ()):
+                        if not merged[other]:
+                            other_item = items[other]
+                            if (other_item[0] - x) ** 2 + (other_item[1] - y) ** 2 <= radius_squared:
+                                neighbours.append(other)
+            if not neighbours:
+                clustered.append(item)
+                continue
+            weighted_x, weighted_y = x * count, y * count
+            for other in neighbours:
+                merged[other] = True
+                other_x, other_y, other_count, other_capacity, _ = items[other]
+                weighted_x += other_x * other_count
+                weighted_y += other_y * other_count
+                count += other_count
+                capacity += other_capacity
+            # Unique within the level; the zoom keeps ids of different levels apart
+            cluster_id = offset + (index << 5) + zoom + 1
+            clustered.append((weighted_x / count, weighted_y / count, count, capacity, cluster_id))
+        return clustered
+
+    @staticmethod
+    def _buckets(items, zoom):
+        n = 2 ** zoom
+        buckets = defaultdict(list)
+        for item in items:
+            buckets[min(int(item[0] * n), n - 1), min(int(item[1] * n), n - 1)].append(item)
+        return dict(buckets)
+
+    def get_clusters(self, bbox, zoom):
+        """Clusters and points of ``zoom`` in ``bbox`` (minLon, minLat, maxLon, maxLat)"""
+        zoom = max(MIN_ZOOM, min(self.max_zoom + 1, zoom))
+        min_lon, min_lat, max_lon, max_lat = bbox
+        # Viewport across the antimeridian: two longitude ranges
+        spans = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180), (-180, max_lon)]
+        results = []
+        for lon_min, lon_max in spans:
+            results.extend(self._range(
+                project_x(lon_min), project_y(max_lat), project_x(lon_max), project_y(min_lat), zoom,
+            ))
+        return [self._feature(item) for item in results]
+
+    def _range(self, min_x, min_y, max_x, max_y, zoom):
+        buckets = self.levels[zoom]
+        n = 2 ** zoom
+        first_x, last_x = int(min_x * n), min(int(max_x * n), n - 1)
+        first_y, last_y = int(min_y * n), min(int(max_y * n), n - 1)
+        if (last_x - first_x + 1) * (last_y - first_y + 1) <= len(buckets):
+            keys = ((x, y) for x in range(first_x, last_x + 1) for y in range(first_y, last_y + 1))
+            candidates = (buckets.get(key, ()) for key in keys)
+        else:
+            # Viewport wider than the occupied tiles: walk those instead
+            candidates = (
+                items for (x, y), items in buckets.items()
+                if first_x <= x <= last_x and first_y <= y <= last_y
+            )
+        return [
+            item for items in candidates for item in items
+            if min_x <= item[0] <= max_x and min_y <= item[1] <= max_y
+        ]
+
+    @staticmethod
+    def _feature(item):
+        x, y, count, capacity, item_id = item
+        longitude, latitude = unproject(x, y)
+        return {
+            'id': item_id,
+            'cluster': count > 1,
+            'count': count,
+            'capacity': capacity,
+            'longitude': longitude,
+            'latitude': latitude,
+        }
+
+
+class VersionedClusterIndex:
+    """
+    ``ClusterIndex`` of ``points()`` (``(id, longitude, latitude, capacity)``),
+    rebuilt when the data version of ``model`` changes
+    """
+
+    def __init__(self, model, points):
+        self.model = model
+        self.points = points
+        # (version, index), shared by the threads of the process
+        self.cached = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version, = get_data_versions(self.model)
+        cached = self.cached
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self.lock:
+            # Another request may have built it while this one was waiting
+            if self.cached is not None and self.cached[0] == version:
+                return self.cached[1]
+            index = ClusterIndex(self.points())
+            self.cached = (version, index)
+        return index
@@ -0,0 +1,98 @@
+"""Dashboard settings: a single database row, cached in every process.
+
+A ``SettingsStore`` is bound to a project's DashboardSettings model
+(``singleton``, ``version``, ``last_updated`` and the color columns).
+Uniqueness is enforced by the constraint on ``DashboardSettings.singleton``:
+concurrent first requests go through get_or_create, which reads back the
+row created by the other request instead of inserting a second one.
+
+The instance is kept in memory along with the model's version token (shared
+``versions`` cache, renewed by the signals on every write): a read only
+costs a token lookup, and a write from any worker invalidates the copy held
+by all the others.
+
+``increment_version`` is a compare-and-swap: a conditional UPDATE on the
+previous version, with no lock and no rewrite of the JSON columns, retried
+when another client published between the read and the write.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_data_version, get_data_versions, publish_settings_version
+
+# Compare-and-swap attempts before giving up (VersionConflict)
+MAX_ATTEMPTS = 5
+
+
+def next_version(current, today):
+    """``YYYY-MM-DD-vN``: N restarts at 1 every day"""
+    date = today.strftime("%Y-%m-%d")
+    if current.startswith(date):
+        parts = current.split('-v')
+        if len(parts) > 1 and parts[1].isdigit():
+            return f"{date}-v{int(parts[1]) + 1}"
+    return f"{date}-v1"
+
+
+class VersionConflict(Exception):
+    """The version changed on every attempt: too many concurrent publications"""
+
+
+class SettingsStore:
+    """
+    The settings row of ``model``, created with ``defaults`` (color columns)
+    on first read; changes are logged to the ``ChangeLog`` ``log``
+    """
+
+    def __init__(self, model, defaults, log):
+        self.model = model
+        self.defaults = defaults
+        self.log = log
+        # (version token, instance); shared by the threads of the process
+        self.cached = None
+
+    def get(self):
+        """Current settings, created with the defaults if they do not exist"""
+        version, = get_data_versions(self.model)
+        cached = self.cached
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        settings, created = self.model.objects.get_or_create(singleton=True, defaults={
+            'version': timezone.now().strftime("%Y-%m-%d"),
+            **self.defaults,
+        })
+        if not created:
+            # Stored under the token read *before* the query: a concurrent write
+            # changes the token, and the copy is read again on the next call. A
+            # create renews the token itself: the row is cached on the next call
+            self.cached = (version, settings)
+        return settings
+
+    def increment_version(self):
+        """
+        Increment the version (None when there are no settings) and publish it
+        as the global cache-busting key; only ``version`` and ``last_updated``
+        are written
+        """
+        for _ in range(MAX_ATTEMPTS):
+            settings = self.model.objects.filter(singleton=True).first()
+            if settings is None:
+                return None
+            now = timezone.now()
+            version = next_version(settings.version, now)
+            with transaction.atomic():
+                # Only writes if nobody published since the read
+                updated = self.model.objects.filter(pk=settings.pk, version=settings.version).update(
+                    version=version, last_updated=now,
+                )
+                if not updated:
+                    continue
+                # update() sends no signal: explicit change log and invalidation
+                self.log.record_changes(self.model, 'update', [
+                    (settings.pk, {'id': settings.pk, 'version': version, 'last_updated': now}),
+                ])
+                bump_data_version(self.model)
+                publish_settings_version(version)
+            settings.version, settings.last_updated = version, now
+            return settings
+        raise VersionConflict()
@@ -0,0 +1,190 @@
+"""Change log and Server-Sent Events feed.
+
+A ``ChangeLog`` is bound to a project's ChangeEvent model (``model``,
+``object_id``, ``action``, ``data``, ``created_at``) and to the models it
+logs. Every write to one of them adds a ChangeEvent row in the same
+transaction (signals, or ``record_changes`` from the bulk loads): an event
+only exists once committed. The log feeds this stream and the incremental
+sync endpoint (dashboard_common.sync).
+
+On the ASGI side, a single poller per process reads new events and hands
+them, already encoded, to one ``asyncio.Queue`` per connection. An idle
+connection therefore only costs a queue and a waiting coroutine, whatever
+the number of clients. A client reconnecting with ``Last-Event-ID`` first
+receives the events it missed, read back from the log.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+
+POLL_INTERVAL = 0.5
+KEEPALIVE_INTERVAL = 15
+FETCH_SIZE = 500
+# Beyond this, a slow client is disconnected; it resumes through Last-Event-ID
+QUEUE_SIZE = 1000
+RETRY_MS = 3000
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot(instance):
+    """Column values of an instance (foreign keys under their attname)"""
+    return {field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields}
+
+
+class ChangeLog:
+    """Log of the writes to ``logged_models``, stored in ``event_model``"""
+
+    def __init__(self, event_model, logged_models, snapshot=snapshot):
+        self.event_model = event_model
+        self.logged_models = tuple(logged_models)
+        self.snapshot = snapshot
+        self.feed = ChangeFeed(self)
+
+    def record_changes(self, model, action, rows):
+        """
+        Log ``action`` for ``rows``: (object_id, data) pairs.
+
+        One INSERT run with executemany: bulk_create builds an instance and
+        compiles the SQL of every event, which dominated the bulk loads. No
+        signal is sent, so no needless cache invalidation.
+        """
+        if not rows:
+            return
+        meta = self.event_model._meta
+        qn = connection.ops.quote_name
+        fields = [meta.get_field(name) for name in ('model', 'object_id', 'action', 'data', 'created_at')]
+        statement = (
+            f"INSERT INTO {qn(meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})"
+        )
+        label = model._meta.label_lower
+        prepare_data = fields[3].get_db_prep_save
+        created_at = fields[4].get_db_prep_save(timezone.now(), connection)
+        with connection.cursor() as cursor:
+            cursor.executemany(statement, [
+                (label, object_id, action, prepare_data(data, connection), created_at)
+                for object_id, data in rows
+            ])
+
+    def record_change(self, instance, action):
+        data = {} if action == 'delete' else self.snapshot(instance)
+        self.record_changes(type(instance), action, [(instance.pk, data)])
+
+    def fetch_events(self, after_id, limit=FETCH_SIZE):
+        """Events with id > ``after_id`` as (id, model, encoded SSE message)"""
+        rows = self.event_model.objects.filter(id__gt=after_id).order_by('id').values_list(
+            'id', 'model', 'object_id', 'action', 'data', 'created_at'
+        )[:limit]
+        events = []
+        for event_id, model, object_id, action, data, created_at in rows:
+            payload = json.dumps({
+                'id': event_id, 'model': model, 'object_id': object_id,
+                'action': action, 'data': data, 'created_at': created_at,
+            }, cls=DjangoJSONEncoder, separators=(',', ':'))
+            events.append((event_id, model, f'id: {event_id}\ndata: {payload}\n\n'))
+        return events
+
+    def latest_event_id(self):
+        return self.event_model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    async def stream(self, last_event_id=None, models=()):
+        """
+        SSE messages for one connection: first the events with id >
+        ``last_event_id`` read back from the log (resume), then the new events
+        broadcast by ``feed``. ``models``: labels to keep (all when empty).
+        """
+        queue = await self.feed.subscribe()
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            sent = last_event_id or 0
+            if last_event_id is not None:
+                while True:
+                    backlog = await sync_to_async(self.fetch_events)(sent)
+                    for event_id, model, message in backlog:
+                        sent = event_id
+                        if not models or model in models:
+                            yield message
+                    if len(backlog) < FETCH_SIZE:
+                        break
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    return
+                event_id, model, message = event
+                # Already sent while resuming
+                if event_id <= sent:
+                    continue
+                sent = event_id
+                if not models or model in models:
+                    yield message
+        finally:
+            self.feed.unsubscribe(queue)
+
+
+class ChangeFeed:
+    """Broadcast of new log events to the SSE connections of the process"""
+
+    def __init__(self, log):
+        self.log = log
+        self.subscribers = set()
+        self.last_id = None
+        self.task = None
+        self.loop = None
+        self.lock = None
+
+    async def subscribe(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # New event loop (tests, reload): start from scratch
+            self.__init__(self.log)
+            self.loop = loop
+            self.lock = asyncio.Lock()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        async with self.lock:
+            self.subscribers.add(queue)
+            if self.task is None:
+                # Starting position fixed before returning: no event committed
+                # after subscribing can escape the poller
+                self.last_id = await sync_to_async(self.log.latest_event_id)()
+                self.task = loop.create_task(self.poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def poll(self):
+        try:
+            while self.subscribers:
+                try:
+                    events = await sync_to_async(self.log.fetch_events)(self.last_id)
+                except Exception:
+                    # Database briefly unavailable: connections stay open
+                    logger.exception("Could not read the change log")
+                    events = []
+                for event in events:
+                    self.last_id = event[0]
+                    self.publish(event)
+                if len(events) < FETCH_SIZE:
+                    await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            self.task = None
+            self.last_id = None
@@ -0,0 +1,66 @@
+"""Precomputed, pre-compressed JSON bodies and content-coding negotiation.
+
+A payload is encoded once and compressed once per encoding (gzip, and
+brotli when the module is installed), then kept in the in-memory response
+cache under a key carrying the current data versions: until the next
+write, a request costs one version lookup and one cache read.
+"""
+import gzip
+import hashlib
+import json
+
+from django.core.cache import caches
+
+from .cache import RESPONSE_CACHE
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoder
+    brotli = None
+
+
+def dumps(data):
+    """Compact UTF-8 JSON, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def compressed_payload(key, build):
+    """
+    ``(tag, {encoding: body})`` for the cache ``key``, ``build()`` returning
+    the data to encode on a miss; ``tag`` is unique to the key (ETag) and the
+    encodings are ``identity``, ``gzip`` and, with brotli installed, ``br``.
+    """
+    cache = caches[RESPONSE_CACHE]
+    payload = cache.get(key)
+    if payload is None:
+        body = dumps(build())
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=6)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body, quality=9)
+        payload = (hashlib.sha1(key.encode()).hexdigest(), bodies)
+        cache.set(key, payload, None)
+    return payload
+
+
+def preferred_encoding(accept_encoding, available):
+    """Best of ``available`` accepted by an Accept-Encoding header: br, then gzip, else identity"""
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        try:
+            quality = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    for encoding in ('br', 'gzip'):
+        if encoding in available and (encoding in accepted or '*' in accepted):
+            return encoding
+    return 'identity'
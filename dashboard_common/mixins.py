@@ -0,0 +1,166 @@
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import serializers, status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .cache import get_data_versions, get_settings_version
+
+
+class SparseFieldsetMixin:
+    """
+    Restricts the columns read (``QuerySet.only()``) to the fields the
+    serializer will actually output, so large text columns (``notes``...)
+    are not read when ``?fields=`` does not ask for them.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return queryset
+        serializer = self.get_serializer()
+        if not hasattr(serializer, 'get_source_columns'):
+            return queryset
+        columns = serializer.get_source_columns()
+        if columns is None or serializer.Meta.model is not queryset.model:
+            return queryset
+        return queryset.only(*columns)
+
+
+def infer_related_lookups(serializer, model):
+    """
+    Infers from a serializer's field sources the joins (``select_related``)
+    and prefetches (``Prefetch``) needed to avoid one query per row.
+    Returns ``(select_related, prefetches)``.
+
+    - dotted source along foreign keys (``university.name``): join;
+    - multi-valued relation (M2M, reverse FK): ``Prefetch`` whose queryset in
+      turn carries the nested serializer's joins;
+    - primary-key-only list: ``Prefetch`` restricted to the primary key.
+    """
+    select_related, prefetches = set(), {}
+
+    for field in serializer.fields.values():
+        nested = getattr(field, 'child', None) or getattr(field, 'child_relation', None) or field
+        if field.source == '*':
+            if isinstance(nested, serializers.ModelSerializer):
+                child_select, child_prefetches = infer_related_lookups(nested, model)
+                select_related |= child_select
+                prefetches.update(child_prefetches)
+            continue
+
+        path, current = [], model
+        for attr in field.source_attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation:
+                break
+            path.append(attr)
+            current = model_field.related_model
+            lookup = '__'.join(path)
+            if model_field.many_to_one or model_field.one_to_one:
+                select_related.add(lookup)
+                continue
+            # Multi-valued relation: prefetched, with the nested serializer's joins
+            if isinstance(nested, serializers.ModelSerializer):
+                queryset = current._default_manager.all()
+                child_select, child_prefetches = infer_related_lookups(nested, current)
+                if child_select:
+                    queryset = queryset.select_related(*child_select)
+                if child_prefetches:
+                    queryset = queryset.prefetch_related(*child_prefetches.values())
+                prefetches[lookup] = Prefetch(lookup, queryset=queryset)
+            elif lookup not in prefetches:
+                prefetches[lookup] = Prefetch(lookup, queryset=current._default_manager.only('pk'))
+            break
+        else:
+            # Single nested object (foreign key): its own joins, prefixed
+            if path and isinstance(nested, serializers.ModelSerializer):
+                prefix = '__'.join(path)
+                child_select, child_prefetches = infer_related_lookups(nested, current)
+                select_related |= {f'{prefix}__{lookup}' for lookup in child_select}
+                for lookup, prefetch in child_prefetches.items():
+                    prefetch.add_prefix(prefix)
+                    prefetches[prefetch.prefetch_to] = prefetch
+
+    # A join already covered by a longer one is redundant
+    select_related = {
+        lookup for lookup in select_related
+        if not any(other.startswith(f'{lookup}__') for other in select_related)
+    }
+    return select_related, prefetches
+
+
+class RelatedFieldsMixin:
+    """
+    Applies the joins and prefetches inferred from the serializer (see
+    ``infer_related_lookups``) to ``get_queryset()``, so list endpoints run a
+    constant number of queries.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None:
+            return queryset
+        serializer = self.get_serializer()
+        if getattr(serializer, 'Meta', None) is None or serializer.Meta.model is not queryset.model:
+            return queryset
+        select_related, prefetches = infer_related_lookups(serializer, queryset.model)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches.values())
+        return queryset
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET (ETag / Last-Modified) for ``list`` and ``retrieve``.
+
+    The ETag is derived from the data version tokens (see
+    ``dashboard_common.cache``) and the full URL, without reading the
+    database or serializing: a matching ``If-None-Match`` gets a 304
+    before any query runs.
+    ``Cache-Control: no-cache`` makes browsers revalidate on every load
+    instead of downloading the list again.
+    """
+    etag_models = None
+
+    def get_etag_models(self):
+        return self.etag_models or [self.queryset.model]
+
+    def list(self, request, *args, **kwargs):
+        return self.not_modified_response(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.not_modified_response(request) or super().retrieve(request, *args, **kwargs)
+
+    def not_modified_response(self, request):
+        versions = get_data_versions(*self.get_etag_models())
+        raw = repr((request.get_full_path(), request.accepted_renderer.format, versions, get_settings_version()))
+        self.etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        # Tokens are write timestamps: the newest one bounds the modification date
+        self.last_modified = max(versions) // 10 ** 9
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            matches = if_none_match.strip() == '*' or self.etag in parse_etags(if_none_match)
+        else:
+            since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+            matches = since is not None and self.last_modified <= since
+        if matches:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            response['Last-Modified'] = http_date(self.last_modified)
+            response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,87 @@
+"""Mapbox Vector Tile encoder (specification 2.1), points only.
+
+Hand-written to avoid a protobuf dependency: a tile only uses varints,
+length-delimited fields and doubles.
+"""
+import struct
+
+EXTENT = 4096
+
+# Protobuf wire types
+VARINT, FIXED64, LENGTH = 0, 1, 2
+POINT = 1
+MOVE_TO = 1
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _key(field, wire_type):
+    return _varint(field << 3 | wire_type)
+
+
+def _bytes(field, payload):
+    return _key(field, LENGTH) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _bytes(field, b''.join(_varint(value) for value in values))
+
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _value(value):
+    """Value message: string, double, integer or boolean"""
+    if isinstance(value, bool):
+        return _key(7, VARINT) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _key(5, VARINT) + _varint(value)
+        return _key(6, VARINT) + _varint(zigzag(value))
+    if isinstance(value, float):
+        return _key(3, FIXED64) + struct.pack('<d', value)
+    return _bytes(1, str(value).encode())
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """
+    Point layer. ``features``: (id, (x, y), properties) in tile coordinates
+    (0..extent); None properties are left out.
+    """
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, (x, y), properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        geometry = [MOVE_TO | 1 << 3, zigzag(x), zigzag(y)]
+        encoded.append(_bytes(2, (
+            _key(1, VARINT) + _varint(feature_id)
+            + _packed(2, tags)
+            + _key(3, VARINT) + _varint(POINT)
+            + _packed(4, geometry)
+        )))
+    return b''.join([
+        _key(15, VARINT) + _varint(2),
+        _bytes(1, name.encode()),
+        *encoded,
+        *(_bytes(3, key.encode()) for key in keys),
+        *(_bytes(4, _value(value)) for _, value in values),
+        _key(5, VARINT) + _varint(extent),
+    ])
+
+
+def encode_tile(layers):
+    """Tile from already encoded layers; empty layers are left out"""
+    return b''.join(_bytes(3, layer) for layer in layers if layer)
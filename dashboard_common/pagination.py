@@ -0,0 +1,202 @@
+import base64
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination: each page is fetched with an "after the last
+    row seen" filter on the ordering fields, tie-broken on ``id``, so page N
+    costs the same as page 1. No ``COUNT(*)`` is issued.
+
+    Ordering follows ``?ordering=`` (OrderingFilter) or else the queryset or
+    model ordering. Clients that need page numbers pass ``?page=N`` (or
+    ``?pagination=page``) and get the usual PageNumberPagination response.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    page_number_class = PageNumberPagination
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_numbers = None
+        if (request.query_params.get(self.mode_query_param) == 'page'
+                or self.page_number_class.page_query_param in request.query_params):
+            self.page_numbers = self.page_number_class()
+            return self.page_numbers.paginate_queryset(queryset, request, view)
+
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = [(name, not descending if reverse else descending) for name, descending in self.ordering]
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        queryset = queryset.order_by(*[self.order_expression(name, descending) for name, descending in ordering])
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if self.page_numbers is not None:
+            return self.page_numbers.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.position_of(self.page[0]), reverse=True)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Ordering as [(attname, descending)], restricted to concrete model
+        columns (foreign keys sort on their id) and ending with ``id`` in the
+        direction of the last field.
+        """
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+
+        opts = queryset.model._meta
+        fields = []
+        self.nullable = set()
+        # attname -> model field, to convert the cursor values back (to_python)
+        self.fields = {opts.pk.attname: opts.pk}
+        for name in ordering:
+            if not isinstance(name, str):
+                continue
+            descending = name.startswith('-')
+            try:
+                field = opts.get_field(name.lstrip('-'))
+            except FieldDoesNotExist:
+                continue
+            if not field.concrete or field.many_to_many:
+                continue
+            fields.append((field.attname, descending))
+            self.fields[field.attname] = field
+            if field.null:
+                self.nullable.add(field.attname)
+            if field.primary_key:
+                return fields
+        fields.append((opts.pk.attname, fields[-1][1] if fields else False))
+        return fields
+
+    def order_expression(self, name, descending):
+        # Only add a NULLS modifier when needed: it stops SQLite from
+        # following the index order
+        if name in self.nullable:
+            return F(name).desc(nulls_first=True) if descending else F(name).asc(nulls_last=True)
+        return F(name).desc() if descending else F(name).asc()
+
+    def after(self, ordering, position):
+        """Lexicographic "strictly after ``position``" filter (NULL sorts after everything)"""
+        clauses = []
+        for index, (name, descending) in enumerate(ordering):
+            value = position[index]
+            nullable = name in self.nullable
+            equal = [
+                Q(**{f'{previous}__isnull': True}) if position[i] is None else Q(**{previous: position[i]})
+                for i, (previous, _) in enumerate(ordering[:index])
+            ]
+            if value is None:
+                if not descending:
+                    continue
+                beyond = Q(**{f'{name}__isnull': False})
+            elif descending:
+                beyond = Q(**{f'{name}__lt': value})
+            else:
+                beyond = Q(**{f'{name}__gt': value})
+                if nullable:
+                    beyond |= Q(**{f'{name}__isnull': True})
+            clauses.append(reduce(and_, equal + [beyond]))
+        if not clauses:
+            return Q(pk__in=[])
+        condition = reduce(or_, clauses)
+
+        # Redundant bound on the first field so the database can range-scan an index
+        name, descending = ordering[0]
+        if position[0] is not None:
+            bound = Q(**{f'{name}__lte' if descending else f'{name}__gte': position[0]})
+            if not descending and name in self.nullable:
+                bound |= Q(**{f'{name}__isnull': True})
+            condition &= bound
+        return condition
+
+    def position_of(self, instance):
+        return [getattr(instance, name) for name, _ in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, cls=DjangoJSONEncoder)
+        encoded = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        """
+        ``(position, reverse)`` of the ``?cursor=`` parameter; the position is
+        a list with one value per ordering field, each converted by the model
+        field (a tampered cursor is a 404, not a database error)
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            position = payload['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            position = [
+                None if value is None else self.fields[name].to_python(value)
+                for (name, _), value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
@@ -0,0 +1,25 @@
+"""Retention of a ``ChangeLog``, shared by the ``prune_change_events`` commands"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class PruneCommand(BaseCommand):
+    """
+    Base of the ``prune_change_events`` commands: subclasses set
+    ``change_log``, the project's ``ChangeLog``
+    """
+    help = "Delete change log events older than --days days"
+    change_log = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help="Retention; clients disconnected for longer must reload everything")
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("--days must be positive")
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        deleted, _ = self.change_log.event_model.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} event(s)"))
@@ -0,0 +1,132 @@
+"""Spatial index of coordinates and ``?bbox=`` filter for the map views.
+
+On SQLite, every model declaring ``spatial_index = True`` (with
+``latitude`` and ``longitude`` columns) has an R*Tree virtual table
+(``<table>_rtree``: id, min_lon, max_lon, min_lat, max_lat) fed by
+triggers: every write, bulk_create and the raw queries of the bulk
+importers included, keeps it current. ``ensure_spatial_index`` (re)creates
+it after every migrate, because SQLite rebuilds the tables a migration
+alters and drops their triggers on the way.
+
+A viewport query reads the tree, then only the candidate rows by primary
+key. Tree coordinates are float32 rounded outwards: the exact filter on the
+original columns drops the false positives on the edges. Other databases
+fall back to the plain range filter.
+"""
+from django.apps import apps
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def is_indexed(model):
+    return getattr(model, 'spatial_index', False)
+
+
+def rtree_table(model):
+    return f'{model._meta.db_table}_rtree'
+
+
+def _triggers(model):
+    table, rtree = model._meta.db_table, rtree_table(model)
+    point = "NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude"
+    located = "NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL"
+    return {
+        f'{rtree}_insert': (
+            f'CREATE TRIGGER "{rtree}_insert" AFTER INSERT ON "{table}" WHEN {located} '
+            f'BEGIN INSERT INTO "{rtree}" VALUES ({point}); END'
+        ),
+        f'{rtree}_update': (
+            f'CREATE TRIGGER "{rtree}_update" AFTER UPDATE OF latitude, longitude ON "{table}" '
+            f'BEGIN DELETE FROM "{rtree}" WHERE id = OLD.id; '
+            f'INSERT INTO "{rtree}" SELECT {point} WHERE {located}; END'
+        ),
+        f'{rtree}_delete': (
+            f'CREATE TRIGGER "{rtree}_delete" AFTER DELETE ON "{table}" '
+            f'BEGIN DELETE FROM "{rtree}" WHERE id = OLD.id; END'
+        ),
+    }
+
+
+def rebuild_spatial_index(model, using='default'):
+    """Reload the tree from the table (after the triggers were lost)"""
+    table, rtree = model._meta.db_table, rtree_table(model)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{rtree}"')
+        cursor.execute(
+            f'INSERT INTO "{rtree}" SELECT id, longitude, longitude, latitude, latitude FROM "{table}" '
+            f'WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+        )
+
+
+def ensure_spatial_index(using='default'):
+    """Create the tree and its triggers when missing, and rebuild it in that case"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    tables = set(connection.introspection.table_names())
+    for model in filter(is_indexed, apps.get_models()):
+        if model._meta.db_table not in tables:
+            continue
+        triggers = _triggers(model)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+                [model._meta.db_table],
+            )
+            existing = {name for name, in cursor.fetchall()}
+            if rtree_table(model) in tables and existing >= triggers.keys():
+                continue
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{rtree_table(model)}" '
+                f'USING rtree(id, min_lon, max_lon, min_lat, max_lat)'
+            )
+            for name, sql in triggers.items():
+                cursor.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+                cursor.execute(sql)
+        rebuild_spatial_index(model, using)
+
+
+def parse_bbox(value):
+    """``minLon,minLat,maxLon,maxLat``; minLon > maxLon crosses the antimeridian"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({'bbox': "Expected format: minLon,minLat,maxLon,maxLat"})
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValidationError({'bbox': "Coordinates out of range"})
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def filter_bbox(queryset, bbox):
+    """Rows whose (longitude, latitude) point lies in ``bbox``"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    # Viewport across the antimeridian: two longitude ranges
+    spans = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180), (-180, max_lon)]
+    model = queryset.model
+    connection = connections[queryset.db]
+    matched = queryset.none()
+    for lon_min, lon_max in spans:
+        span = queryset.filter(
+            latitude__gte=min_lat, latitude__lte=max_lat,
+            longitude__gte=lon_min, longitude__lte=lon_max,
+        )
+        if connection.vendor == 'sqlite' and is_indexed(model):
+            span = span.filter(pk__in=RawSQL(
+                f'SELECT id FROM "{rtree_table(model)}" '
+                f'WHERE min_lon <= %s AND max_lon >= %s AND min_lat <= %s AND max_lat >= %s',
+                [lon_max, lon_min, max_lat, min_lat],
+            ))
+        matched = matched | span
+    return matched
+
+
+class BoundingBoxFilter(BaseFilterBackend):
+    """``?bbox=minLon,minLat,maxLon,maxLat`` filter backed by the spatial index"""
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get('bbox')
+        if not value:
+            return queryset
+        return filter_bbox(queryset, parse_bbox(value))
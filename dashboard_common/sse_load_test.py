@@ -0,0 +1,150 @@
+"""Local load test of a ``ChangeLog`` SSE feed, shared by the ``sse_load_test`` commands"""
+import asyncio
+import statistics
+import sys
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - POSIX only (not on Windows)
+    resource = None
+
+
+def memory_usage():
+    """
+    Memory in bytes: peak RSS of the process where the resource module exists
+    (KiB on Linux, bytes on macOS), else the Python allocations traced by
+    tracemalloc, which leaves out memory held outside the interpreter
+    """
+    if resource is None:
+        return tracemalloc.get_traced_memory()[0]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class LoadTestCommand(BaseCommand):
+    """
+    Base of the ``sse_load_test`` commands: subclasses set ``change_log``
+    (the project's ``ChangeLog``) and ``load_test_model``, the model label of
+    the synthetic events.
+
+    The test runs against a throwaway test database, created and destroyed
+    like the test runner does: the synthetic events never reach the live
+    log, whose clients would otherwise receive them.
+    """
+    help = (
+        "Local load test of the SSE feed (/api/events/): opens N connections "
+        "to the ASGI application in this process, publishes synthetic events "
+        "and measures delivery latency and memory"
+    )
+    change_log = None
+    load_test_model = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help="Concurrent connections")
+        parser.add_argument('--events', type=int, default=20, help="Events published")
+        parser.add_argument('--interval', type=float, default=0.1, help="Seconds between two events")
+        parser.add_argument('--timeout', type=float, default=30, help="Maximum delivery wait (s)")
+        parser.add_argument('--path', default='/api/events/', help="SSE feed path")
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['events'] < 1:
+            raise CommandError("--connections and --events must be positive")
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        databases = runner.setup_databases()
+        try:
+            asyncio.run(self.run(**options))
+        finally:
+            runner.teardown_databases(databases)
+
+    async def run(self, connections, events, interval, timeout, path, **options):
+        application = ASGIHandler()
+        disconnect = asyncio.Event()
+        received = [dict() for _ in range(connections)]
+        published = {}
+        feed = self.change_log.feed
+        event_model = self.change_log.event_model
+        if resource is None:
+            tracemalloc.start()
+        memory_before = memory_usage()
+
+        async def client(index):
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] != 'http.response.body':
+                    return
+                now = time.perf_counter()
+                for line in message.get('body', b'').decode().splitlines():
+                    if line.startswith('id: '):
+                        received[index][int(line[4:])] = now
+
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': b'', 'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 10000 + index),
+            }
+            await application(scope, receive, send)
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(client(index)) for index in range(connections)]
+        while len(feed.subscribers) < connections:
+            if time.perf_counter() - started > timeout:
+                raise CommandError(f"{len(feed.subscribers)}/{connections} connections open after {timeout}s")
+            await asyncio.sleep(0.05)
+        connect_time = time.perf_counter() - started
+        memory_connected = memory_usage()
+        self.stdout.write(f"{connections} connections open in {connect_time:.2f}s")
+
+        create = sync_to_async(lambda number: event_model.objects.create(
+            model=self.load_test_model, object_id=number, action='update', data={'number': number}
+        ))
+        for number in range(events):
+            event = await create(number)
+            published[event.id] = time.perf_counter()
+            await asyncio.sleep(interval)
+
+        deadline = time.perf_counter() + timeout
+        expected = connections * events
+        while time.perf_counter() < deadline:
+            delivered = sum(len(ids.keys() & published.keys()) for ids in received)
+            if delivered >= expected:
+                break
+            await asyncio.sleep(0.05)
+
+        disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        latencies = sorted(
+            (seen - published[event_id]) * 1000
+            for ids in received for event_id, seen in ids.items() if event_id in published
+        )
+        delivered = len(latencies)
+        self.stdout.write(f"Events delivered: {delivered}/{expected}")
+        if latencies:
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f"Latency (ms): median {statistics.median(latencies):.1f}, p99 {p99:.1f}, max {latencies[-1]:.1f}"
+            )
+        if resource is None:
+            tracemalloc.stop()
+        per_connection = (memory_connected - memory_before) / connections
+        self.stdout.write(f"Memory: ~{per_connection / 1024:.1f} KiB per idle connection")
+        if delivered < expected:
+            raise CommandError("Not every event was delivered")
+        self.stdout.write(self.style.SUCCESS("Load test finished"))
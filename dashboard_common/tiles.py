@@ -0,0 +1,172 @@
+"""Vector tiles (MVT) of point layers.
+
+A ``TileLayer`` reads a tile through its ``features`` callable (usually the
+spatial index, ``spatial.filter_bbox``), encodes it (``mvt``), then keeps it
+in a per-process LRU cache. Every tile has its own version token in the
+shared ``versions`` cache: a write that moves a point, or changes one of the
+layer attributes, only renews the tokens of the tiles holding the old and
+the new position, at every zoom level. Other cached tiles stay valid, in
+every worker. Bulk imports renew the layer token.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import transaction
+
+from . import mvt
+from .cache import VERSION_CACHE
+
+MAX_ZOOM = 16
+# Margin around the tile (tile units): symbols on the edges are not clipped
+BUFFER = 64
+TILE_CACHE_SIZE = 2048
+# Web Mercator projection bounds
+MAX_LATITUDE = 85.05112878
+
+
+class TileCache:
+    """LRU cache of encoded tiles: (z, x, y) -> (tokens, bytes)"""
+
+    def __init__(self, maxsize=TILE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, versions):
+        with self.lock:
+            entry = self.tiles.get(key)
+            if entry is None or entry[0] != versions:
+                return None
+            self.tiles.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, versions, data):
+        with self.lock:
+            self.tiles[key] = (versions, data)
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > self.maxsize:
+                self.tiles.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.tiles.clear()
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def project(longitude, latitude, z):
+    """Fractional tile coordinates (x, y) of a point at zoom ``z``"""
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    n = 2 ** z
+    x = (longitude + 180) / 360 * n
+    radians = math.radians(latitude)
+    y = (1 - math.log(math.tan(radians) + 1 / math.cos(radians)) / math.pi) / 2 * n
+    return x, y
+
+
+def tile_bbox(z, x, y):
+    """(minLon, minLat, maxLon, maxLat) of the tile, margin included"""
+    n = 2 ** z
+    margin = BUFFER / mvt.EXTENT
+
+    def longitude(tx):
+        return max(-180.0, min(180.0, tx / n * 360 - 180))
+
+    def latitude(ty):
+        ty = max(0.0, min(float(n), ty))
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return longitude(x - margin), latitude(y + 1 + margin), longitude(x + 1 + margin), latitude(y - margin)
+
+
+def tiles_for_point(longitude, latitude):
+    """Tiles (z, x, y) whose extent, margin included, holds the point"""
+    margin = BUFFER / mvt.EXTENT
+    for z in range(MAX_ZOOM + 1):
+        n = 2 ** z
+        px, py = project(longitude, latitude, z)
+        for x in range(max(0, math.floor(px - margin)), min(n - 1, math.floor(px + margin)) + 1):
+            for y in range(max(0, math.floor(py - margin)), min(n - 1, math.floor(py + margin)) + 1):
+                yield z, x, y
+
+
+def tile_coordinates(longitude, latitude, z, x, y):
+    """Integer position of a point in tile (z, x, y), in ``mvt.EXTENT`` units"""
+    px, py = project(longitude, latitude, z)
+    return round((px - x) * mvt.EXTENT), round((py - y) * mvt.EXTENT)
+
+
+def tile_point(values):
+    """(longitude, latitude) position from the values of a layer's fields, or None"""
+    if values is None or values['latitude'] is None or values['longitude'] is None:
+        return None
+    return values['longitude'], values['latitude']
+
+
+def _bump(keys):
+    def bump():
+        version = time.time_ns()
+        caches[VERSION_CACHE].set_many({key: version for key in keys}, timeout=None)
+    # Like bump_data_version: immediately, then on commit
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+class TileLayer:
+    """
+    A point layer. ``fields``: columns the content of a tile depends on
+    (``latitude`` and ``longitude`` included); ``features(z, x, y)``: the
+    (id, (x, y), properties) features of a tile, see ``tile_coordinates``.
+    """
+
+    def __init__(self, name, fields, features, cache_size=TILE_CACHE_SIZE):
+        self.name = name
+        self.fields = fields
+        self.features = features
+        self.cache = TileCache(cache_size)
+        self.layer_key = f'tile-version:{name}'
+        self.tile_key = f'tile-version:{name}:{{}}/{{}}/{{}}'
+
+    def values(self, instance):
+        return {field: getattr(instance, field) for field in self.fields}
+
+    def versions(self, z, x, y):
+        """(layer, tile) tokens, created on first read"""
+        cache = caches[VERSION_CACHE]
+        keys = [self.layer_key, self.tile_key.format(z, x, y)]
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = cache.get(key)
+        return tuple(versions[key] for key in keys)
+
+    def invalidate_points(self, points):
+        """Invalidate the tiles holding these (longitude, latitude) positions; None is skipped"""
+        keys = {
+            self.tile_key.format(*tile)
+            for point in points if point is not None
+            for tile in tiles_for_point(*point)
+        }
+        if keys:
+            _bump(keys)
+
+    def invalidate(self):
+        """Invalidate every tile (bulk loads, which send no signals)"""
+        _bump([self.layer_key])
+
+    def render(self, z, x, y, versions=None):
+        """(tokens, encoded tile); a tile without features is empty (b'')"""
+        versions = versions or self.versions(z, x, y)
+        data = self.cache.get((z, x, y), versions)
+        if data is None:
+            features = list(self.features(z, x, y))
+            data = mvt.encode_tile([mvt.encode_layer(self.name, features)] if features else [])
+            self.cache.set((z, x, y), versions, data)
+        return versions, data
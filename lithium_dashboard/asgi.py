@@ -2,6 +2,8 @@
 ASGI config for lithium_dashboard project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn lithium_dashboard.asgi:application``)
+so the /api/events/ SSE feed holds idle connections on the event loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecyclingPlantsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recycling_plants'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,14 @@
+"""Regroupement des installations de recyclage (voir dashboard_common.clusters)."""
+from dashboard_common.clusters import VersionedClusterIndex
+
+from .models import RecyclingPlant
+
+
+def plant_points():
+    """(id, longitude, latitude, capacité en kg/mois) des installations localisées"""
+    return RecyclingPlant.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+        'id', 'longitude', 'latitude', 'capacity'
+    )
+
+
+cluster_index = VersionedClusterIndex(RecyclingPlant, plant_points).get
@@ -0,0 +1,28 @@
+"""Paramètres du dashboard : ligne unique en base, mise en cache dans chaque processus.
+
+Le stockage (get_or_create sur ``singleton``, copie mémoire sous le jeton de
+version, compare-and-swap de ``increment_version``) est dans
+``dashboard_common.dashboard_settings`` ; ce module le lie au modèle
+``DashboardSettings`` et aux couleurs par défaut de ce projet.
+"""
+from dashboard_common.dashboard_settings import SettingsStore, VersionConflict  # noqa: F401
+
+from .events import change_log
+from .models import DashboardSettings
+
+DEFAULT_STATUS_COLORS = {
+    "operational": "#4CAF50",
+    "construction": "#FF9800",
+    "planned": "#2196F3",
+    "approved": "#9C27B0",
+    "suspended": "#F44336"
+}
+
+DEFAULT_CHART_COLORS = ["#4a6bff", "#ff7043", "#ffca28", "#66bb6a", "#ab47bc"]
+
+store = SettingsStore(DashboardSettings, {
+    'status_colors': DEFAULT_STATUS_COLORS,
+    'chart_colors': DEFAULT_CHART_COLORS,
+}, change_log)
+get_settings = store.get
+increment_version = store.increment_version
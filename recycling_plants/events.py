@@ -0,0 +1,26 @@
+"""Journal des modifications des données du dashboard (voir dashboard_common.events)."""
+from dashboard_common.events import ChangeLog
+
+from .models import ChangeEvent, DashboardSettings, ProductionData, RecyclingPlant, ResearchProject, University
+
+# Les agrégats (ProductionMonthlyRollup) sont dérivés : les clients les recalculent
+LOGGED_MODELS = (University, RecyclingPlant, ProductionData, ResearchProject, DashboardSettings)
+
+
+def snapshot(instance):
+    """
+    Valeurs des colonnes d'une instance (clés étrangères sous leur attname),
+    plus les ids des relations plusieurs-à-plusieurs
+    """
+    data = {field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields}
+    for field in instance._meta.many_to_many:
+        data[field.name] = list(getattr(instance, field.name).values_list('pk', flat=True))
+    return data
+
+
+change_log = ChangeLog(ChangeEvent, LOGGED_MODELS, snapshot)
+feed = change_log.feed
+record_changes = change_log.record_changes
+record_change = change_log.record_change
+latest_event_id = change_log.latest_event_id
+stream_events = change_log.stream
@@ -0,0 +1,82 @@
+"""FeatureCollection GeoJSON précalculée des installations de recyclage.
+
+Chaque variante (précision des coordonnées, filtres ``status`` et
+``country``) est construite par une seule requête ``values_list()`` et
+conservée précompressée sous les versions de données de ``RecyclingPlant``
+et ``University`` (voir ``dashboard_common.geojson``). Les installations
+sans coordonnées sont omises. ``country`` est limité aux pays des
+universités connues : le nombre de variantes en cache reste borné.
+"""
+from django.core.cache import caches
+
+from dashboard_common.cache import RESPONSE_CACHE, get_data_versions
+from dashboard_common.geojson import compressed_payload
+
+from .models import RecyclingPlant, University
+
+# 7 décimales : environ 1 cm, plus fin que la précision des coordonnées saisies
+MAX_PRECISION = 7
+STATUSES = {'active': True, 'inactive': False}
+CACHE_KEY = 'plant-geojson:{}:{}:{}:{}'
+COUNTRIES_KEY = 'plant-geojson-countries:{}'
+
+
+def known_countries():
+    """Pays des universités, en cache sous la version de données de ``University``"""
+    cache = caches[RESPONSE_CACHE]
+    key = COUNTRIES_KEY.format(*get_data_versions(University))
+    countries = cache.get(key)
+    if countries is None:
+        countries = frozenset(University.objects.values_list('country', flat=True).distinct())
+        cache.set(key, countries, None)
+    return countries
+
+
+def plant_features(precision=None, status=None, country=None):
+    """Features GeoJSON des installations ; coordonnées arrondies à ``precision`` décimales"""
+    plants = RecyclingPlant.objects.filter(latitude__isnull=False, longitude__isnull=False).order_by('id')
+    if status:
+        plants = plants.filter(active=STATUSES[status])
+    if country:
+        plants = plants.filter(university__country=country)
+
+    def quantize(value):
+        return value if precision is None else round(value, precision)
+
+    features = []
+    for pk, name, address, university, university_country, active, capacity, latitude, longitude, production, rate in (
+        plants.values_list(
+            'id', 'name', 'address', 'university', 'university__country', 'active', 'capacity',
+            'latitude', 'longitude', 'latest_production_amount', 'latest_recycling_rate',
+        )
+    ):
+        features.append({
+            'type': 'Feature',
+            'id': pk,
+            # Ordre GeoJSON : longitude d'abord
+            'geometry': {'type': 'Point', 'coordinates': [quantize(longitude), quantize(latitude)]},
+            'properties': {
+                'name': name,
+                'address': address,
+                'university': university,
+                'country': university_country,
+                'status': 'active' if active else 'inactive',
+                'capacity': capacity,
+                'latest_production_amount': production,
+                'latest_recycling_rate': rate,
+            },
+        })
+    return features
+
+
+def geojson_payload(precision=None, status=None, country=None):
+    """
+    ``(empreinte, {encodage: corps})`` pour les versions de données actuelles,
+    l'empreinte étant propre à la variante et aux versions (ETag) ; encodages
+    ``identity``, ``gzip`` et, si brotli est installé, ``br``.
+    """
+    versions = get_data_versions(RecyclingPlant, University)
+    key = CACHE_KEY.format('-'.join(str(version) for version in versions), precision, status, country)
+    return compressed_payload(key, lambda: {
+        'type': 'FeatureCollection', 'features': plant_features(precision, status, country),
+    })
@@ -0,0 +1,88 @@
+"""Écriture en masse des données de production (insertion ou mise à jour sur (plant, date))."""
+from django.db import connection, transaction
+
+from dashboard_common.cache import bump_data_version
+
+from .events import record_changes
+from .models import ProductionData
+from .rollups import month_of, rebuild_rollups
+from .snapshots import refresh_latest_production
+
+BATCH_SIZE = 500
+UPDATE_FIELDS = ['production_amount', 'recycling_rate', 'waste_amount', 'notes']
+
+
+def _upsert_statement(count):
+    """
+    INSERT ... ON CONFLICT (plant_id, date) DO UPDATE ... RETURNING de
+    ``count`` lignes (SQLite >= 3.35, PostgreSQL). Une seule instruction par
+    lot : bulk_create(update_conflicts=True) compile le SQL ligne par ligne et
+    coûte plusieurs fois plus cher. RETURNING fournit l'id de chaque relevé
+    écrit, sans relire la table.
+    """
+    qn = connection.ops.quote_name
+    meta = ProductionData._meta
+    columns = [meta.get_field('plant').column, meta.get_field('date').column] + [
+        meta.get_field(field).column for field in UPDATE_FIELDS
+    ]
+    assignments = ', '.join(f'{qn(column)} = excluded.{qn(column)}' for column in columns[2:])
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+    return (
+        f"INSERT INTO {qn(meta.db_table)} ({', '.join(qn(column) for column in columns)}) "
+        f"VALUES {', '.join([placeholders] * count)} "
+        f"ON CONFLICT ({qn(columns[0])}, {qn(columns[1])}) DO UPDATE SET {assignments} "
+        f"RETURNING {qn(meta.pk.column)}, {qn(columns[0])}, {qn(columns[1])}"
+    )
+
+
+def upsert_production_data(rows, batch_size=BATCH_SIZE):
+    """
+    Insère ou met à jour des relevés déjà validés (dictionnaires plant, date,
+    production_amount, recycling_rate, waste_amount, notes) dans une seule
+    transaction. Pour une même clé (plant, date), la dernière ligne l'emporte.
+
+    Aucun signal n'étant émis, l'instantané des installations, les agrégats
+    mensuels touchés et le journal des modifications sont mis à jour ici.
+    Retourne le couple (créés, mis à jour).
+    """
+    by_key = {(row['plant'], row['date']): row for row in rows}
+    keys = list(by_key)
+    created = updated = 0
+    adapt_date = connection.ops.adapt_datefield_value
+    # Les dates renvoyées par RETURNING dépendent du pilote (date ou texte)
+    to_date = ProductionData._meta.get_field('date').to_python
+
+    with transaction.atomic():
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            existing = set(
+                ProductionData.objects.filter(
+                    plant_id__in={plant for plant, _ in batch},
+                    date__in={date for _, date in batch},
+                ).values_list('plant_id', 'date')
+            )
+            params = []
+            for plant, date in batch:
+                params.extend((plant, adapt_date(date), *(by_key[plant, date].get(field, '') for field in UPDATE_FIELDS)))
+            with connection.cursor() as cursor:
+                cursor.execute(_upsert_statement(len(batch)), params)
+                written = cursor.fetchall()
+
+            # Journal construit à partir des valeurs écrites, sans relire la table
+            changes = {'create': [], 'update': []}
+            for pk, plant, date in written:
+                key = plant, to_date(date)
+                data = {'id': pk, 'plant_id': plant, 'date': key[1]}
+                data.update((field, by_key[key].get(field, '')) for field in UPDATE_FIELDS)
+                changes['update' if key in existing else 'create'].append((pk, data))
+            for action, logged in changes.items():
+                record_changes(ProductionData, action, logged)
+            updated += len(changes['update'])
+            created += len(changes['create'])
+
+        if keys:
+            bump_data_version(ProductionData)
+            refresh_latest_production({plant for plant, _ in keys})
+            rebuild_rollups({(plant, month_of(date)) for plant, date in keys})
+
+    return created, updated
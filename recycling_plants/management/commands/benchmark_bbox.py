@@ -0,0 +1,15 @@
+from dashboard_common.benchmark_bbox import BenchmarkCommand
+
+from recycling_plants.models import RecyclingPlant
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Mesure les requêtes ?bbox= sur N installations synthétiques (annulées en "
+        "fin de test) : index R*Tree contre filtre par intervalles seul"
+    )
+    model = RecyclingPlant
+    count_option = 'plants'
+
+    def build(self, index, latitude, longitude):
+        return RecyclingPlant(name=f"Benchmark {index}", latitude=latitude, longitude=longitude)
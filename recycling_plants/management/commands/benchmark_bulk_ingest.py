@@ -0,0 +1,59 @@
+import datetime
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.urls import reverse
+
+from recycling_plants.models import RecyclingPlant
+from recycling_plants.views import ProductionDataViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure l'import en masse (POST /api/production-data/bulk/) de N installations "
+        "× D jours de relevés synthétiques (annulés en fin de test) : premier envoi, "
+        "puis renvoi des mêmes lignes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plants', type=int, default=100, help="Installations générées")
+        parser.add_argument('--days', type=int, default=100, help="Relevés par installation")
+        parser.add_argument('--repeat', type=int, default=3, help="Renvois des mêmes lignes")
+
+    def handle(self, *args, **options):
+        if options['plants'] < 1 or options['days'] < 1 or options['repeat'] < 1:
+            raise CommandError("--plants, --days et --repeat doivent être positifs")
+        view = ProductionDataViewSet.as_view({'post': 'bulk'})
+        factory = RequestFactory()
+
+        with transaction.atomic():
+            plants = RecyclingPlant.objects.bulk_create([
+                RecyclingPlant(name=f"Benchmark {index}") for index in range(options['plants'])
+            ])
+            start = datetime.date(2000, 1, 1)
+            rows = [
+                {'plant': plant.pk, 'date': (start + datetime.timedelta(days=day)).isoformat(),
+                 'production_amount': 1, 'recycling_rate': 50, 'waste_amount': 1}
+                for plant in plants for day in range(options['days'])
+            ]
+            body = json.dumps(rows)
+            self.stdout.write(f"{len(rows)} relevés, corps JSON de {len(body) / 1024:.0f} Kio")
+
+            for attempt in range(options['repeat'] + 1):
+                request = factory.post(reverse('productiondata-bulk'), body, content_type='application/json')
+                started = time.perf_counter()
+                response = view(request)
+                response.render()
+                elapsed = time.perf_counter() - started
+                if response.status_code != 200 or response.data['errors']:
+                    raise CommandError(f"Import refusé : {response.status_code} {response.data}")
+                label = "Premier envoi" if attempt == 0 else "Renvoi"
+                self.stdout.write(
+                    f"{label} : {response.data['created']} créé(s), {response.data['updated']} mis à jour, "
+                    f"{elapsed:.2f}s soit {len(rows) / elapsed:,.0f} lignes/s"
+                )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Benchmark terminé, données synthétiques annulées"))
@@ -0,0 +1,8 @@
+from dashboard_common.prune_change_events import PruneCommand
+
+from recycling_plants.events import change_log
+
+
+class Command(PruneCommand):
+    help = "Supprime les événements du journal des modifications plus anciens que --days jours"
+    change_log = change_log
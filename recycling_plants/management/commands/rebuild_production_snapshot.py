@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recycling_plants.snapshots import refresh_latest_production
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'instantané de la dernière production de chaque installation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plant', type=int, action='append', dest='plants',
+                            help="Limiter à une installation (option répétable)")
+
+    def handle(self, *args, **options):
+        updated = refresh_latest_production(options['plants'])
+        self.stdout.write(self.style.SUCCESS(f'{updated} installation(s) mise(s) à jour'))
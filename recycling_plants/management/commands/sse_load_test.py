@@ -0,0 +1,14 @@
+from dashboard_common.sse_load_test import LoadTestCommand
+
+from recycling_plants.events import change_log
+
+
+class Command(LoadTestCommand):
+    help = (
+        "Test de charge local du flux SSE (/api/events/) : ouvre N connexions "
+        "sur l'application ASGI dans ce processus, publie des événements "
+        "synthétiques et mesure la latence de diffusion et la mémoire"
+    )
+    change_log = change_log
+    # Modèle des événements synthétiques (base de test jetable)
+    load_test_model = 'recycling_plants.loadtest'
@@ -0,0 +1,51 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recycling_plants.models import ProductionMonthlyRollup
+from recycling_plants.rollups import METRICS, compute_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Compare les agrégats mensuels de production à un recalcul complet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Reconstruire les compartiments divergents")
+
+    def handle(self, *args, **options):
+        expected = compute_rollups()
+        fields = ['count'] + [f'{metric}_{stat}' for metric in METRICS for stat in ('sum', 'min', 'max')]
+        stored = {
+            (row.pop('plant'), row.pop('month')): row
+            for row in ProductionMonthlyRollup.objects.order_by().values('plant', 'month', *fields)
+        }
+
+        differences = []
+        for key in sorted(expected.keys() | stored.keys()):
+            plant_id, month = key
+            label = f"installation {plant_id}, {month:%Y-%m}"
+            if key not in stored:
+                differences.append((key, f"{label} : compartiment manquant"))
+            elif key not in expected:
+                differences.append((key, f"{label} : compartiment orphelin"))
+            else:
+                mismatched = [
+                    field for field, value in expected[key].items()
+                    if not math.isclose(stored[key][field], value, rel_tol=1e-9, abs_tol=1e-6)
+                ]
+                if mismatched:
+                    details = ', '.join(f"{field}={stored[key][field]} (attendu {expected[key][field]})" for field in mismatched)
+                    differences.append((key, f"{label} : {details}"))
+
+        for _, message in differences:
+            self.stdout.write(message)
+
+        if not differences:
+            self.stdout.write(self.style.SUCCESS(f'{len(expected)} compartiment(s) conforme(s)'))
+            return
+        if options['fix']:
+            rebuild_rollups([key for key, _ in differences])
+            self.stdout.write(self.style.SUCCESS(f'{len(differences)} compartiment(s) reconstruit(s)'))
+            return
+        raise CommandError(f'{len(differences)} compartiment(s) divergent(s)')
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:39
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_latest_production(apps, schema_editor):
+    RecyclingPlant = apps.get_model('recycling_plants', 'RecyclingPlant')
+    ProductionData = apps.get_model('recycling_plants', 'ProductionData')
+    latest = ProductionData.objects.filter(plant=OuterRef('pk')).order_by('-date')
+    RecyclingPlant.objects.update(
+        latest_production_date=Subquery(latest.values('date')[:1]),
+        latest_production_amount=Coalesce(Subquery(latest.values('production_amount')[:1]), Value(0.0)),
+        latest_recycling_rate=Coalesce(Subquery(latest.values('recycling_rate')[:1]), Value(0.0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recycling_plants', '0002_university_alter_recyclingplant_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recyclingplant',
+            name='latest_production_amount',
+            field=models.FloatField(default=0, editable=False, verbose_name='Dernière production (kg)'),
+        ),
+        migrations.AddField(
+            model_name='recyclingplant',
+            name='latest_production_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Date de la dernière production'),
+        ),
+        migrations.AddField(
+            model_name='recyclingplant',
+            name='latest_recycling_rate',
+            field=models.FloatField(default=0, editable=False, verbose_name='Dernier taux de recyclage (%)'),
+        ),
+        migrations.RunPython(backfill_latest_production, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncMonth
+
+
+METRICS = ('production_amount', 'recycling_rate', 'waste_amount')
+
+
+def backfill_rollups(apps, schema_editor):
+    ProductionData = apps.get_model('recycling_plants', 'ProductionData')
+    ProductionMonthlyRollup = apps.get_model('recycling_plants', 'ProductionMonthlyRollup')
+    aggregates = {'count': Count('id')}
+    for metric in METRICS:
+        aggregates[f'{metric}_sum'] = Sum(metric)
+        aggregates[f'{metric}_min'] = Min(metric)
+        aggregates[f'{metric}_max'] = Max(metric)
+    rows = ProductionData.objects.order_by().annotate(month=TruncMonth('date')).values(
+        'plant', 'month'
+    ).annotate(**aggregates)
+    ProductionMonthlyRollup.objects.bulk_create(
+        [ProductionMonthlyRollup(plant_id=row.pop('plant'), **row) for row in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recycling_plants', '0003_recyclingplant_latest_production'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductionMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mois')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Nombre de relevés')),
+                ('production_amount_sum', models.FloatField(default=0, verbose_name='Production totale (kg)')),
+                ('production_amount_min', models.FloatField(default=0, verbose_name='Production minimale (kg)')),
+                ('production_amount_max', models.FloatField(default=0, verbose_name='Production maximale (kg)')),
+                ('recycling_rate_sum', models.FloatField(default=0, verbose_name='Somme des taux de recyclage')),
+                ('recycling_rate_min', models.FloatField(default=0, verbose_name='Taux de recyclage minimal (%)')),
+                ('recycling_rate_max', models.FloatField(default=0, verbose_name='Taux de recyclage maximal (%)')),
+                ('waste_amount_sum', models.FloatField(default=0, verbose_name='Déchets totaux (kg)')),
+                ('waste_amount_min', models.FloatField(default=0, verbose_name='Déchets minimaux (kg)')),
+                ('waste_amount_max', models.FloatField(default=0, verbose_name='Déchets maximaux (kg)')),
+                ('plant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='recycling_plants.recyclingplant', verbose_name='Installation')),
+            ],
+            options={
+                'verbose_name': 'Agrégat mensuel de production',
+                'verbose_name_plural': 'Agrégats mensuels de production',
+                'ordering': ['plant', 'month'],
+                'unique_together': {('plant', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
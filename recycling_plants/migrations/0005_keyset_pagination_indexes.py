@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recycling_plants', '0004_productionmonthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productiondata',
+            index=models.Index(fields=['-date', 'plant', 'id'], name='production_date_plant_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productiondata',
+            index=models.Index(fields=['production_amount', 'id'], name='production_amount_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productiondata',
+            index=models.Index(fields=['recycling_rate', 'id'], name='production_rate_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recyclingplant',
+            index=models.Index(fields=['name', 'id'], name='plant_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recyclingplant',
+            index=models.Index(fields=['capacity', 'id'], name='plant_capacity_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recyclingplant',
+            index=models.Index(fields=['opening_date', 'id'], name='plant_opening_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='researchproject',
+            index=models.Index(fields=['-start_date', 'title', 'id'], name='project_start_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='researchproject',
+            index=models.Index(fields=['start_date', 'id'], name='project_start_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='researchproject',
+            index=models.Index(fields=['title', 'id'], name='project_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='university',
+            index=models.Index(fields=['name', 'id'], name='university_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='university',
+            index=models.Index(fields=['country', 'id'], name='university_country_id_idx'),
+        ),
+    ]
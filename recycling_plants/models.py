@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -14,6 +15,11 @@ class University(models.Model):
         verbose_name = "Université"
         verbose_name_plural = "Universités"
         ordering = ['name']
+        # Index des tris paginés par curseur (départagés par id)
+        indexes = [
+            models.Index(fields=['name', 'id'], name='university_name_id_idx'),
+            models.Index(fields=['country', 'id'], name='university_country_id_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -29,11 +35,24 @@ class RecyclingPlant(models.Model):
     active = models.BooleanField(default=True, verbose_name="Active")
     opening_date = models.DateField(blank=True, null=True, verbose_name="Date d'ouverture")
     description = models.TextField(blank=True, verbose_name="Description")
+    # Instantané de la donnée de production la plus récente, maintenu par
+    # recycling_plants.snapshots (voir aussi la commande rebuild_production_snapshot)
+    latest_production_date = models.DateField(blank=True, null=True, editable=False, verbose_name="Date de la dernière production")
+    latest_production_amount = models.FloatField(default=0, editable=False, verbose_name="Dernière production (kg)")
+    latest_recycling_rate = models.FloatField(default=0, editable=False, verbose_name="Dernier taux de recyclage (%)")
     
+    # Index R*Tree des coordonnées (voir dashboard_common.spatial)
+    spatial_index = True
+
     class Meta:
         verbose_name = "Installation de recyclage"
         verbose_name_plural = "Installations de recyclage"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='plant_name_id_idx'),
+            models.Index(fields=['capacity', 'id'], name='plant_capacity_id_idx'),
+            models.Index(fields=['opening_date', 'id'], name='plant_opening_date_id_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -55,10 +74,43 @@ class ProductionData(models.Model):
         verbose_name_plural = "Données de production"
         ordering = ['-date', 'plant']
         unique_together = ['plant', 'date']  # Une entrée par mois par installation
+        indexes = [
+            models.Index(fields=['-date', 'plant', 'id'], name='production_date_plant_id_idx'),
+            models.Index(fields=['production_amount', 'id'], name='production_amount_id_idx'),
+            models.Index(fields=['recycling_rate', 'id'], name='production_rate_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.plant.name} - {self.date}"
 
+class ProductionMonthlyRollup(models.Model):
+    """Agrégats mensuels de ProductionData par installation, maintenus incrémentalement"""
+    plant = models.ForeignKey(RecyclingPlant, on_delete=models.CASCADE, related_name="monthly_rollups", verbose_name="Installation")
+    month = models.DateField(verbose_name="Mois")
+    count = models.PositiveIntegerField(default=0, verbose_name="Nombre de relevés")
+    production_amount_sum = models.FloatField(default=0, verbose_name="Production totale (kg)")
+    production_amount_min = models.FloatField(default=0, verbose_name="Production minimale (kg)")
+    production_amount_max = models.FloatField(default=0, verbose_name="Production maximale (kg)")
+    recycling_rate_sum = models.FloatField(default=0, verbose_name="Somme des taux de recyclage")
+    recycling_rate_min = models.FloatField(default=0, verbose_name="Taux de recyclage minimal (%)")
+    recycling_rate_max = models.FloatField(default=0, verbose_name="Taux de recyclage maximal (%)")
+    waste_amount_sum = models.FloatField(default=0, verbose_name="Déchets totaux (kg)")
+    waste_amount_min = models.FloatField(default=0, verbose_name="Déchets minimaux (kg)")
+    waste_amount_max = models.FloatField(default=0, verbose_name="Déchets maximaux (kg)")
+    
+    class Meta:
+        verbose_name = "Agrégat mensuel de production"
+        verbose_name_plural = "Agrégats mensuels de production"
+        ordering = ['plant', 'month']
+        unique_together = ['plant', 'month']
+    
+    def __str__(self):
+        return f"{self.plant_id} - {self.month:%Y-%m}"
+
+    def mean(self, metric):
+        """Moyenne d'une métrique (``production_amount``, ``recycling_rate`` ou ``waste_amount``)"""
+        return getattr(self, f"{metric}_sum") / self.count if self.count else 0
+
 class ResearchProject(models.Model):
     """Modèle pour représenter les projets de recherche collaboratifs"""
     title = models.CharField(max_length=255, verbose_name="Titre du projet")
@@ -83,16 +135,23 @@ class ResearchProject(models.Model):
         verbose_name = "Projet de recherche"
         verbose_name_plural = "Projets de recherche"
         ordering = ['-start_date', 'title']
+        indexes = [
+            models.Index(fields=['-start_date', 'title', 'id'], name='project_start_title_id_idx'),
+            models.Index(fields=['start_date', 'id'], name='project_start_id_idx'),
+            models.Index(fields=['title', 'id'], name='project_title_id_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
 class DashboardSettings(models.Model):
-    """Modèle pour stocker les paramètres du dashboard"""
+    """Modèle pour stocker les paramètres du dashboard (ligne unique, voir recycling_plants.dashboard_settings)"""
     version = models.CharField(_('Version'), max_length=20)
     last_updated = models.DateTimeField(_('Dernière mise à jour'), auto_now=True)
     status_colors = models.JSONField(_('Couleurs des statuts'), default=dict)
     chart_colors = models.JSONField(_('Couleurs des graphiques'), default=list)
+    # Toujours vrai : la contrainte d'unicité interdit une seconde ligne
+    singleton = models.BooleanField(_('Instance unique'), default=True, unique=True, editable=False)
     
     class Meta:
         verbose_name = _('Paramètres du dashboard')
@@ -100,3 +159,31 @@ class DashboardSettings(models.Model):
     
     def __str__(self):
         return f"Paramètres dashboard v{self.version}"
+
+
+class ChangeEvent(models.Model):
+    """
+    Journal des créations, modifications et suppressions (voir
+    recycling_plants.events.LOGGED_MODELS), diffusé par le flux SSE et lu par
+    la synchronisation incrémentale. L'id croissant sert de Last-Event-ID pour
+    la reprise après déconnexion et de jeton de synchronisation.
+    """
+    ACTION_CHOICES = [
+        ('create', 'Création'),
+        ('update', 'Modification'),
+        ('delete', 'Suppression'),
+    ]
+
+    model = models.CharField(max_length=100, verbose_name="Modèle")
+    object_id = models.BigIntegerField(verbose_name="Identifiant de l'objet")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name="Action")
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Données")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Date")
+
+    class Meta:
+        verbose_name = "Événement de modification"
+        verbose_name_plural = "Événements de modification"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.model} {self.object_id}"
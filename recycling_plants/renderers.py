@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Un objet JSON par ligne ; accepte une liste ou un objet unique"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_line(row) for row in rows).encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV avec en-tête ; accepte une liste de dictionnaires ou un objet unique"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return b''
+        header = list(rows[0])
+        lines = [csv_line(header)] + [csv_line([row.get(column) for column in header]) for row in rows]
+        return ''.join(lines).encode(self.charset)
+
+
+class JSONArrayRenderer(BaseRenderer):
+    """Tableau JSON, pour les clients qui n'acceptent que application/json"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode(self.charset)
+
+
+def ndjson_line(row):
+    return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
@@ -0,0 +1,142 @@
+"""Maintenance incrémentale de ProductionMonthlyRollup.
+
+Chaque écriture sur ProductionData ajuste le compartiment (installation, mois)
+concerné par une seule requête UPDATE (compteur, sommes, min/max). Seul le
+retrait d'une valeur extrême (min ou max) oblige à relire les relevés de ce
+compartiment, les extrema ne pouvant pas être « soustraits ».
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Greatest, Least, TruncMonth
+
+from dashboard_common.cache import bump_data_version
+
+from .models import ProductionData, ProductionMonthlyRollup
+
+METRICS = ('production_amount', 'recycling_rate', 'waste_amount')
+
+
+def month_of(date):
+    """Premier jour du mois ; ``date`` peut être une chaîne ISO, comme l'accepte le champ"""
+    return ProductionData._meta.get_field('date').to_python(date).replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _raw_aggregates():
+    aggregates = {'count': Count('id')}
+    for metric in METRICS:
+        aggregates[f'{metric}_sum'] = Sum(metric)
+        aggregates[f'{metric}_min'] = Min(metric)
+        aggregates[f'{metric}_max'] = Max(metric)
+    return aggregates
+
+
+def compute_rollups(queryset=None):
+    """Recalcule intégralement les agrégats mensuels à partir des relevés bruts"""
+    if queryset is None:
+        queryset = ProductionData.objects.all()
+    rows = queryset.order_by().annotate(month=TruncMonth('date')).values(
+        'plant', 'month'
+    ).annotate(**_raw_aggregates())
+    return {
+        (row.pop('plant'), row.pop('month')): row
+        for row in rows
+    }
+
+
+def add_reading(reading):
+    """Ajoute un relevé à son compartiment mensuel"""
+    plant_id, month = reading.plant_id, month_of(reading.date)
+    values = {'count': F('count') + 1}
+    for metric in METRICS:
+        value = getattr(reading, metric)
+        values[f'{metric}_sum'] = F(f'{metric}_sum') + value
+        values[f'{metric}_min'] = Least(F(f'{metric}_min'), value)
+        values[f'{metric}_max'] = Greatest(F(f'{metric}_max'), value)
+
+    buckets = ProductionMonthlyRollup.objects.filter(plant_id=plant_id, month=month)
+    if buckets.update(**values):
+        return
+    initial = {'count': 1}
+    for metric in METRICS:
+        value = getattr(reading, metric)
+        initial.update({f'{metric}_sum': value, f'{metric}_min': value, f'{metric}_max': value})
+    try:
+        with transaction.atomic():
+            ProductionMonthlyRollup.objects.create(plant_id=plant_id, month=month, **initial)
+    except IntegrityError:
+        # Compartiment créé entre-temps par une écriture concurrente
+        buckets.update(**values)
+
+
+def remove_reading(plant_id, date, values):
+    """
+    Retire un relevé (``values`` : métrique -> valeur) de son compartiment.
+    Le compartiment est supprimé lorsqu'il devient vide. Retourne True si le
+    compartiment a dû être relu depuis les relevés bruts.
+    """
+    month = month_of(date)
+    buckets = ProductionMonthlyRollup.objects.filter(plant_id=plant_id, month=month)
+    updates = {'count': F('count') - 1}
+    for metric in METRICS:
+        updates[f'{metric}_sum'] = F(f'{metric}_sum') - values[metric]
+    buckets.update(**updates)
+    buckets.filter(count__lte=0).delete()
+
+    # Les extrema ne se décrémentent pas : ne relire que si la valeur retirée en était un
+    touched_extremum = Q()
+    for metric in METRICS:
+        touched_extremum |= Q(**{f'{metric}_min': values[metric]}) | Q(**{f'{metric}_max': values[metric]})
+    if buckets.filter(touched_extremum).exists():
+        rebuild_rollups([(plant_id, month)])
+        return True
+    return False
+
+
+def replace_reading(previous, reading):
+    """
+    Remplace dans les agrégats l'ancienne version d'un relevé (``previous`` :
+    dictionnaire plant_id, date et métriques) par sa version enregistrée.
+    """
+    values = dict(previous)
+    plant_id, date = values.pop('plant_id'), values.pop('date')
+    rebuilt = remove_reading(plant_id, date, values)
+    # Un compartiment relu inclut déjà la nouvelle version du relevé
+    if not (rebuilt and (plant_id, month_of(date)) == (reading.plant_id, month_of(reading.date))):
+        add_reading(reading)
+
+
+def rebuild_rollups(buckets=None):
+    """
+    Recalcule les compartiments ``(plant_id, month)`` donnés (tous si None)
+    à partir des relevés bruts. Utilisé par les chargements en masse, qui
+    contournent les signaux, et par ``verify_production_rollup --fix``.
+    """
+    readings = ProductionData.objects.all()
+    rollups = ProductionMonthlyRollup.objects.all()
+    if buckets is not None:
+        buckets = {(plant_id, month_of(month)) for plant_id, month in buckets}
+        if not buckets:
+            return
+        # Recalcule toute la plage de mois de ces installations : un
+        # sur-ensemble des compartiments demandés, sans danger à recalculer
+        plant_ids = {plant_id for plant_id, _ in buckets}
+        first = min(month for _, month in buckets)
+        last = max(month for _, month in buckets)
+        readings = readings.filter(plant_id__in=plant_ids, date__gte=first, date__lt=next_month(last))
+        rollups = rollups.filter(plant_id__in=plant_ids, month__gte=first, month__lte=last)
+
+    computed = compute_rollups(readings)
+    bump_data_version(ProductionMonthlyRollup)
+    with transaction.atomic():
+        rollups.delete()
+        ProductionMonthlyRollup.objects.bulk_create(
+            [ProductionMonthlyRollup(plant_id=plant_id, month=month, **values)
+             for (plant_id, month), values in computed.items()],
+            batch_size=500,
+        )
@@ -1,13 +1,80 @@
+import datetime
+import math
+
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
 from .models import RecyclingPlant, DashboardSettings, University, ProductionData, ResearchProject
 
-class UniversitySerializer(serializers.ModelSerializer):
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Sérialiseur à champs clairsemés, piloté par la requête :
+
+    - ``?fields=a,b`` ne conserve que les champs demandés (lectures seulement) ;
+    - les champs de ``Meta.expandable_fields`` ne sont inclus qu'avec ``?expand=``.
+
+    Seul le sérialiseur racine (ou l'enfant d'une liste racine) est concerné ;
+    les sérialiseurs imbriqués gardent tous leurs champs.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self.is_top_level():
+            return fields
+
+        expand = parse_field_list(request.query_params.get('expand'))
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+
+        requested = parse_field_list(request.query_params.get('fields'))
+        if requested and request.method in SAFE_METHODS:
+            for name in list(fields):
+                if name not in requested and name not in expand:
+                    fields.pop(name)
+        return fields
+
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_source_columns(self):
+        """
+        Colonnes du modèle lues par les champs retenus, pour ``QuerySet.only()``.
+        Retourne None si une source est inconnue (propriété, méthode non déclarée
+        dans ``Meta.method_field_sources``) : rien ne doit alors être différé.
+        """
+        opts = self.Meta.model._meta
+        declared = getattr(self.Meta, 'method_field_sources', {})
+        columns = {opts.pk.name}
+        for name, field in self.fields.items():
+            if field.source == '*':
+                if name not in declared:
+                    return None
+                columns.update(declared[name])
+                continue
+            try:
+                model_field = opts.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                return None
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+        return columns
+
+
+class UniversitySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = University
         fields = '__all__'
 
-class RecyclingPlantSerializer(serializers.ModelSerializer):
+class RecyclingPlantSerializer(DynamicFieldsModelSerializer):
     university_name = serializers.CharField(source='university.name', read_only=True)
     
     class Meta:
@@ -18,7 +85,7 @@ class RecyclingPlantSerializer(serializers.ModelSerializer):
             'opening_date', 'description'
         ]
 
-class ProductionDataSerializer(serializers.ModelSerializer):
+class ProductionDataSerializer(DynamicFieldsModelSerializer):
     plant_name = serializers.CharField(source='plant.name', read_only=True)
     
     class Meta:
@@ -29,7 +96,60 @@ class ProductionDataSerializer(serializers.ModelSerializer):
             'notes'
         ]
 
-class ResearchProjectSerializer(serializers.ModelSerializer):
+class ProductionDataBulkSerializer(serializers.Serializer):
+    """
+    Validation d'une ligne d'import en masse. Volontairement sans relation ni
+    validateur d'unicité : l'existence des installations est vérifiée en une
+    seule requête par la vue et les doublons (plant, date) sont mis à jour.
+    """
+    plant = serializers.IntegerField()
+    date = serializers.DateField()
+    production_amount = serializers.FloatField(min_value=0)
+    recycling_rate = serializers.FloatField(min_value=0, max_value=100)
+    waste_amount = serializers.FloatField(min_value=0)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def run_validation(self, data=serializers.empty):
+        """
+        Chemin rapide pour les lignes bien formées (types JSON natifs, bornes
+        respectées) : la validation complète de DRF coûte plus que l'écriture
+        elle-même sur un import de plusieurs milliers de lignes. Toute autre
+        ligne passe par la validation complète, qui produit les messages
+        d'erreur habituels.
+        """
+        row = _plain_bulk_row(data)
+        return super().run_validation(data) if row is None else row
+
+
+def _plain_number(value):
+    # bool est un int : refusé ici, laissé à la validation complète
+    return type(value) in (int, float) and math.isfinite(value)
+
+
+def _plain_bulk_row(data):
+    """Ligne validée sans passer par les champs DRF, ou None si un contrôle échoue"""
+    if not isinstance(data, dict):
+        return None
+    plant, date, notes = data.get('plant'), data.get('date'), data.get('notes', '')
+    production_amount, recycling_rate, waste_amount = (
+        data.get('production_amount'), data.get('recycling_rate'), data.get('waste_amount')
+    )
+    if type(plant) is not int or type(date) is not str or len(date) != 10 or type(notes) is not str:
+        return None
+    if not (_plain_number(production_amount) and _plain_number(recycling_rate) and _plain_number(waste_amount)):
+        return None
+    if production_amount < 0 or waste_amount < 0 or not 0 <= recycling_rate <= 100:
+        return None
+    try:
+        date = datetime.date.fromisoformat(date)
+    except ValueError:
+        return None
+    return {
+        'plant': plant, 'date': date, 'production_amount': float(production_amount),
+        'recycling_rate': float(recycling_rate), 'waste_amount': float(waste_amount), 'notes': notes.strip(),
+    }
+
+class ResearchProjectSerializer(DynamicFieldsModelSerializer):
     universities_details = UniversitySerializer(source='universities', many=True, read_only=True)
     plants_details = RecyclingPlantSerializer(source='plants', many=True, read_only=True)
     
@@ -42,9 +162,10 @@ class ResearchProjectSerializer(serializers.ModelSerializer):
         ]
 
 # Serializers spécifiques pour le dashboard avec des données agrégées
-class PlantSummarySerializer(serializers.ModelSerializer):
-    current_production = serializers.SerializerMethodField()
-    recycling_rate = serializers.SerializerMethodField()
+class PlantSummarySerializer(DynamicFieldsModelSerializer):
+    # Lus depuis l'instantané maintenu par recycling_plants.snapshots
+    current_production = serializers.FloatField(source='latest_production_amount', read_only=True)
+    recycling_rate = serializers.FloatField(source='latest_recycling_rate', read_only=True)
     university_name = serializers.CharField(source='university.name', read_only=True)
     
     class Meta:
@@ -54,18 +175,8 @@ class PlantSummarySerializer(serializers.ModelSerializer):
             'latitude', 'longitude', 'active', 
             'current_production', 'recycling_rate'
         ]
-    
-    def get_current_production(self, obj):
-        """Récupère la production la plus récente"""
-        latest_data = obj.production_data.order_by('-date').first()
-        return latest_data.production_amount if latest_data else 0
-    
-    def get_recycling_rate(self, obj):
-        """Récupère le taux de recyclage le plus récent"""
-        latest_data = obj.production_data.order_by('-date').first()
-        return latest_data.recycling_rate if latest_data else 0
 
-class ProductionHistorySerializer(serializers.ModelSerializer):
+class ProductionHistorySerializer(DynamicFieldsModelSerializer):
     """Serializer pour les données historiques de production"""
     plant_name = serializers.CharField(source='plant.name')
     month = serializers.SerializerMethodField()
@@ -73,6 +184,7 @@ class ProductionHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductionData
         fields = ['plant_name', 'plant', 'month', 'production_amount', 'recycling_rate']
+        method_field_sources = {'month': ['date']}
     
     def get_month(self, obj):
         return obj.date.strftime('%Y-%m')
@@ -85,10 +197,15 @@ class RecyclingPlantCreateUpdateSerializer(serializers.ModelSerializer):
             'status', 'production', 'processing', 'notes', 'website'
         ]
 
-class DashboardSettingsSerializer(serializers.ModelSerializer):
+class DashboardSettingsSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = DashboardSettings
-        fields = '__all__'
+        exclude = ['singleton']
+
+    def validate(self, attrs):
+        if self.instance is None and DashboardSettings.objects.exists():
+            raise serializers.ValidationError("Les paramètres existent déjà : modifiez-les plutôt que d'en créer")
+        return attrs
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
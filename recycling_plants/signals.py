@@ -0,0 +1,149 @@
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate, m2m_changed
+from django.dispatch import receiver
+
+from dashboard_common.cache import bump_data_version, publish_settings_version
+from dashboard_common.spatial import ensure_spatial_index
+from dashboard_common.tiles import tile_point
+
+from . import rollups
+from .events import LOGGED_MODELS, record_change
+from .models import DashboardSettings, ProductionData, RecyclingPlant, ResearchProject
+from .snapshots import refresh_latest_production
+from .tiles import plant_layer
+
+
+@receiver(post_save, sender=ProductionData)
+@receiver(post_delete, sender=ProductionData)
+def update_latest_production(sender, instance, signal, **kwargs):
+    """
+    Maintient l'instantané de l'installation à chaque écriture (API, admin,
+    save()), et celui de l'ancienne installation si la donnée a changé d'installation
+    """
+    plant_ids = {instance.plant_id}
+    previous = getattr(instance, '_previous_reading', None) if signal is post_save else None
+    if previous:
+        plant_ids.add(previous['plant_id'])
+    refresh_latest_production(plant_ids)
+
+
+@receiver(pre_save, sender=ProductionData)
+def remember_previous_reading(sender, instance, raw=False, **kwargs):
+    """
+    Conserve les valeurs avant modification, pour les retirer des agrégats
+    mensuels et rafraîchir l'instantané de l'ancienne installation
+    """
+    instance._previous_reading = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_reading = ProductionData.objects.filter(pk=instance.pk).values(
+        'plant_id', 'date', *rollups.METRICS
+    ).first()
+
+
+@receiver(post_save, sender=ProductionData)
+def update_monthly_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_reading', None)
+    if previous:
+        rollups.replace_reading(previous, instance)
+    else:
+        rollups.add_reading(instance)
+
+
+@receiver(post_delete, sender=ProductionData)
+def update_monthly_rollup_on_delete(sender, instance, **kwargs):
+    rollups.remove_reading(
+        instance.plant_id, instance.date,
+        {metric: getattr(instance, metric) for metric in rollups.METRICS},
+    )
+
+
+@receiver(pre_save, sender=RecyclingPlant)
+def remember_tile_fields(sender, instance, raw=False, **kwargs):
+    """Conserve la position et les attributs de la couche avant modification"""
+    instance._tile_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._tile_previous = RecyclingPlant.objects.filter(pk=instance.pk).values(*plant_layer.fields).first()
+
+
+@receiver(post_save, sender=RecyclingPlant)
+def invalidate_tiles_on_save(sender, instance, raw=False, **kwargs):
+    """N'invalide que les tuiles de l'ancienne et de la nouvelle position, et seulement si la couche change"""
+    if raw:
+        return
+    previous = getattr(instance, '_tile_previous', None)
+    current = plant_layer.values(instance)
+    if previous != current:
+        plant_layer.invalidate_points([tile_point(previous), tile_point(current)])
+
+
+@receiver(post_delete, sender=RecyclingPlant)
+def invalidate_tiles_on_delete(sender, instance, **kwargs):
+    plant_layer.invalidate_points([tile_point(plant_layer.values(instance))])
+
+
+@receiver(post_save)
+def log_change_on_save(sender, instance, created, raw=False, **kwargs):
+    """Journalise l'écriture (flux SSE, synchronisation), dans la même transaction"""
+    if raw or sender not in LOGGED_MODELS:
+        return
+    record_change(instance, 'create' if created else 'update')
+
+
+@receiver(post_delete)
+def log_change_on_delete(sender, instance, **kwargs):
+    if sender in LOGGED_MODELS:
+        record_change(instance, 'delete')
+
+
+@receiver(m2m_changed, sender=ResearchProject.universities.through)
+@receiver(m2m_changed, sender=ResearchProject.plants.through)
+def log_m2m_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Un changement de participants modifie le projet : journalise son nouvel
+    état, y compris depuis le côté inverse (``plant.research_projects.add()``)
+    """
+    if not reverse:
+        if action.startswith('post_'):
+            record_change(instance, 'update')
+        return
+    if action == 'pre_clear':
+        # pk_set n'est pas fourni pour clear() : relever les projets avant
+        field = next(f for f in ResearchProject._meta.many_to_many if f.remote_field.through is sender)
+        instance._m2m_cleared_projects = list(ResearchProject.objects.filter(**{field.name: instance}))
+    elif action == 'post_clear':
+        for project in getattr(instance, '_m2m_cleared_projects', []):
+            record_change(project, 'update')
+    elif action in ('post_add', 'post_remove'):
+        for project in ResearchProject.objects.filter(pk__in=pk_set):
+            record_change(project, 'update')
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, raw=False, **kwargs):
+    """Invalide les réponses en cache qui dépendent du modèle modifié"""
+    if sender._meta.app_label == 'recycling_plants':
+        bump_data_version(sender)
+
+
+@receiver(m2m_changed)
+def bump_m2m_version(sender, instance, action, **kwargs):
+    if action.startswith('post_') and sender._meta.app_label == 'recycling_plants':
+        bump_data_version(type(instance), kwargs['model'])
+
+
+@receiver(post_save, sender=DashboardSettings)
+def publish_settings_version_on_save(sender, instance, raw=False, **kwargs):
+    """Une version modifiée depuis l'API ou l'admin sert aussi de clé d'invalidation globale"""
+    if not raw:
+        publish_settings_version(instance.version)
+
+
+@receiver(post_migrate)
+def create_spatial_index(sender, using, **kwargs):
+    """(Re)crée l'index R*Tree et ses triggers, perdus si une migration a reconstruit la table"""
+    if sender.name == 'recycling_plants':
+        ensure_spatial_index(using)
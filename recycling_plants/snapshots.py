@@ -0,0 +1,46 @@
+"""Maintenance de l'instantané « dernière production » des installations.
+
+Les colonnes ``latest_*`` de ``RecyclingPlant`` recopient la donnée de
+production la plus récente de chaque installation, afin que le résumé du
+dashboard se lise en un seul parcours de la table des installations. Les
+installations dont l'instantané change sont journalisées (ChangeEvent), pour
+que le flux SSE et la synchronisation incrémentale les renvoient aussi.
+"""
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from dashboard_common.cache import bump_data_version
+
+from .events import record_changes
+from .models import RecyclingPlant, ProductionData
+
+SNAPSHOT_FIELDS = ('latest_production_date', 'latest_production_amount', 'latest_recycling_rate')
+
+
+def refresh_latest_production(plant_ids=None):
+    """
+    Recalcule l'instantané des installations données (toutes si ``plant_ids``
+    vaut None) en une seule requête UPDATE, et journalise celles dont
+    l'instantané a changé. Retourne le nombre d'installations mises à jour.
+
+    À appeler après toute écriture qui contourne les signaux (bulk_create,
+    bulk_update, QuerySet.update, chargements SQL directs).
+    """
+    latest = ProductionData.objects.filter(plant=OuterRef('pk')).order_by('-date')
+    plants = RecyclingPlant.objects.all()
+    if plant_ids is not None:
+        plants = plants.filter(pk__in=list(plant_ids))
+    before = {pk: tuple(values) for pk, *values in plants.values_list('pk', *SNAPSHOT_FIELDS)}
+    bump_data_version(RecyclingPlant)
+    updated = plants.update(
+        latest_production_date=Subquery(latest.values('date')[:1]),
+        latest_production_amount=Coalesce(Subquery(latest.values('production_amount')[:1]), Value(0.0)),
+        latest_recycling_rate=Coalesce(Subquery(latest.values('recycling_rate')[:1]), Value(0.0)),
+    )
+    # update() n'émet aucun signal : journal explicite des instantanés modifiés
+    columns = [field.attname for field in RecyclingPlant._meta.concrete_fields]
+    record_changes(RecyclingPlant, 'update', [
+        (row['id'], row) for row in plants.values(*columns)
+        if tuple(row[field] for field in SNAPSHOT_FIELDS) != before.get(row['id'])
+    ])
+    return updated
@@ -1,3 +1,1106 @@
-from django.test import TestCase
+import asyncio
+import base64
+import datetime
+import gzip
+import json
+import struct
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.core.cache import caches
+from django.test import TestCase as DjangoTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.pagination import PageNumberPagination
+
+from dashboard_common import clusters, dashboard_settings, spatial, tiles
+from dashboard_common.pagination import KeysetPagination
+
+from . import events
+from .ingest import upsert_production_data
+from .models import ChangeEvent, DashboardSettings, RecyclingPlant, ProductionData, ProductionMonthlyRollup, ResearchProject, University
+from .serializers import ProductionDataBulkSerializer
+from .tiles import plant_layer
+
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-responses'},
+    'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-versions'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TestCase(DjangoTestCase):
+    """
+    Utilise des caches mémoire, vidés entre les tests : l'annulation de la
+    transaction de test ne renouvelle pas les versions, et le cache fichiers
+    ``versions`` des settings ne doit pas être touché
+    """
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+
+
+def create_plant(name, **kwargs):
+    return RecyclingPlant.objects.create(name=name, **kwargs)
+
+
+def create_production(plant, date, amount=100, rate=50, waste=10):
+    return ProductionData.objects.create(
+        plant=plant, date=date, production_amount=amount,
+        recycling_rate=rate, waste_amount=waste,
+    )
+
+
+class ProductionHistoryViewTests(TestCase):
+    url = reverse('production-history')
+
+    def create_history(self, plant_count):
+        for i in range(plant_count):
+            plant = create_plant(f"Installation {i}")
+            for month in range(1, 4):
+                create_production(plant, datetime.date(2024, month, 1), amount=1)
+                create_production(plant, datetime.date(2024, month, 15), amount=2)
+
+    def test_returns_latest_record_per_plant_and_month(self):
+        plant = create_plant("Installation A")
+        create_production(plant, datetime.date(2024, 1, 5), amount=10)
+        create_production(plant, datetime.date(2024, 1, 20), amount=20, rate=70)
+        create_production(plant, datetime.date(2024, 2, 3), amount=30)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results']
+        self.assertEqual(
+            [(row['month'], row['production_amount'], row['plant_name']) for row in rows],
+            [('2024-01', 20, "Installation A"), ('2024-02', 30, "Installation A")],
+        )
+        self.assertEqual(rows[0]['recycling_rate'], 70)
+
+    def test_filters_by_plant(self):
+        self.create_history(2)
+        plant = RecyclingPlant.objects.first()
+
+        response = self.client.get(self.url, {'plant': plant.pk})
+
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertTrue(all(row['plant'] == plant.pk for row in response.data['results']))
+
+    def test_query_count_does_not_depend_on_plant_count(self):
+        self.create_history(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+
+        self.create_history(10)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url)
+
+        self.assertEqual(len(small), len(large))
+        response = self.client.get(self.url, {'pagination': 'page'})
+        self.assertEqual(response.data['count'], 36)
+
+
+class LatestProductionSnapshotTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.plant = create_plant("Installation A")
+
+    def test_snapshot_follows_writes(self):
+        old = create_production(self.plant, datetime.date(2024, 1, 1), amount=10, rate=40)
+        latest = create_production(self.plant, datetime.date(2024, 2, 1), amount=20, rate=60)
+        self.plant.refresh_from_db()
+        self.assertEqual(self.plant.latest_production_date, datetime.date(2024, 2, 1))
+        self.assertEqual(self.plant.latest_production_amount, 20)
+
+        latest.recycling_rate = 65
+        latest.save()
+        self.plant.refresh_from_db()
+        self.assertEqual(self.plant.latest_recycling_rate, 65)
+
+        latest.delete()
+        self.plant.refresh_from_db()
+        self.assertEqual(self.plant.latest_production_amount, old.production_amount)
+
+        old.delete()
+        self.plant.refresh_from_db()
+        self.assertIsNone(self.plant.latest_production_date)
+        self.assertEqual(self.plant.latest_production_amount, 0)
+
+    def test_snapshot_follows_reassigned_reading(self):
+        other = create_plant("Installation B")
+        create_production(self.plant, datetime.date(2024, 1, 1), amount=10)
+        moved = create_production(self.plant, datetime.date(2024, 2, 1), amount=20)
+
+        moved.plant = other
+        moved.save()
+        self.plant.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.plant.latest_production_date, self.plant.latest_production_amount), (datetime.date(2024, 1, 1), 10))
+        self.assertEqual((other.latest_production_date, other.latest_production_amount), (datetime.date(2024, 2, 1), 20))
+
+    def test_rebuild_command_after_bulk_load(self):
+        ProductionData.objects.bulk_create([
+            ProductionData(plant=self.plant, date=datetime.date(2024, m, 1),
+                           production_amount=m, recycling_rate=m, waste_amount=0)
+            for m in range(1, 4)
+        ])
+        call_command('rebuild_production_snapshot', stdout=StringIO())
+        self.plant.refresh_from_db()
+        self.assertEqual(self.plant.latest_production_amount, 3)
+
+    def test_dashboard_summary_query_count(self):
+        for i in range(5):
+            create_production(create_plant(f"Installation {i}"), datetime.date(2024, 1, 1))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('recyclingplant-dashboard-summary'))
+        production = {row['name']: row['current_production'] for row in response.data}
+        self.assertEqual(len(production), 6)
+        self.assertEqual(production["Installation A"], 0)
+        self.assertEqual(production["Installation 0"], 100)
+
+
+class ProductionMonthlyRollupTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.plant = create_plant("Installation A")
+
+    def assertRollupConsistent(self):
+        call_command('verify_production_rollup', stdout=StringIO())
+
+    def bucket(self, month=1):
+        return ProductionMonthlyRollup.objects.get(plant=self.plant, month=datetime.date(2024, month, 1))
+
+    def test_incremental_insert_update_delete(self):
+        first = create_production(self.plant, datetime.date(2024, 1, 5), amount=10, rate=40, waste=1)
+        second = create_production(self.plant, datetime.date(2024, 1, 20), amount=30, rate=60, waste=3)
+        bucket = self.bucket()
+        self.assertEqual(bucket.count, 2)
+        self.assertEqual(bucket.production_amount_sum, 40)
+        self.assertEqual(bucket.mean('recycling_rate'), 50)
+        self.assertEqual((bucket.waste_amount_min, bucket.waste_amount_max), (1, 3))
+
+        second.production_amount = 5
+        second.save()
+        bucket = self.bucket()
+        self.assertEqual(bucket.production_amount_sum, 15)
+        self.assertEqual((bucket.production_amount_min, bucket.production_amount_max), (5, 10))
+        self.assertRollupConsistent()
+
+        second.date = datetime.date(2024, 2, 1)
+        second.save()
+        self.assertEqual(self.bucket(1).count, 1)
+        self.assertEqual(self.bucket(2).count, 1)
+        self.assertRollupConsistent()
+
+        first.delete()
+        second.delete()
+        self.assertFalse(ProductionMonthlyRollup.objects.exists())
+
+    def test_string_dates(self):
+        reading = create_production(self.plant, '2024-01-05', amount=10)
+        self.assertEqual(self.bucket(1).production_amount_sum, 10)
+
+        reading.date = '2024-02-10'
+        reading.save()
+        self.assertFalse(ProductionMonthlyRollup.objects.filter(month=datetime.date(2024, 1, 1)).exists())
+        self.assertEqual(self.bucket(2).count, 1)
+        self.assertRollupConsistent()
+
+        reading.delete()
+        self.assertFalse(ProductionMonthlyRollup.objects.exists())
+
+    def test_verify_command_detects_and_fixes_drift(self):
+        create_production(self.plant, datetime.date(2024, 1, 5))
+        ProductionMonthlyRollup.objects.update(count=7)
+        with self.assertRaises(CommandError):
+            self.assertRollupConsistent()
+        call_command('verify_production_rollup', fix=True, stdout=StringIO())
+        self.assertEqual(self.bucket().count, 1)
+        self.assertRollupConsistent()
+
+    def test_aggregate_endpoint_scopes(self):
+        university = University.objects.create(name="Université Laval", short_name="UL", country="Canada")
+        other = create_plant("Installation B", university=university)
+        self.plant.university = university
+        self.plant.save()
+        create_production(self.plant, datetime.date(2024, 1, 5), amount=10)
+        create_production(other, datetime.date(2024, 1, 5), amount=30)
+        create_production(other, datetime.date(2024, 2, 5), amount=50)
+        url = reverse('production-aggregates')
+
+        response = self.client.get(url)
+        self.assertEqual([row['month'] for row in response.data], ['2024-01', '2024-02'])
+        self.assertEqual(response.data[0]['production_amount'],
+                         {'sum': 40, 'mean': 20, 'min': 10, 'max': 30})
+
+        response = self.client.get(url, {'scope': 'plant', 'start': '2024-02'})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['plant'], other.pk)
+
+        response = self.client.get(url, {'scope': 'university'})
+        self.assertEqual({row['university'] for row in response.data}, {university.pk})
+
+        self.assertEqual(self.client.get(url, {'scope': 'country'}).status_code, 400)
+
+
+class ProductionDataBulkTests(TestCase):
+    url = reverse('productiondata-bulk')
+
+    def setUp(self):
+        super().setUp()
+        self.plant = create_plant("Installation A")
+
+    def row(self, day, **overrides):
+        row = {'plant': self.plant.pk, 'date': f'2024-01-{day:02d}', 'production_amount': 10,
+               'recycling_rate': 50, 'waste_amount': 1}
+        row.update(overrides)
+        return row
+
+    def test_upserts_json_array_and_reports_row_errors(self):
+        create_production(self.plant, datetime.date(2024, 1, 1), amount=1)
+        rows = [
+            self.row(1, production_amount=99),
+            self.row(2),
+            self.row(3, recycling_rate=150),
+            self.row(4, plant=self.plant.pk + 100),
+        ]
+
+        response = self.client.post(self.url, rows, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3])
+        self.assertIn('recycling_rate', response.data['errors'][0]['errors'])
+        self.assertEqual(ProductionData.objects.get(date=datetime.date(2024, 1, 1)).production_amount, 99)
+        self.plant.refresh_from_db()
+        self.assertEqual(self.plant.latest_production_date, datetime.date(2024, 1, 2))
+        call_command('verify_production_rollup', stdout=StringIO())
+
+    def test_accepts_ndjson(self):
+        body = '\n'.join(json.dumps(self.row(day)) for day in range(1, 11)) + '\n'
+
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.data['created'], 10)
+        self.assertEqual(ProductionMonthlyRollup.objects.get().count, 10)
+
+    def test_fast_validation_matches_full_validation(self):
+        validator = ProductionDataBulkSerializer()
+        row = self.row(5, notes=' relevé ')
+        full = serializers.Serializer.run_validation(validator, row)
+        self.assertEqual(validator.run_validation(row), dict(full))
+        # Hors du chemin rapide : nombres en texte acceptés, booléens refusés comme avant
+        self.assertEqual(validator.run_validation(self.row(5, production_amount='12.5'))['production_amount'], 12.5)
+        for overrides in ({'plant': True}, {'recycling_rate': 100.5}, {'date': '2024-13-01'}, {'notes': None}):
+            with self.subTest(overrides=overrides), self.assertRaises(serializers.ValidationError):
+                validator.run_validation(self.row(5, **overrides))
+
+    def test_rejects_non_list_body(self):
+        response = self.client.post(self.url, self.row(1), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductionDataExportTests(TestCase):
+    url = reverse('productiondata-export')
+
+    def setUp(self):
+        super().setUp()
+        self.plant = create_plant("Installation A")
+        other = create_plant("Installation B")
+        for month in range(1, 4):
+            create_production(self.plant, datetime.date(2024, month, 1), amount=month)
+            create_production(other, datetime.date(2024, month, 1))
+
+    def test_streams_ndjson_with_filters(self):
+        response = self.client.get(self.url, {'plant': self.plant.pk, 'ordering': 'date'})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['production_amount'] for row in rows], [1, 2, 3])
+        self.assertEqual(rows[0]['plant_name'], "Installation A")
+        self.assertEqual(rows[0]['date'], '2024-01-01')
+
+    def test_streams_csv(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'plant', 'plant_name', 'date'])
+        self.assertEqual(len(lines), 7)
+
+    def test_streams_json_array_to_json_clients(self):
+        response = self.client.get(self.url, {'plant': self.plant.pk}, HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(sorted(row['production_amount'] for row in rows), [1, 2, 3])
+        empty = self.client.get(self.url, {'plant': create_plant("Installation C").pk, 'format': 'json'})
+        self.assertEqual(json.loads(b''.join(empty.streaming_content)), [])
+
+
+class KeysetPaginationTests(TestCase):
+    url = reverse('recyclingplant-list')
+
+    def setUp(self):
+        super().setUp()
+        # Capacités et dates en doublon ou nulles pour éprouver le départage par id
+        for i in range(12):
+            create_plant(
+                f"Installation {i:02d}", capacity=(i % 3) * 100,
+                opening_date=datetime.date(2020, 1, 1 + i % 4) if i % 5 else None,
+            )
+
+    def walk(self, params, direction='next'):
+        pages, response = [], self.client.get(self.url, params)
+        while True:
+            pages.append([row['id'] for row in response.data['results']])
+            link = response.data[direction]
+            if not link:
+                return pages, response
+            response = self.client.get(link)
+
+    def expected_ids(self, *ordering):
+        return list(RecyclingPlant.objects.order_by(*ordering).values_list('id', flat=True))
+
+    @mock.patch.object(KeysetPagination, 'page_size', 5)
+    @mock.patch.object(PageNumberPagination, 'page_size', 5)
+    def test_walks_all_rows_once_for_each_ordering(self):
+        for ordering, expected in [
+            (None, self.expected_ids('name', 'id')),
+            ('-capacity', self.expected_ids('-capacity', '-id')),
+            ('opening_date', self.expected_ids(F('opening_date').asc(nulls_last=True), 'id')),
+            ('-opening_date', self.expected_ids(F('opening_date').desc(nulls_first=True), '-id')),
+        ]:
+            with self.subTest(ordering=ordering):
+                params = {'ordering': ordering} if ordering else {}
+                pages, last = self.walk(params)
+                self.assertEqual([len(page) for page in pages], [5, 5, 2])
+                self.assertEqual(sum(pages, []), expected)
+
+                pages, _ = self.walk_back(last)
+                self.assertEqual(sum(reversed(pages), []), expected[:10])
+
+    def walk_back(self, response):
+        pages = []
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            pages.append([row['id'] for row in response.data['results']])
+        return pages, response
+
+    @mock.patch.object(KeysetPagination, 'page_size', 5)
+    @mock.patch.object(PageNumberPagination, 'page_size', 5)
+    def test_page_numbers_on_request(self):
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'invalide'}).status_code, 404)
+
+    def test_tampered_cursor(self):
+        for ordering, position in [
+            (None, 'ab'),
+            ('capacity', ['abc', 1]),
+            ('opening_date', ['hier', 1]),
+            ('capacity', [{'a': 1}, 1]),
+        ]:
+            with self.subTest(ordering=ordering, position=position):
+                cursor = base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+                params = {'cursor': cursor, **({'ordering': ordering} if ordering else {})}
+                self.assertEqual(self.client.get(self.url, params).status_code, 404)
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.university = University.objects.create(name="Université Laval", short_name="UL", country="Canada")
+        self.plant = create_plant("Installation A", university=self.university, description="x" * 1000)
+
+    def test_fields_prunes_output_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('recyclingplant-list'), {'fields': 'id,name,latitude,longitude'})
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'latitude', 'longitude'})
+        self.assertNotIn('description', queries[0]['sql'])
+
+    def test_detail_and_default_output_unchanged(self):
+        response = self.client.get(reverse('recyclingplant-detail', args=[self.plant.pk]))
+        self.assertEqual(response.data['university_name'], "Université Laval")
+        self.assertEqual(len(response.data['description']), 1000)
+
+    def test_nested_details_by_default_prunable_by_fields(self):
+        project = ResearchProject.objects.create(
+            title="Projet", description="...", start_date=datetime.date(2024, 1, 1))
+        project.universities.add(self.university)
+        project.plants.add(self.plant)
+        url = reverse('researchproject-detail', args=[project.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['universities_details'][0]['name'], "Université Laval")
+        self.assertIn('description', response.data['plants_details'][0])
+
+        self.assertEqual(set(self.client.get(url, {'fields': 'id,title'}).data), {'id', 'title'})
+        response = self.client.get(url, {'fields': 'id,title,plants_details'})
+        self.assertEqual(set(response.data), {'id', 'title', 'plants_details'})
+
+
+class ListQueryCountTests(TestCase):
+    """Chaque liste doit s'exécuter en O(1) requêtes, quel que soit le nombre de lignes"""
+    endpoints = [
+        (reverse('university-list'), {}),
+        (reverse('recyclingplant-list'), {}),
+        (reverse('recyclingplant-dashboard-summary'), {}),
+        (reverse('productiondata-list'), {}),
+        (reverse('researchproject-list'), {}),
+        (reverse('researchproject-list'), {'fields': 'id,title,plants'}),
+        (reverse('production-history'), {}),
+    ]
+
+    def populate(self, count):
+        for i in range(count):
+            university = University.objects.create(name=f"Université {i}", short_name=f"U{i}", country="Canada")
+            plant = create_plant(f"Installation {i}", university=university)
+            create_production(plant, datetime.date(2024, 1, 1))
+            project = ResearchProject.objects.create(
+                title=f"Projet {i}", description="...", start_date=datetime.date(2024, 1, 1))
+            project.universities.add(university)
+            project.plants.add(plant)
+
+    def count_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_endpoints_run_constant_queries(self):
+        self.populate(2)
+        small = [self.count_queries(url, params) for url, params in self.endpoints]
+        self.populate(8)
+        large = [self.count_queries(url, params) for url, params in self.endpoints]
+
+        for (url, params), before, after in zip(self.endpoints, small, large):
+            with self.subTest(url=url, params=params):
+                self.assertEqual(before, after)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.plant = create_plant("Installation A")
+        create_production(self.plant, datetime.date(2024, 1, 1), amount=10)
+
+    def test_hits_skip_the_database_and_writes_invalidate(self):
+        url = reverse('recyclingplant-dashboard-summary')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data[0]['current_production'], 10)
+
+        create_production(self.plant, datetime.date(2024, 2, 1), amount=20)
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]['current_production'], 20)
+
+    def test_query_params_are_part_of_the_key(self):
+        other = create_plant("Installation B")
+        create_production(other, datetime.date(2024, 1, 1))
+        url = reverse('production-history')
+
+        self.client.get(url, {'plant': self.plant.pk})
+        with self.assertNumQueries(0):
+            self.client.get(url, {'plant': self.plant.pk})
+        response = self.client.get(url, {'plant': other.pk})
+        self.assertEqual([row['plant'] for row in response.data['results']], [other.pk])
+
+    def test_bulk_writes_invalidate(self):
+        url = reverse('production-aggregates')
+        self.client.get(url)
+        self.client.post(reverse('productiondata-bulk'), [
+            {'plant': self.plant.pk, 'date': '2024-01-01', 'production_amount': 99,
+             'recycling_rate': 50, 'waste_amount': 1},
+        ], content_type='application/json')
+        self.assertEqual(self.client.get(url).data[0]['production_amount']['sum'], 99)
+
+
+class ConditionalGetTests(TestCase):
+    url = reverse('recyclingplant-list')
+
+    def setUp(self):
+        super().setUp()
+        self.plant = create_plant("Installation A")
+
+    def test_matching_etag_returns_304_without_queries(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_changes_with_data_and_query(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertNotEqual(self.client.get(self.url, {'ordering': 'capacity'})['ETag'], etag)
+
+        University.objects.create(name="Université Laval", short_name="UL", country="Canada")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+class ChangeEventTests(TestCase):
+    url = reverse('change-events')
+
+    def logged(self, **filters):
+        return list(ChangeEvent.objects.filter(**filters).values_list('model', 'action', 'object_id'))
+
+    def test_writes_are_logged(self):
+        plant = create_plant("Installation A")
+        plant.capacity = 2000
+        plant.save()
+        reading = create_production(plant, datetime.date(2024, 1, 1))
+        plant_id, reading_id = plant.pk, reading.pk
+        plant.delete()
+
+        # Chaque relevé ajouté ou retiré modifie aussi l'instantané de l'installation
+        self.assertEqual(self.logged(), [
+            ('recycling_plants.recyclingplant', 'create', plant_id),
+            ('recycling_plants.recyclingplant', 'update', plant_id),
+            ('recycling_plants.recyclingplant', 'update', plant_id),
+            ('recycling_plants.productiondata', 'create', reading_id),
+            ('recycling_plants.recyclingplant', 'update', plant_id),
+            ('recycling_plants.productiondata', 'delete', reading_id),
+            ('recycling_plants.recyclingplant', 'delete', plant_id),
+        ])
+        self.assertEqual(ChangeEvent.objects.all()[1].data['capacity'], 2000)
+        self.assertEqual(ChangeEvent.objects.all()[2].data['latest_production_amount'], 100)
+
+    def test_bulk_ingest_is_logged(self):
+        plant = create_plant("Installation A")
+        existing = create_production(plant, datetime.date(2024, 1, 1))
+        ChangeEvent.objects.all().delete()
+        row = {'plant': plant.pk, 'production_amount': 5, 'recycling_rate': 50, 'waste_amount': 1}
+
+        upsert_production_data([
+            dict(row, date=datetime.date(2024, 1, 1)), dict(row, date=datetime.date(2024, 2, 1)),
+        ])
+
+        created = ProductionData.objects.get(date=datetime.date(2024, 2, 1))
+        self.assertEqual(sorted(self.logged()), [
+            ('recycling_plants.productiondata', 'create', created.pk),
+            ('recycling_plants.productiondata', 'update', existing.pk),
+            ('recycling_plants.recyclingplant', 'update', plant.pk),
+        ])
+        self.assertEqual(ChangeEvent.objects.get(model='recycling_plants.recyclingplant').data['latest_production_date'], '2024-02-01')
+        # Valeurs écrites, sans relecture de la table
+        data = ChangeEvent.objects.get(action='create').data
+        self.assertEqual(data, {
+            'id': created.pk, 'plant_id': plant.pk, 'date': '2024-02-01', 'production_amount': 5,
+            'recycling_rate': 50, 'waste_amount': 1, 'notes': '',
+        })
+
+    async def read(self, response):
+        chunk = await asyncio.wait_for(anext(aiter(response.streaming_content)), 5)
+        return chunk.decode()
+
+    async def close(self, response):
+        await response.streaming_content.aclose()
+        if events.feed.task is not None:
+            events.feed.task.cancel()
+
+    async def test_stream_resumes_after_last_event_id(self):
+        first = await sync_to_async(create_plant)("Installation A")
+        second = await sync_to_async(create_plant)("Installation B")
+        first_event = await ChangeEvent.objects.aget(object_id=first.pk)
+
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': str(first_event.id)})
+        try:
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertTrue((await self.read(response)).startswith('retry:'))
+            message = await self.read(response)
+            self.assertTrue(message.startswith(f'id: {first_event.id + 1}\n'))
+            payload = json.loads(message.split('data: ', 1)[1])
+            self.assertEqual((payload['action'], payload['object_id']), ('create', second.pk))
+        finally:
+            await self.close(response)
+
+    @mock.patch('dashboard_common.events.POLL_INTERVAL', 0.01)
+    async def test_stream_delivers_new_events(self):
+        response = await self.async_client.get(self.url, {'models': 'recyclingplant'})
+        try:
+            await self.read(response)
+            await sync_to_async(create_plant)("Installation A")
+            payload = json.loads((await self.read(response)).split('data: ', 1)[1])
+            self.assertEqual((payload['model'], payload['data']['name']), ('recycling_plants.recyclingplant', "Installation A"))
+        finally:
+            await self.close(response)
+
+    def test_invalid_last_event_id(self):
+        response = self.client.get(self.url, HTTP_LAST_EVENT_ID='abc')
+        self.assertEqual(response.status_code, 400)
+
+
+class SyncTests(TestCase):
+    url = reverse('sync')
+
+    def sync(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_compacted_changes_since_token(self):
+        kept = create_plant("Installation A")
+        token = self.sync()['token']
+        kept.capacity = 2000
+        kept.save()
+        kept.capacity = 3000
+        kept.save()
+        removed = create_plant("Installation B")
+        removed_id = removed.pk
+        removed.delete()
+
+        data = self.sync(since=token)
+
+        plants = data['changes']['recyclingplant']
+        self.assertEqual([(row['id'], row['capacity']) for row in plants['upserted']], [(kept.pk, 3000)])
+        self.assertEqual(plants['deleted'], [removed_id])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.sync(since=data['token'])['changes'], {})
+
+    def test_production_refreshes_synced_plant_snapshot(self):
+        plant = create_plant("Installation A")
+        token = self.sync()['token']
+        create_production(plant, datetime.date(2024, 1, 1), amount=250)
+
+        plants = self.sync(since=token)['changes']['recyclingplant']['upserted']
+        self.assertEqual([(row['id'], row['latest_production_amount']) for row in plants], [(plant.pk, 250)])
+
+        token = self.sync()['token']
+        call_command('rebuild_production_snapshot', stdout=StringIO())
+        self.assertNotIn('recyclingplant', self.sync(since=token)['changes'])
+
+    def test_reads_only_new_events(self):
+        for index in range(20):
+            create_plant(f"Installation {index}")
+        token = self.sync()['token']
+        create_plant("Nouvelle installation")
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.sync(since=token)
+
+        self.assertEqual(len(data['changes']['recyclingplant']['upserted']), 1)
+        self.assertLessEqual(len(queries), 3)
+
+    def test_batches_with_has_more(self):
+        token = self.sync()['token']
+        plants = [create_plant(f"Installation {index}") for index in range(3)]
+
+        first = self.sync(since=token, limit=2)
+        second = self.sync(since=first['token'], limit=2)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        synced = first['changes']['recyclingplant']['upserted'] + second['changes']['recyclingplant']['upserted']
+        self.assertEqual([row['id'] for row in synced], [plant.pk for plant in plants])
+
+    def test_research_project_participants_are_synced(self):
+        university = University.objects.create(name="Université Laval", short_name="UL", country="Canada")
+        project = ResearchProject.objects.create(
+            title="Projet", description="", start_date=datetime.date(2024, 1, 1),
+        )
+        token = self.sync()['token']
+        university.research_projects.add(project)
+
+        data = self.sync(since=token, models='researchproject')
+
+        self.assertEqual(data['changes']['researchproject']['upserted'][0]['universities'], [university.pk])
+        self.assertNotIn('university', data['changes'])
+
+    def test_pruned_token_is_gone(self):
+        create_plant("Installation A")
+        token = self.sync()['token']
+        create_plant("Installation B")
+        create_plant("Installation C")
+        ChangeEvent.objects.filter(id__lte=int(token) + 1).delete()
+
+        response = self.client.get(self.url, {'since': token})
+
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['token'], str(ChangeEvent.objects.last().id))
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'abc'}).status_code, 400)
+
+
+class DashboardSettingsTests(TestCase):
+    current_url = reverse('dashboardsettings-current')
+    increment_url = reverse('dashboardsettings-increment-version')
+
+    def test_current_creates_defaults_once_then_serves_from_memory(self):
+        first = self.client.get(self.current_url).json()
+        self.client.get(self.current_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.current_url).json()
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['status_colors']['operational'], "#4CAF50")
+        self.assertNotIn('singleton', first)
+        self.assertEqual(DashboardSettings.objects.count(), 1)
+
+    def test_writes_invalidate_cached_settings(self):
+        self.client.get(self.current_url)
+        DashboardSettings.objects.update(version='1')
+        DashboardSettings.objects.get().save()
+
+        self.assertEqual(self.client.get(self.current_url).json()['version'], '1')
+
+    def test_second_row_is_rejected(self):
+        self.client.get(self.current_url)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+
+        response = self.client.post(reverse('dashboardsettings-list'), {
+            'version': '2', 'status_colors': {}, 'chart_colors': [],
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DashboardSettings.objects.create(version='2')
+
+    def test_increment_version(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.post(self.increment_url).status_code, 404)
+        today = self.client.get(self.current_url).json()['version']
+
+        self.assertEqual(self.client.post(self.increment_url).json()['version'], f'{today}-v1')
+        self.assertEqual(self.client.post(self.increment_url).json()['version'], f'{today}-v2')
+        self.assertEqual(self.client.get(self.current_url).json()['version'], f'{today}-v2')
+
+    def test_increment_version_retries_when_another_client_published(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        today = self.client.get(self.current_url).json()['version']
+        original_next_version = dashboard_settings.next_version
+
+        def publish_concurrently(current, now):
+            if current == today:
+                DashboardSettings.objects.update(version=f'{today}-v5')
+            return original_next_version(current, now)
+
+        with mock.patch.object(dashboard_settings, 'next_version', side_effect=publish_concurrently), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.increment_url)
+
+        self.assertEqual(response.json()['version'], f'{today}-v6')
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "recycling_plants_dashboardsettings"')]
+        self.assertEqual(len(updates), 3)
+        self.assertTrue(all('status_colors' not in sql for sql in updates))
+
+    def test_increment_version_gives_up_under_contention(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.client.get(self.current_url)
+
+        def always_publish_concurrently(current, now):
+            DashboardSettings.objects.update(version=current + '+')
+            return f'{current}-v1'
+
+        with mock.patch.object(dashboard_settings, 'next_version', side_effect=always_publish_concurrently):
+            response = self.client.post(self.increment_url)
+
+        self.assertEqual(response.status_code, 409)
+
+    def test_published_version_busts_cached_responses(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.client.get(self.current_url)
+        url = reverse('recyclingplant-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+
+        self.client.post(self.increment_url)
+
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+
+class BoundingBoxTests(TestCase):
+    url = reverse('recyclingplant-list')
+
+    def names(self, bbox):
+        response = self.client.get(self.url, {'bbox': bbox, 'fields': 'name'})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']]
+
+    def indexed_ids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM "{spatial.rtree_table(RecyclingPlant)}" ORDER BY id')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_filters_on_the_spatial_index(self):
+        montreal = create_plant("Montréal", latitude=45.5, longitude=-73.6)
+        create_plant("Québec", latitude=46.8, longitude=-71.2)
+        create_plant("Sans coordonnées")
+        create_plant("Fidji", latitude=-17.7, longitude=179.5)
+
+        self.assertEqual(self.names('-74,45,-73,46'), ["Montréal"])
+        self.assertEqual(self.names('-80,40,-70,50'), ["Montréal", "Québec"])
+        # Fenêtre à cheval sur l'antiméridien
+        self.assertEqual(self.names('179,-20,-179,-15'), ["Fidji"])
+
+        montreal.latitude = 10
+        montreal.save()
+        self.assertEqual(self.names('-74,45,-73,46'), [])
+        montreal.delete()
+        self.assertEqual(len(self.indexed_ids()), 2)
+
+    def test_index_is_rebuilt_when_triggers_are_lost(self):
+        plant = create_plant("Montréal", latitude=45.5, longitude=-73.6)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER "{spatial.rtree_table(RecyclingPlant)}_insert"')
+        other = create_plant("Québec", latitude=46.8, longitude=-71.2)
+        self.assertEqual(self.indexed_ids(), [plant.pk])
+
+        spatial.ensure_spatial_index()
+
+        self.assertEqual(self.indexed_ids(), [plant.pk, other.pk])
+        self.assertEqual(self.names('-80,40,-70,50'), ["Montréal", "Québec"])
+
+    def test_invalid_bbox(self):
+        for bbox in ('1,2,3', 'a,b,c,d', '-74,50,-73,45', '-200,0,0,10'):
+            self.assertEqual(self.client.get(self.url, {'bbox': bbox}).status_code, 400)
+
+
+def parse_protobuf(data):
+    """(champ, valeur) d'un message protobuf : entier, octets ou double"""
+    fields, position = [], 0
+
+    def varint():
+        nonlocal position
+        value = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    while position < len(data):
+        key = varint()
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            fields.append((field, varint()))
+        elif wire_type == 1:
+            fields.append((field, struct.unpack('<d', data[position:position + 8])[0]))
+            position += 8
+        else:
+            length = varint()
+            fields.append((field, data[position:position + length]))
+            position += length
+    return fields
+
+
+def decode_tile(data):
+    """{couche: [(id, (x, y), propriétés)]} d'une tuile MVT de points"""
+    layers = {}
+    for _, layer in parse_protobuf(data):
+        fields = parse_protobuf(layer)
+        name = next(value.decode() for field, value in fields if field == 1)
+        keys = [value.decode() for field, value in fields if field == 3]
+        values = []
+        for field, value in fields:
+            if field == 4:
+                kind, raw = parse_protobuf(value)[0]
+                values.append(raw.decode() if kind == 1 else raw)
+        features = []
+        for field, value in fields:
+            if field != 2:
+                continue
+            feature = dict(parse_protobuf(value))
+            tags = _unpack_varints(feature[2])
+            command, x, y = _unpack_varints(feature[4])
+            features.append((feature[1], (_unzigzag(x), _unzigzag(y)), {
+                keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)
+            }))
+        layers[name] = features
+    return layers
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _unpack_varints(payload):
+    values, value, shift = [], 0, 0
+    for byte in payload:
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+class VectorTileTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        plant_layer.cache.clear()
+
+    def tile_url(self, z, x, y):
+        return reverse('vector-tile', kwargs={'z': z, 'x': x, 'y': y})
+
+    def tile_for(self, longitude, latitude, z):
+        x, y = tiles.project(longitude, latitude, z)
+        return z, int(x), int(y)
+
+    def test_encodes_plants_with_attributes(self):
+        plant = create_plant("Montréal", latitude=45.5, longitude=-73.6, capacity=1500)
+        create_plant("Paris", latitude=48.86, longitude=2.35, active=False)
+        create_plant("Sans coordonnées")
+
+        response = self.client.get(self.tile_url(0, 0, 0))
+
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        features = decode_tile(response.content)['recycling_plants']
+        self.assertEqual([feature[0] for feature in features], [plant.pk, plant.pk + 1])
+        feature_id, (x, y), properties = features[0]
+        self.assertEqual(properties, {'name': "Montréal", 'status': 'active', 'capacity': 1500.0})
+        self.assertEqual((x, y), (round((180 - 73.6) / 360 * 4096), round(tiles.project(-73.6, 45.5, 0)[1] * 4096)))
+        self.assertEqual(features[1][2]['status'], 'inactive')
+
+    def test_empty_invalid_and_unchanged_tiles(self):
+        self.assertEqual(self.client.get(self.tile_url(3, 0, 0)).status_code, 204)
+        self.assertEqual(self.client.get(self.tile_url(2, 4, 0)).status_code, 404)
+        etag = self.client.get(self.tile_url(0, 0, 0))['ETag']
+        self.assertEqual(self.client.get(self.tile_url(0, 0, 0), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_only_touched_tiles_are_invalidated(self):
+        plant = create_plant("Montréal", latitude=45.5, longitude=-73.6)
+        create_plant("Paris", latitude=48.86, longitude=2.35)
+        montreal, paris = self.tile_for(-73.6, 45.5, 10), self.tile_for(2.35, 48.86, 10)
+        montreal_etag = self.client.get(self.tile_url(*montreal))['ETag']
+        paris_etag = self.client.get(self.tile_url(*paris))['ETag']
+
+        plant.description = "Sans effet sur la couche"
+        plant.save()
+        self.assertEqual(self.client.get(self.tile_url(*montreal))['ETag'], montreal_etag)
+
+        plant.longitude = -73.0
+        plant.save()
+        moved = self.tile_for(-73.0, 45.5, 10)
+        self.assertNotEqual(self.client.get(self.tile_url(*montreal))['ETag'], montreal_etag)
+        self.assertEqual(self.client.get(self.tile_url(*paris))['ETag'], paris_etag)
+        self.assertEqual(decode_tile(self.client.get(self.tile_url(*moved)).content)['recycling_plants'][0][0], plant.pk)
+        self.assertEqual(self.client.get(self.tile_url(*montreal)).status_code, 204)
+
+    def test_tile_cache_evicts_least_recently_used(self):
+        cache = tiles.TileCache(maxsize=2)
+        cache.set('a', 1, b'a')
+        cache.set('b', 1, b'b')
+        cache.get('a', 1)
+        cache.set('c', 1, b'c')
+
+        self.assertEqual((cache.get('a', 1), cache.get('b', 1), cache.get('c', 2)), (b'a', None, None))
+
+
+class ClusterTests(TestCase):
+    url = reverse('recyclingplant-clusters')
+
+    def test_merges_close_plants_at_low_zoom_only(self):
+        create_plant("Montréal", latitude=45.5, longitude=-73.6, capacity=1000)
+        create_plant("Laval", latitude=45.6, longitude=-73.7, capacity=500)
+        create_plant("Paris", latitude=48.85, longitude=2.35, capacity=2000)
+        create_plant("Sans position", capacity=9000)
+
+        response = self.client.get(self.url, {'zoom': 3})
+        self.assertEqual(response.status_code, 200)
+        found = sorted(response.data['clusters'], key=lambda item: item['count'])
+        self.assertEqual([(item['count'], item['capacity']) for item in found], [(1, 2000.0), (2, 1500.0)])
+        self.assertTrue(found[1]['cluster'])
+
+        found = self.client.get(self.url, {'zoom': 14, 'bbox': '-80,40,-70,50'}).data['clusters']
+        self.assertEqual(len(found), 2)
+        self.assertFalse(any(item['cluster'] for item in found))
+
+    def test_index_follows_writes(self):
+        plant = create_plant("Montréal", latitude=45.5, longitude=-73.6)
+        create_plant("Laval", latitude=45.6, longitude=-73.7)
+        self.assertEqual([item['count'] for item in self.client.get(self.url, {'zoom': 3}).data['clusters']], [2])
+
+        plant.latitude, plant.longitude = 48.85, 2.35
+        plant.save()
+        self.assertEqual([item['count'] for item in self.client.get(self.url, {'zoom': 3}).data['clusters']], [1, 1])
+        self.assertEqual(len(self.client.get(self.url, {'zoom': 3, 'bbox': '0,40,5,50'}).data['clusters']), 1)
+
+    def test_conserves_counts_across_the_antimeridian(self):
+        points = [(number, -179.9 + number * 0.01, -17.7, 1.0) for number in range(20)]
+        points += [(100 + number, 179.9 - number * 0.01, -17.7, 1.0) for number in range(20)]
+        index = clusters.ClusterIndex(points)
+        for zoom in range(clusters.MAX_ZOOM + 2):
+            found = index.get_clusters((179, -20, -179, -15), zoom)
+            self.assertEqual(sum(item['count'] for item in found), 40)
+            self.assertEqual(sum(item['capacity'] for item in found), 40.0)
+
+    def test_rejects_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 30}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 2, 'bbox': '1,2'}).status_code, 400)
+
+
+class PlantGeoJSONTests(TestCase):
+    url = reverse('plant-geojson')
+
+    def test_feature_collection_cached_per_variant_until_write(self):
+        university = University.objects.create(name="Université Laval", short_name="UL", country="Québec")
+        plant = create_plant("Québec", university=university, latitude=46.781234, longitude=-71.274567, capacity=1200)
+        create_plant("Paris", latitude=48.85, longitude=2.35, active=False)
+        create_plant("Sans position")
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        features = response.json()['features']
+        self.assertEqual([feature['id'] for feature in features][:1], [plant.pk])
+        self.assertEqual(len(features), 2)
+        self.assertEqual(features[0]['geometry']['coordinates'], [-71.274567, 46.781234])
+        self.assertEqual(features[0]['properties']['country'], "Québec")
+
+        rounded = self.client.get(self.url, {'precision': 1, 'country': "Québec"})
+        self.assertEqual([feature['geometry']['coordinates'] for feature in rounded.json()['features']], [[-71.3, 46.8]])
+        etag = rounded['ETag']
+        self.client.get(self.url, {'status': 'inactive'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'status': 'inactive'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual([feature['id'] for feature in json.loads(gzip.decompress(response.content))['features']], [plant.pk + 1])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, {'precision': 1, 'country': "Québec"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        university.country = "Canada"
+        university.save()
+        response = self.client.get(self.url, {'precision': 1, 'country': "Canada"})
+        self.assertEqual([feature['id'] for feature in response.json()['features']], [plant.pk])
+        self.assertEqual(self.client.get(self.url, {'country': "Québec"}).status_code, 400)
+
+    def test_rejects_invalid_parameters(self):
+        for params in ({'precision': 8}, {'precision': 'x'}, {'status': 'closed'}, {'country': "Atlantide"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
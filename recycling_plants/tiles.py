@@ -0,0 +1,20 @@
+"""Couche de tuiles vectorielles des installations de recyclage (voir dashboard_common.tiles)."""
+from dashboard_common.spatial import filter_bbox
+from dashboard_common.tiles import TileLayer, tile_bbox, tile_coordinates
+
+from .models import RecyclingPlant
+
+
+def plant_features(z, x, y):
+    plants = filter_bbox(RecyclingPlant.objects.all(), tile_bbox(z, x, y)).order_by('id')
+    for plant_id, name, active, capacity, latitude, longitude in plants.values_list(
+        'id', 'name', 'active', 'capacity', 'latitude', 'longitude'
+    ):
+        yield plant_id, tile_coordinates(longitude, latitude, z, x, y), {
+            'name': name,
+            'status': 'active' if active else 'inactive',
+            'capacity': float(capacity),
+        }
+
+
+plant_layer = TileLayer('recycling_plants', ('latitude', 'longitude', 'name', 'active', 'capacity'), plant_features)
@@ -14,4 +14,9 @@ urlpatterns = [
     # API REST URLs
     path('api/', include(router.urls)),
     path('api/production-history/', views.ProductionHistoryView.as_view(), name='production-history'),
+    path('api/production-aggregates/', views.ProductionAggregateView.as_view(), name='production-aggregates'),
+    path('api/events/', views.change_events, name='change-events'),
+    path('api/sync/', views.SyncView.as_view(), name='sync'),
+    path('api/geojson/recycling-plants/', views.plant_geojson, name='plant-geojson'),
+    path('api/tiles/<int:z>/<int:x>/<int:y>.mvt', views.vector_tile, name='vector-tile'),
 ] 
\ No newline at end of file
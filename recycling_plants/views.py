@@ -1,13 +1,37 @@
+import datetime
+
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status, generics, filters
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from django.db.models import Exists, Max, Min, OuterRef, Sum
+from django.db.models.functions import TruncMonth
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import RecyclingPlant, DashboardSettings, University, ProductionData, ResearchProject
-from .serializers import RecyclingPlantSerializer, RecyclingPlantCreateUpdateSerializer, DashboardSettingsSerializer, UserSerializer, UniversitySerializer, ProductionDataSerializer, ResearchProjectSerializer, PlantSummarySerializer, ProductionHistorySerializer
+from dashboard_common.cache import cache_response
+from dashboard_common.clusters import MAX_ZOOM, MIN_ZOOM
+from dashboard_common.geojson import preferred_encoding
+from dashboard_common.mixins import ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin
+from dashboard_common.spatial import BoundingBoxFilter, parse_bbox
+from dashboard_common.sync import DEFAULT_LIMIT, MAX_LIMIT, StaleToken, changes_since, parse_token
+from dashboard_common.tiles import is_valid_tile
+
+from .models import RecyclingPlant, DashboardSettings, University, ProductionData, ResearchProject, ProductionMonthlyRollup
+from .clusters import cluster_index
+from .dashboard_settings import VersionConflict, get_settings, increment_version
+from .events import change_log, latest_event_id, stream_events
+from .geojson import MAX_PRECISION, STATUSES, geojson_payload, known_countries
+from .ingest import upsert_production_data
+from .parsers import NDJSONParser
+from .renderers import NDJSONRenderer, CSVRenderer, JSONArrayRenderer, ndjson_line, csv_line
+from .rollups import METRICS
+from .tiles import plant_layer
+from .serializers import RecyclingPlantSerializer, RecyclingPlantCreateUpdateSerializer, DashboardSettingsSerializer, UserSerializer, UniversitySerializer, ProductionDataSerializer, ResearchProjectSerializer, PlantSummarySerializer, ProductionHistorySerializer, ProductionDataBulkSerializer
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """Autoriser l'accès en lecture à tous, mais accès en écriture uniquement aux administrateurs"""
@@ -18,53 +42,57 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_staff
 
 
-class RecyclingPlantViewSet(viewsets.ModelViewSet):
+class RecyclingPlantViewSet(ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """API pour gérer les installations de recyclage"""
     queryset = RecyclingPlant.objects.all()
     serializer_class = RecyclingPlantSerializer
+    etag_models = [RecyclingPlant, University]
     permission_classes = [permissions.AllowAny]  # Permettre l'accès à tous
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter, BoundingBoxFilter]
     filterset_fields = ['university', 'active']
     search_fields = ['name', 'address']
     ordering_fields = ['name', 'capacity', 'opening_date']
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], serializer_class=PlantSummarySerializer)
+    @cache_response(RecyclingPlant, University)
     def dashboard_summary(self, request):
         """Endpoint spécifique pour le dashboard avec des données résumées"""
         plants = self.get_queryset()
-        serializer = PlantSummarySerializer(plants, many=True)
+        serializer = self.get_serializer(plants, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    @cache_response(RecyclingPlant)
+    def clusters(self, request):
+        """
+        Groupes d'installations au niveau ``?zoom=`` (obligatoire) dans ``?bbox=``
+        (par défaut : le monde entier). Un groupe indique le nombre
+        d'installations qu'il contient et la somme de leurs capacités (kg/mois) ;
+        une installation seule a ``cluster: false``.
+        """
+        try:
+            zoom = int(request.query_params['zoom'])
+        except (KeyError, ValueError):
+            return Response({"detail": "zoom doit être un entier"}, status=status.HTTP_400_BAD_REQUEST)
+        if not MIN_ZOOM <= zoom <= MAX_ZOOM + 1:
+            return Response(
+                {"detail": f"zoom doit être compris entre {MIN_ZOOM} et {MAX_ZOOM + 1}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        bbox = request.query_params.get('bbox')
+        bbox = parse_bbox(bbox) if bbox else (-180, -90, 180, 90)
+        return Response({'zoom': zoom, 'clusters': cluster_index().get_clusters(bbox, zoom)})
+
 
-class DashboardSettingsViewSet(viewsets.ModelViewSet):
+class DashboardSettingsViewSet(ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = DashboardSettings.objects.all()
     serializer_class = DashboardSettingsSerializer
     permission_classes = [IsAdminOrReadOnly]
     
     @action(detail=False, methods=['get'])
     def current(self, request):
-        """Obtenir les paramètres actuels du dashboard ou créer des paramètres par défaut si aucun n'existe"""
-        settings = DashboardSettings.objects.first()
-        
-        if not settings:
-            # Créer des paramètres par défaut
-            default_status_colors = {
-                "operational": "#4CAF50",
-                "construction": "#FF9800",
-                "planned": "#2196F3",
-                "approved": "#9C27B0",
-                "suspended": "#F44336"
-            }
-            
-            default_chart_colors = ["#4a6bff", "#ff7043", "#ffca28", "#66bb6a", "#ab47bc"]
-            
-            settings = DashboardSettings.objects.create(
-                version=timezone.now().strftime("%Y-%m-%d"),
-                status_colors=default_status_colors,
-                chart_colors=default_chart_colors
-            )
-        
-        serializer = self.get_serializer(settings)
+        """Obtenir les paramètres actuels du dashboard (créés avec les valeurs par défaut si besoin)"""
+        serializer = self.get_serializer(get_settings())
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
@@ -73,30 +101,14 @@ class DashboardSettingsViewSet(viewsets.ModelViewSet):
         if not request.user.is_staff:
             return Response({"detail": "Non autorisé"}, status=status.HTTP_403_FORBIDDEN)
             
-        settings = DashboardSettings.objects.first()
+        try:
+            settings = increment_version()
+        except VersionConflict:
+            return Response({"detail": "Publication concurrente, réessayez"}, status=status.HTTP_409_CONFLICT)
         
         if not settings:
             return Response({"detail": "Paramètres non trouvés"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Obtenir la date actuelle au format ISO (AAAA-MM-JJ)
-        current_date = timezone.now().strftime("%Y-%m-%d")
-        
-        # Vérifier si la version inclut déjà la date actuelle
-        if settings.version.startswith(current_date):
-            # Extraire le numéro de version et l'incrémenter
-            parts = settings.version.split('-v')
-            if len(parts) > 1 and parts[1].isdigit():
-                version_num = int(parts[1]) + 1
-            else:
-                version_num = 1
-            new_version = f"{current_date}-v{version_num}"
-        else:
-            # Nouvelle date, commencer à v1
-            new_version = f"{current_date}-v1"
-        
-        settings.version = new_version
-        settings.save()
-        
         serializer = self.get_serializer(settings)
         return Response(serializer.data)
 
@@ -109,7 +121,7 @@ class CurrentUserView(APIView):
         return Response(serializer.data)
 
 
-class UniversityViewSet(viewsets.ModelViewSet):
+class UniversityViewSet(ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """API pour gérer les universités"""
     queryset = University.objects.all()
     serializer_class = UniversitySerializer
@@ -120,20 +132,89 @@ class UniversityViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'country']
 
 
-class ProductionDataViewSet(viewsets.ModelViewSet):
+class ProductionDataViewSet(ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """API pour gérer les données de production"""
     queryset = ProductionData.objects.all()
     serializer_class = ProductionDataSerializer
+    etag_models = [ProductionData, RecyclingPlant]
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['plant', 'date']
     ordering_fields = ['date', 'production_amount', 'recycling_rate']
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Import en masse : tableau JSON ou NDJSON de relevés, insérés ou mis à
+        jour sur (plant, date) dans une seule transaction. Les lignes
+        invalides sont signalées individuellement sans bloquer les autres.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"detail": "Un tableau de relevés est attendu"}, status=status.HTTP_400_BAD_REQUEST)
+
+        validator = ProductionDataBulkSerializer()
+        valid, errors = [], []
+        for index, row in enumerate(rows):
+            try:
+                valid.append((index, validator.run_validation(row)))
+            except ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+
+        known_plants = set(RecyclingPlant.objects.filter(
+            pk__in={row['plant'] for _, row in valid}
+        ).values_list('pk', flat=True))
+        accepted = []
+        for index, row in valid:
+            if row['plant'] in known_plants:
+                accepted.append(row)
+            else:
+                errors.append({'index': index, 'errors': {'plant': [f"Installation {row['plant']} introuvable"]}})
+
+        created, updated = upsert_production_data(accepted)
+        errors.sort(key=lambda error: error['index'])
+        return Response({'created': created, 'updated': updated, 'errors': errors})
+    
+    export_fields = ['id', 'plant', 'plant__name', 'date', 'production_amount', 'recycling_rate', 'waste_amount', 'notes']
+    export_chunk_size = 2000
+    
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer, JSONArrayRenderer])
+    def export(self, request):
+        """
+        Export complet en flux NDJSON (par défaut), CSV (``?format=csv``) ou
+        tableau JSON (``?format=json`` ou ``Accept: application/json``), avec
+        les mêmes filtres et tris que la liste. Les lignes sont lues par
+        blocs côté serveur (``iterator()``) : la mémoire reste constante
+        quel que soit le nombre de lignes.
+        """
+        rows = self.filter_queryset(self.get_queryset()).values_list(*self.export_fields)
+        columns = [field.replace('plant__name', 'plant_name') for field in self.export_fields]
+
+        def stream():
+            if request.accepted_renderer.format == 'csv':
+                yield csv_line(columns)
+                for row in rows.iterator(chunk_size=self.export_chunk_size):
+                    yield csv_line(row)
+            elif request.accepted_renderer.format == 'json':
+                # Tableau écrit au fil de l'eau : une ligne NDJSON par élément
+                yield '['
+                for index, row in enumerate(rows.iterator(chunk_size=self.export_chunk_size)):
+                    yield (',' if index else '') + ndjson_line(dict(zip(columns, row)))
+                yield ']\n'
+            else:
+                for row in rows.iterator(chunk_size=self.export_chunk_size):
+                    yield ndjson_line(dict(zip(columns, row)))
 
+        response = StreamingHttpResponse(stream(), content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="production-data.{request.accepted_renderer.format}"'
+        return response
 
-class ResearchProjectViewSet(viewsets.ModelViewSet):
+
+class ResearchProjectViewSet(ConditionalGetMixin, RelatedFieldsMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """API pour gérer les projets de recherche"""
     queryset = ResearchProject.objects.all()
     serializer_class = ResearchProjectSerializer
+    etag_models = [ResearchProject, University, RecyclingPlant]
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'universities', 'plants']
@@ -141,35 +222,221 @@ class ResearchProjectViewSet(viewsets.ModelViewSet):
     ordering_fields = ['start_date', 'title']
 
 
-class ProductionHistoryView(generics.ListAPIView):
+class ProductionHistoryView(RelatedFieldsMixin, SparseFieldsetMixin, generics.ListAPIView):
     """API pour obtenir l'historique de production par mois"""
+    queryset = ProductionData.objects.all()
     serializer_class = ProductionHistorySerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['plant']
     
+    @cache_response(ProductionData, RecyclingPlant)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
     def get_queryset(self):
         """
-        Personnalise la requête pour regrouper les données par mois
+        Retourne, pour chaque installation et chaque mois, l'enregistrement le
+        plus récent, en une seule requête : un relevé est retenu s'il n'existe
+        aucun relevé plus récent de la même installation dans le même mois.
         """
-        # Utilisez la date pour obtenir les données les plus récentes par mois
-        from django.db.models import Max
-        from django.db.models.functions import TruncMonth
-        
-        # Regrouper par mois et installation
-        queryset = ProductionData.objects.annotate(
-            month=TruncMonth('date')
-        ).values('plant', 'month').annotate(
-            latest_date=Max('date')
-        ).order_by('plant', 'month')
-        
-        # Obtenir les enregistrements correspondant aux dates les plus récentes par mois
-        result = []
-        for item in queryset:
-            data = ProductionData.objects.get(
-                plant=item['plant'],
-                date=item['latest_date']
-            )
-            result.append(data)
-        
-        return result
+        later_same_month = ProductionData.objects.annotate(month=TruncMonth('date')).filter(
+            plant=OuterRef('plant'), month=OuterRef('month'), date__gt=OuterRef('date'),
+        )
+        return super().get_queryset().annotate(
+            month=TruncMonth('date'),
+        ).filter(~Exists(later_same_month)).order_by('plant_id', 'date')
+
+class ProductionAggregateView(APIView):
+    """
+    API des agrégats mensuels de production, lus depuis ProductionMonthlyRollup.
+
+    Paramètres : ``scope`` (``plant``, ``university`` ou ``global``, par défaut),
+    ``plant``, ``university``, ``start`` et ``end`` (mois au format AAAA-MM).
+    """
+    permission_classes = [permissions.AllowAny]
+    scope_fields = {
+        'plant': ['plant'],
+        'university': ['plant__university'],
+        'global': [],
+    }
+
+    @cache_response(ProductionMonthlyRollup, ProductionData)
+    def get(self, request):
+        scope = request.query_params.get('scope', 'global')
+        if scope not in self.scope_fields:
+            return Response({"detail": f"Portée inconnue : {scope}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = ProductionMonthlyRollup.objects.all()
+        try:
+            if request.query_params.get('plant'):
+                rollups = rollups.filter(plant=int(request.query_params['plant']))
+            if request.query_params.get('university'):
+                rollups = rollups.filter(plant__university=int(request.query_params['university']))
+            if request.query_params.get('start'):
+                rollups = rollups.filter(month__gte=self.parse_month(request.query_params['start']))
+            if request.query_params.get('end'):
+                rollups = rollups.filter(month__lte=self.parse_month(request.query_params['end']))
+        except ValueError:
+            return Response({"detail": "Paramètres de filtre invalides"}, status=status.HTTP_400_BAD_REQUEST)
+
+        aggregates = {'count': Sum('count')}
+        for metric in METRICS:
+            aggregates[f'{metric}_sum'] = Sum(f'{metric}_sum')
+            aggregates[f'{metric}_min'] = Min(f'{metric}_min')
+            aggregates[f'{metric}_max'] = Max(f'{metric}_max')
+        group_by = self.scope_fields[scope] + ['month']
+        rows = rollups.order_by().values(*group_by).annotate(**aggregates).order_by(*group_by)
+
+        data = []
+        for row in rows:
+            item = {'month': row['month'].strftime('%Y-%m'), 'count': row['count']}
+            if scope == 'plant':
+                item['plant'] = row['plant']
+            elif scope == 'university':
+                item['university'] = row['plant__university']
+            for metric in METRICS:
+                total = row[f'{metric}_sum']
+                item[metric] = {
+                    'sum': total,
+                    'mean': total / row['count'] if row['count'] else 0,
+                    'min': row[f'{metric}_min'],
+                    'max': row[f'{metric}_max'],
+                }
+            data.append(item)
+        return Response(data)
+
+    @staticmethod
+    def parse_month(value):
+        return datetime.datetime.strptime(value, '%Y-%m').date()
+
+
+class SyncView(APIView):
+    """
+    Synchronisation incrémentale pour les clients mobiles et hors ligne.
+
+    - sans ``since`` : renvoie seulement le jeton courant, à obtenir *avant* le
+      chargement complet des collections ;
+    - ``?since=<jeton>`` : objets créés, modifiés (``upserted``) ou supprimés
+      (``deleted``) depuis ce jeton, par modèle, avec le nouveau jeton. Tant que
+      ``has_more`` est vrai, rappeler avec ce jeton ;
+    - ``?limit=`` (événements par lot) et ``?models=university,researchproject``.
+
+    Un jeton antérieur aux événements purgés (prune_change_events) renvoie 410 :
+    le client doit tout recharger.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            since = request.query_params.get('since')
+            since = parse_token(since) if since is not None else None
+        except ValueError:
+            return Response({"detail": "Jeton ou limite invalide"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"detail": "La limite doit être positive"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if since is None:
+            response = Response({'token': str(latest_event_id()), 'has_more': False, 'changes': {}})
+        else:
+            models = [
+                f'recycling_plants.{name.strip().lower()}'
+                for name in request.query_params.get('models', '').split(',') if name.strip()
+            ]
+            try:
+                response = Response(changes_since(change_log, since, limit, models))
+            except StaleToken:
+                return Response(
+                    {"detail": "Jeton expiré : rechargez toutes les données", "token": str(latest_event_id())},
+                    status=status.HTTP_410_GONE,
+                )
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+async def change_events(request):
+    """
+    Flux Server-Sent Events des créations, modifications et suppressions
+    journalisées (servi en ASGI).
+
+    - ``Last-Event-ID`` (en-tête envoyé par EventSource à la reconnexion, ou
+      ``?last_event_id=`` au premier chargement) : rejoue les événements manqués ;
+    - ``?models=recyclingplant,productiondata`` : restreint les modèles suivis.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_event_id and not last_event_id.isdigit():
+        return HttpResponseBadRequest("Last-Event-ID invalide")
+    models = {
+        f'recycling_plants.{name.strip().lower()}'
+        for name in request.GET.get('models', '').split(',') if name.strip()
+    }
+
+    response = StreamingHttpResponse(
+        stream_events(int(last_event_id) if last_event_id else None, models),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Désactive la mise en tampon des proxys (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def vector_tile(request, z, x, y):
+    """
+    Tuile vectorielle (MVT) des installations, couche ``recycling_plants`` :
+    points avec ``name``, ``status`` (active/inactive) et ``capacity`` (kg/mois).
+    Une tuile vide répond 204 ; l'ETag évite de retransférer une tuile inchangée.
+    """
+    if not is_valid_tile(z, x, y):
+        raise Http404("Tuile hors limites")
+    versions = plant_layer.versions(z, x, y)
+    etag = quote_etag('-'.join(str(version) for version in versions))
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        _, data = plant_layer.render(z, x, y, versions)
+        response = HttpResponse(data, content_type='application/vnd.mapbox-vector-tile', status=200 if data else 204)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def plant_geojson(request):
+    """
+    Installations localisées en FeatureCollection GeoJSON, précalculée par
+    version de données (voir recycling_plants.geojson). ``?precision=``
+    (0 à 7 décimales) arrondit les coordonnées pour alléger la réponse ;
+    ``?status=active|inactive`` et ``?country=`` (pays d'une université
+    connue, 400 sinon) la filtrent, chaque variante ayant son propre cache. Servie en gzip ou en
+    brotli si le client l'accepte.
+    """
+    params = {}
+    status = request.GET.get('status')
+    if status and status != 'all':
+        if status not in STATUSES:
+            return HttpResponseBadRequest("status doit valoir active ou inactive")
+        params['status'] = status
+    country = request.GET.get('country')
+    if country and country != 'all':
+        if country not in known_countries():
+            return HttpResponseBadRequest("country doit être le pays d'une université connue")
+        params['country'] = country
+    precision = request.GET.get('precision')
+    if precision is not None:
+        if not precision.isdigit() or int(precision) > MAX_PRECISION:
+            return HttpResponseBadRequest(f"precision doit être comprise entre 0 et {MAX_PRECISION}")
+        params['precision'] = int(precision)
+
+    tag, bodies = geojson_payload(**params)
+    etag = quote_etag(tag)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        encoding = preferred_encoding(request.headers.get('Accept-Encoding', ''), bodies)
+        response = HttpResponse(bodies[encoding], content_type='application/geo+json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    return response